@@ -0,0 +1,108 @@
+import logging
+import os
+import shlex
+import threading
+import time
+from typing import Optional, Sequence, Set, Tuple
+
+# subprocess and concurrent.futures are imported where needed, parsing actions is part of loading the config.
+
+Argv = Tuple[str, ...]
+
+
+def parse(command: str) -> Argv:
+    """Split a configured action into argv once (shell-like quoting, but no shell is involved when running it)."""
+    return tuple(shlex.split(command or ''))
+
+
+class ActionExecutor:
+    """Runs button actions without a shell on a small pool of worker threads.
+
+    An action that is still running (or queued) is not started a second time, and at most `max_pending` actions
+    are accepted at once, so mashing the button cannot pile up processes. Every child is waited for (i.e. reaped),
+    killed after `timeout` seconds, and its exit status and duration are logged.
+
+    Terminal actions (shutdown, reboot, ...) skip the pool, so that they never wait behind a hanging action,
+    and are run without `sudo` if we are root anyway. Once one has been started, further actions are refused.
+    """
+    TERMINAL = frozenset(('shutdown', 'reboot', 'poweroff', 'halt'))
+
+    def __init__(self, workers: int = 2, max_pending: int = 4, timeout: float = 60.0, is_root: bool = None):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.is_root = os.geteuid() == 0 if is_root is None else is_root
+        self.terminating = False
+        from concurrent.futures import ThreadPoolExecutor
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='action')
+        self._pending = set()  # type: Set[Argv]
+        self._lock = threading.Lock()
+
+    def is_terminal(self, argv: Sequence[str]) -> bool:
+        return os.path.basename(self._strip_sudo(argv)[0]) in self.TERMINAL if argv else False
+
+    @staticmethod
+    def _strip_sudo(argv: Sequence[str]) -> Argv:
+        # Only a plain `sudo COMMAND`, options like `-u` change what the command does:
+        if len(argv) > 1 and os.path.basename(argv[0]) == 'sudo' and not argv[1].startswith('-'):
+            return tuple(argv[1:])
+        return tuple(argv)
+
+    def submit(self, argv: Sequence[str]) -> Optional['Future']:
+        """Start `argv` in the background. Returns its future (resolving to the exit status or None on errors),
+        or None if it has not been started."""
+        argv = tuple(argv)
+        if not argv:
+            return None
+        terminal = self.is_terminal(argv)
+        with self._lock:
+            if self.terminating:
+                logging.warning(f"Not running {argv[0]}, a terminal action is already running.")
+                return None
+            if argv in self._pending:
+                logging.info(f"Not running {argv[0]} again, it is still running.")
+                return None
+            if len(self._pending) >= self.max_pending and not terminal:
+                logging.warning(f"Not running {argv[0]}, {len(self._pending)} actions are still pending.")
+                return None
+            self._pending.add(argv)
+            if terminal:
+                self.terminating = True
+        if terminal:
+            from concurrent.futures import Future
+            future = Future()
+            command = self._strip_sudo(argv) if self.is_root else argv
+            threading.Thread(target=self._run_into, args=(future, argv, command), name='terminal action',
+                             daemon=True).start()
+            return future
+        return self._pool.submit(self._run, argv, argv)
+
+    def _run_into(self, future: 'Future', argv: Argv, command: Argv):
+        status = self._run(argv, command)
+        if status != 0:
+            # The system is apparently not going down after all:
+            with self._lock:
+                self.terminating = False
+        future.set_result(status)
+
+    def _run(self, argv: Argv, command: Argv) -> Optional[int]:
+        import subprocess
+        started = time.monotonic()
+        try:
+            status = subprocess.run(command, stdin=subprocess.DEVNULL, timeout=self.timeout).returncode
+        except subprocess.TimeoutExpired:
+            # `run` has already killed and reaped the child:
+            logging.error(f"Action {shlex.quote(argv[0])} killed after timeout of {self.timeout:g}s.")
+            return None
+        except OSError as e:
+            logging.error(f"Unable to run action {shlex.quote(argv[0])}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.discard(argv)
+        duration = time.monotonic() - started
+        log = logging.info if status == 0 else logging.error
+        log(f"Action '{' '.join(map(shlex.quote, command))}' exited with status {status} after {duration:.2f}s.")
+        return status
+
+    def close(self, wait: bool = False):
+        self._pool.shutdown(wait=wait)
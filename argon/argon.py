@@ -1,18 +1,30 @@
 import configparser as ini
 import logging
 import os
-import subprocess
-import signal
 import time
-import distutils.util
 from pathlib import Path
-from random import randint
 
 import click
 import click.termui
 
+import argon.config as config
 import argon.util as util
-from argon.ctrl import IO
+from argon.config import Config, ConfigError
+from argon.control import ControlClient, ControlServer, DaemonUnavailable
+from argon.history import History, HistoryError, format_flags
+from argon.sensor import AggregateSensor, PeriodicSensor, SensorError, open_sensor
+
+# Heavier modules (hardware access, asyncio, subprocess) are imported where needed,
+# so that simple commands start fast.
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds // 60 % 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
 
 
 class Argon:
@@ -24,36 +36,88 @@ class Argon:
         self._config_file = Path(config_file)
         self._verbose = verbose
 
-        logging.debug("Initializing IO: i2c (for controlling fan) and GPIO (for button)")
-        self._io = IO()
-
-        self._cfg = ini.ConfigParser()
+        self._lazy_io = None
+        self._lazy_cfg = None
+        self._lazy_config = None
+        self._sim = None
+        self._executor = None
+
+    @property
+    def _cfg(self) -> ini.ConfigParser:
+        if self._lazy_cfg is None:
+            self._lazy_cfg = self._load_config()
+        return self._lazy_cfg
+
+    @property
+    def config(self) -> Config:
+        """Validated snapshot of the config file, raises `ConfigError` if it is invalid."""
+        if self._lazy_config is None:
+            self._lazy_config = config.parse(self._cfg)
+        return self._lazy_config
+
+    def _load_config(self) -> ini.ConfigParser:
+        cfg = ini.ConfigParser()
         if self._config_file.exists():
-            self._cfg.read(self._config_file)
+            cfg.read(self._config_file)
         else:
-            self._cfg['Settings'] = {
+            cfg['Settings'] = {
                 'fan_profile': 'Fan:Vendor',
                 'temp_check_interval': 10,
                 'button_profile': 'Button:Vendor',
                 'power_mode_always_on': False,
+                'temp_sensor': 'auto',
+                'control_socket': ControlServer.DEFAULT_PATH,
+                'history': History.DEFAULT_PATH,
             }
-            self._cfg['Fan:Vendor'] = {'55': '10', '60': '55', '65': '100'}
-            self._cfg['Fan:Silent'] = {'60': '80', '65': '100'}
-            self._cfg['Fan:Speedy'] = {'45': '10', '50': '40', '55': '100'}
-            self._cfg['Fan:Off'] = {'0': '0'}
-            self._cfg['Fan:On'] = {'0': '100'}
-
-            self._cfg['Button:Vendor'] = {'long': 'sudo shutdown -h now',
-                                          'double': 'sudo reboot',
-                                          'many': ''}
-            self._cfg['Button:Better'] = {'long': 'sudo shutdown -h now',
-                                          'double': 'sudo shutdown -h now',
-                                          'many': 'sudo reboot'}
+            cfg['Fan:Vendor'] = {'55': '10', '60': '55', '65': '100'}
+            cfg['Fan:Silent'] = {'60': '80', '65': '100'}
+            cfg['Fan:Speedy'] = {'45': '10', '50': '40', '55': '100'}
+            cfg['Fan:Off'] = {'0': '0'}
+            cfg['Fan:On'] = {'0': '100'}
+
+            cfg['Button:Vendor'] = {'long': 'sudo shutdown -h now',
+                                    'double': 'sudo reboot',
+                                    'many': ''}
+            cfg['Button:Better'] = {'long': 'sudo shutdown -h now',
+                                    'double': 'sudo shutdown -h now',
+                                    'many': 'sudo reboot'}
             with self._config_file.open('w') as file:
-                self._cfg.write(file)
+                cfg.write(file)
+        return cfg
+
+    @property
+    def _io(self) -> 'IO':
+        if self._lazy_io is None:
+            backend = os.environ.get('ARGON_BACKEND') or self._cfg['Settings'].get('backend', 'hardware')
+            if backend == 'sim':
+                from argon.sim import Simulation
+                logging.warning("Using simulated hardware (fake i2c, GPIO and temperature).")
+                self._sim = Simulation(virtual_time=False)
+                self._lazy_io = self._sim.io
+            elif backend == 'hardware':
+                from argon.ctrl import IO
+                logging.debug("Initializing IO: i2c (for controlling fan) and GPIO (for button)")
+                self._lazy_io = IO()
+            else:
+                raise ValueError(f"Unknown backend '{backend}', must be 'hardware' or 'sim'")
+        return self._lazy_io
+
+    @property
+    def _control(self) -> ControlClient:
+        return ControlClient(self._cfg['Settings'].get('control_socket') or ControlServer.DEFAULT_PATH)
+
+    def _run_path(self, name: str) -> str:
+        """Path of a runtime file of the daemon, next to its control socket (by default in `/run/argond`)."""
+        return os.path.join(os.path.dirname(self._cfg['Settings'].get('control_socket') or ControlServer.DEFAULT_PATH),
+                            name)
+
+    def _lease(self) -> 'Lease':
+        from argon.lock import Lease
+        return Lease(self._run_path(Lease.NAME))
 
     def banner(self, name=None) -> tuple:
         if not name:
+            from random import randint
             banners = os.listdir('res')
             name = banners[randint(0, len(banners) - 1)]
         with open(f'res/{name}') as banner:
@@ -65,20 +129,27 @@ class Argon:
                 height += 1
         return width, height
 
+    def _systemctl(self, command: str, sudo=True, check=True) -> int:
+        import subprocess
+        result = subprocess.run(['sudo'] * sudo + ['systemctl', command, self.DAEMON_NAME], stdout=subprocess.DEVNULL)
+        if check:
+            result.check_returncode()
+        return result.returncode
+
     def service_status(self):
-        return subprocess.run(f'systemctl status {self.DAEMON_NAME} > /dev/null', shell=True).returncode
+        return self._systemctl('status', sudo=False, check=False)
 
     def start_service(self):
         logging.info(f"Start {self.DAEMON_NAME} service")
-        subprocess.run(f'sudo systemctl start {self.DAEMON_NAME}', shell=True).check_returncode()
+        self._systemctl('start')
 
     def stop_service(self):
         logging.info(f"Stop {self.DAEMON_NAME} service")
-        subprocess.run(f'sudo systemctl stop {self.DAEMON_NAME}', shell=True).check_returncode()
+        self._systemctl('stop')
 
     def enable_service(self):
         logging.info(f"Enable {self.DAEMON_NAME} service")
-        subprocess.run(f'sudo systemctl enable {self.DAEMON_NAME}', shell=True).check_returncode()
+        self._systemctl('enable')
 
     def doctor(self, hw_check=True, sw_check=True):
         self.banner('banner' if click.get_terminal_size()[0] > 124 else 'banner-small')
@@ -98,8 +169,10 @@ class Argon:
             util.info("Let's check the hardware first.")
             click.secho("Push the button on your Argon case twice (fast). ", bold=True, nl=False)
             click.echo(click.style("Waiting for you ..."))
-            self._io.wait_for_button()
-            if click.confirm("Did you just push the button?"):
+            if not self._io.wait_for_button(timeout=60):
+                util.error("No button push within a minute.")
+                errors += 1
+            elif click.confirm("Did you just push the button?"):
                 util.success("Nice, the button works fine.")
             else:
                 util.error("Something strange happened - if it wasn't you, I received a ghost touch.")
@@ -112,15 +185,19 @@ class Argon:
             click.echo()
             click.echo("Next, we are going to test the fan.")
             click.pause()
-            with click.progressbar(range(0, 105, 5),
-                                   fill_char='█', empty_char=' ', show_eta=False, show_percent=False,
-                                   item_show_func=lambda s: f"{self._io.guess_rpm(s)} rpm"
-                                   if s else 'N/A rpm') as bar:
+            # Keeps a running daemon from setting the fan speed meanwhile:
+            with self._lease().hold(30), click.progressbar(
+                    range(0, 105, 5), fill_char='█', empty_char=' ', show_eta=False, show_percent=False,
+                    item_show_func=lambda s: f"{self._io.guess_rpm(s)} rpm" if s else 'N/A rpm') as bar:
                 for p in bar:
                     self._io.set_fan_speed(p, debug=False)
                     time.sleep(0.5)
-            time.sleep(1.0)
-            self._io.set_fan_speed(0, debug=False)
+                time.sleep(1.0)
+                self._io.set_fan_speed(0, debug=False)
+            stats = self._io.i2c_stats()[self._io.I2C_ADDR]
+            if stats['errors']:
+                util.warning(f"The i2c bus is unreliable: {self._format_i2c_stats(stats)}")
+                click.echo("Tip: Other HATs or devices on the i2c bus might interfere with the case.")
             if click.confirm("Did you hear the fan's varying sound?"):
                 util.success("Cool, this will keep your Pi ice-cold... Well - nearly!")
             else:
@@ -132,17 +209,16 @@ class Argon:
         if sw_check:
             util.info("Let's check the software side now!")
             try:
-                temp = util.get_temp()
+                temp = util.get_temp(self.config.settings.temp_sensor)
                 util.success(f"Got current temperature: {temp}°C")
             except:
-                logging.exception("Unable to get temperature via 'vcgencmd' tool")
+                logging.exception("Unable to get temperature via thermal zone or 'vcgencmd' tool")
                 util.error("Could not get the temperature.")
                 # TODO(kdevo): Automatize adding user to video group
                 click.echo("Tip: Ensure that the current user belongs to the 'video' group!")
                 errors += 1
 
-            if Path(self.SYSTEMCTL_PATH).joinpath(f'{self.DAEMON_NAME}').exists() \
-                    and Path(self.SYSTEMCTL_SHUTDOWN_DROPIN).joinpath(f'{self.DAEMON_NAME}-poweroff.sh').exists():
+            if not all(os.path.exists(path) for path in self._daemon_files().values()):
                 util.error("Some necessary files for the daemon are missing. Consider to re-run the installer!")
                 errors += 1
 
@@ -164,92 +240,379 @@ class Argon:
         else:
             util.error(f"There is a total of {errors} error(s). Carefully read the error messages above for advice.")
 
-    def set_fan(self, speed):
-        self._io.set_fan_speed(speed)
+    def _daemon_files(self) -> dict:
+        return {
+            'unit': str(Path(self.SYSTEMCTL_PATH) / f'{self.DAEMON_NAME}.service'),
+            'shutdown drop-in': str(Path(self.SYSTEMCTL_SHUTDOWN_DROPIN) / f'{self.DAEMON_NAME}-poweroff.sh'),
+        }
+
+    def _daemon_running(self) -> bool:
+        try:
+            self._control.request('status')
+        except DaemonUnavailable:
+            return False
+        return True
+
+    def doctor_batch(self, button: float = 0) -> bool:
+        """Run the checks concurrently without asking anything, print a JSON report and return whether all passed.
+        The button is only checked if `button` (seconds to wait for a push) is given."""
+        from argon import doctor
+        from argon.doctor import Check
+
+        def check_config():
+            snapshot = self.config
+            return f"{len(snapshot.fan_profiles)} fan and {len(snapshot.button_profiles)} button profiles"
+
+        def check_sensor():
+            sensor = self._sim.sensor if self._sim else open_sensor(self.config.settings.temp_sensor, max_age=0)
+            try:
+                return doctor.check_sensor(sensor)
+            finally:
+                sensor.close()
+
+        try:
+            io = self._io
+        except Exception as e:
+            # E.g. not running on a Pi (or without permission to access i2c/GPIO):
+            i2c = fan = wait_for_button = doctor.failing(e)
+        else:
+            def i2c():
+                return doctor.check_i2c(io)
+
+            def fan():
+                return doctor.check_fan(io, self._daemon_running, lease=self._lease())
+
+            def wait_for_button():
+                return doctor.check_button(io, button)
+
+        checks = [
+            Check('config', check_config, 2),
+            Check('sensor', check_sensor, 5),
+            Check('files', lambda: doctor.check_files(self._daemon_files()), 2),
+            Check('service', lambda: doctor.check_service(self.DAEMON_NAME, 5), 6),
+            # Both use the same bus handle:
+            Check('i2c', i2c, 2, group='i2c'),
+            Check('fan', fan, 5, group='i2c'),
+        ]
+        if button:
+            checks.append(Check('button', wait_for_button, button + 2))
+        output, ok = doctor.report(doctor.run(checks))
+        click.echo(output)
+        return ok
+
+    def set_fan(self, speed, duration=None):
+        if not 0 <= speed <= 100:
+            raise ValueError("Fan speed must be in range from 0 to 100.")
+        try:
+            self._control.request('fan', speed=speed, duration=duration)
+            util.info(f"Daemon runs the fan at {speed}% for "
+                      f"{duration or ControlServer.DEFAULT_OVERRIDE_DURATION:.0f} seconds.")
+        except DaemonUnavailable:
+            logging.debug("Daemon not reachable, setting the fan speed directly.", exc_info=True)
+            duration = duration or ControlServer.DEFAULT_OVERRIDE_DURATION
+            # In case a daemon is running anyway (e.g. without a control socket), keep it from taking over right away:
+            try:
+                if self._lease().take(duration):
+                    util.info(f"Running daemon leaves the fan alone for {duration:.0f} seconds.")
+            except OSError as e:
+                util.warning(f"Unable to lease the fan from a running daemon, it might take over: {e}")
+            self._io.set_fan_speed(speed)
+
+    def switch_profile(self, fan_profile):
+        self._control.request('profile', fan=fan_profile)
+        util.success(f"Daemon switched to fan profile '{fan_profile}' (until restarted).")
+
+    def status(self):
+        try:
+            status = self._control.request('status')
+        except DaemonUnavailable:
+            util.warning("Daemon is not running.")
+            click.echo(f"Temperature: {util.get_temp(self.config.settings.temp_sensor, as_str=True)}")
+            return
+        click.echo(f"Temperature:    {status['temp']:.1f}°C" if status['temp'] is not None else "Temperature:    N/A")
+        click.echo(f"Fan speed:      {status['fan_speed']}%")
+        if status['override']:
+            click.echo(f"Override:       {status['override']['speed']}% "
+                       f"for another {status['override']['remaining']:.0f}s")
+        if status.get('lease'):
+            click.echo(f"Fan leased:     by pid {status['lease']['pid']} "
+                       f"for another {status['lease']['remaining']:.0f}s")
+        click.echo(f"Fan profile:    {status['fan_profile']}")
+        click.echo(f"Button profile: {status['button_profile']}")
+        click.echo(f"Uptime:         {status['uptime']:.0f}s")
+        click.echo(f"Check interval: {status['check_interval']:.1f}s ({status['check_rate']:.2f} checks/min)")
+        for name, temp in status.get('sensors', {}).items():
+            click.echo(f"{'Sensor ' + name + ':':16}" + (f"{temp:.1f}°C" if temp is not None else "N/A"))
+        if status['ticks']:
+            click.echo(f"Ticks:          {status['ticks']} "
+                       f"(avg {status['tick_time_avg'] * 1e3:.2f}ms, max {status['tick_time_max'] * 1e3:.2f}ms)")
+        for addr, stats in status['i2c'].items():
+            click.echo(f"I2C {addr}:       {self._format_i2c_stats(stats)}")
+        if status.get('throttle') is not None:
+            click.echo(f"Throttling:     {status['throttle']}")
+
+    def report(self, as_json=False):
+        """Print the time spent throttled, maximum temperature and average fan speed per fan profile."""
+        from argon.throttle import STATES
+        report = self._control.request('report')
+        if as_json:
+            import json
+            click.echo(json.dumps(report, indent=2))
+            return
+        since = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(report['since']))
+        click.echo(f"Since {since}, throttle state "
+                   + (f"from {report['throttle_source']}" if report['throttle_source'] else "unavailable"))
+        names = list(STATES.values())
+        click.echo(f"{'Profile':20} {'Time':>9} " + ' '.join(f"{name:>15}" for name in names)
+                   + f" {'Max temp':>9} {'Avg fan':>8}")
+        for profile, stats in sorted(report['profiles'].items(), key=lambda item: -item[1]['seconds']):
+            seconds = stats['seconds']
+            share = {name: stats[name] / seconds * 100 if seconds else 0.0 for name in names}
+            states = ' '.join(f"{_format_duration(stats[name]):>7} {share[name]:>6.1f}%" for name in names)
+            temp = 'N/A' if stats['temp_max'] is None else f"{stats['temp_max']:.1f}°C"
+            duty = 'N/A' if stats['duty_avg'] is None else f"{stats['duty_avg']:.0f}%"
+            click.echo(f"{profile:20} {_format_duration(seconds):>9} {states} {temp:>9} {duty:>8}")
+
+    @staticmethod
+    def _format_i2c_stats(stats: dict) -> str:
+        avg = stats['latency_total'] / stats['writes'] * 1e3 if stats['writes'] else 0
+        return (f"{stats['writes']} writes ({stats['suppressed']} suppressed), "
+                f"{stats['errors']} errors ({stats['failures']} failed writes), "
+                f"latency avg {avg:.2f}ms, max {stats['latency_max'] * 1e3:.2f}ms")
 
     def handle_button(self, button_profile, interaction_type):
-        action = self._cfg[button_profile][interaction_type]
-        logging.info(f"Action '{action}' has been triggered by button ('{interaction_type}' interaction).")
-        subprocess.Popen(action, shell=True)
+        action = self.config.action(button_profile, interaction_type)
+        if not action:
+            logging.info(f"No action configured for '{interaction_type}' interaction.")
+            return
+        logging.info(f"Action '{' '.join(action)}' has been triggered by button ('{interaction_type}' interaction).")
+        if self._executor is None:
+            from argon.action import ActionExecutor
+            self._executor = ActionExecutor(timeout=self.config.settings.action_timeout)
+        return self._executor.submit(action)
 
     def daemon(self, fan_profile=None, button_profile=None):
-        self._io.set_power_mode(distutils.util.strtobool(self._cfg['Settings']['power_mode_always_on']))
-        running = True
-        # if self.service_status() == 0:
-        #     logging.warning("Another 'argond' daemon is already running via systemd. "
-        #                     "Running two instances simultaneously is only recommended for testing purposes.")
-
-        def status_signal_received(signum, frame):
-            logging.warning(f"SIGUSR1 #{signum} received. Sending status.")
-            # TODO(kdevo)
-
-
-        def shutdown_signal_received(signum, frame):
-            logging.warning(f"SIGUSR2 #{signum} received. Preparing for shutdown.")
-            nonlocal running
-            running = False
-            self._io.notify_shutdown()
-
-        # TODO(kdevo): A future shutdown can also be signaled with SIGUSR2 (e.g. `systemctl kill -s SIGUSR1 argond`),
-        #   but because usually the systemd shutdown script is installed, this does not have any effect.
-        signal.signal(signal.SIGUSR2, shutdown_signal_received)
-        signal.signal(signal.SIGUSR1, status_signal_received)
+        settings = self.config.settings
+        lock = self._lock()
+        try:
+            self._daemon(settings, fan_profile, button_profile)
+        finally:
+            lock.release()
+
+    def _lock(self) -> 'DaemonLock':
+        """Take the daemon lock next to the control socket. Without permission to create its directory (i.e. not
+        started as root or by systemd), the lock falls back to the user's runtime directory."""
+        from argon.lock import DaemonLock, LockError
+        lock = DaemonLock(self._run_path(DaemonLock.NAME))
+        try:
+            lock.acquire()
+            return lock
+        except LockError as e:
+            if not isinstance(e.__cause__, OSError):
+                raise
+            runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+            if not isinstance(e.__cause__, PermissionError) or not runtime_dir:
+                raise LockError(f"{e} (the lock is kept next to the `control_socket` of [Settings])") from e
+            fallback = DaemonLock(os.path.join(runtime_dir, 'argond', DaemonLock.NAME))
+            logging.warning(f"{e}, locking '{fallback.path}' instead: only guards against daemons of the same user "
+                            f"(set `control_socket` in [Settings] to a writable directory to share the lock).")
+        fallback.acquire()
+        return fallback
+
+    def _daemon(self, settings, fan_profile, button_profile):
+        from argon.daemon import Daemon
+        from argon.lock import Lease
+        from argon.notify import Notifier
+        from argon.poweroff import powering_off
+        from argon.throttle import open_source
+        self._io.set_power_mode(settings.power_mode_always_on)
+
+        # A future shutdown can also be signaled with SIGUSR2 (e.g. `systemctl kill -s SIGUSR2 argond`). When systemd
+        # stops the daemon for a poweroff/halt, it tells the case itself, before the shutdown script would.
         if os.getuid() != 0:
             logging.warning("Daemon not started as root. Will probably not be able to shutdown.")
         if not fan_profile:
-            fan_profile = self._cfg['Settings']['fan_profile']
+            fan_profile = settings.fan_profile
         if not button_profile:
-            button_profile = self._cfg['Settings']['button_profile']
+            button_profile = settings.button_profile
         logging.info("Running in daemon/driver mode.")
-        logging.debug(f"Button profile: {button_profile}")
-        self._io.register_callback(lambda t: self.handle_button(button_profile, t))
+        logging.debug("Button profile: %s", button_profile)
 
-        logging.info(f"Fan profile: {fan_profile}")
-        check_interval = float(self._cfg['Settings']['temp_check_interval'])
-        # Sorting descending ensures that...
-        #   a) items have the an order
-        #   b) the correct fan speed is set immediately instead of step-wise
-        temps = sorted([int(t) for t in self._cfg[fan_profile]], reverse=True)
-        # TODO(kdevo): Refactor to separate fan class:
-        speed = 0
-        logging.debug(f"Sorted temperatures of the profile: {temps}")
-
-        # TODO(kdevo): Useful for possible tests:
-        # def fake_temp():
-        #     return randint(40, 100)
-        # util.get_temp = fake_temp
-
-        while running:
-            cur_temp = util.get_temp()
-            logging.debug(f"Got current temperature: {cur_temp}°C")
-            for target_temp in temps:
-                if cur_temp >= target_temp:
-                    new_speed = int(self._cfg[fan_profile][str(target_temp)])
-                    if speed == new_speed:
-                        logging.debug(f"Fan already running at specified speed {new_speed}%, no need to set it again.")
-                        break
-                    logging.info(f"Set fan speed to {new_speed}%. "
-                                 f"Target temperature exceeded: {cur_temp}°C >= {target_temp}°C")
-                    self._io.set_fan_speed(new_speed)
-                    speed = new_speed
-                    break
-            else:
-                if speed > 0:
-                    logging.info("No given temperature has been exceeded. Turning off fan.")
-                    self.set_fan(0)
-                    speed = 0
+        sensor = self._sim.sensor if self._sim else open_sensor(settings.temp_sensor)
+        sensor, sensor_profiles = self._open_sensors(sensor)
+        logging.info(f"Temperature sensor: {sensor.name}")
+        throttle = self._sim.throttle if self._sim else open_source()
+        if throttle is not None:
+            logging.info(f"Throttle state: {throttle.name}")
 
-            logging.debug(f"Sleeping {check_interval} seconds...")
-            time.sleep(check_interval)
+        def load_profile(profile):
+            curve = self.config.curve(profile, self._sim.cpu_load if self._sim else None)
+            logging.debug("Compiled fan curve of '%s': %s", profile, curve)
+            return curve, self.config.scheduler(curve)
 
-    # TODO
-    # def status(self):
-    #     click.echo()
-    #     click.echo("Active fan profile: {} running at {} (temperature: )")
-    #     click.echo("Active button profile: {}")
-    #     systemd/daemon status etc.
+        def reload_config():
+            self._reload_config(daemon)
+
+        history = None
+        if settings.history:
+            try:
+                history = History.open(settings.history, settings.history_size)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Unable to open history '{settings.history}', continuing without it: {e}")
+
+        try:
+            lease = Lease.create(self._run_path(Lease.NAME))
+        except OSError as e:
+            logging.warning(f"Unable to create the fan lease, commands cannot keep the daemon from the fan: {e}")
+            lease = None
+        notifier = Notifier.from_environment()
+        if notifier and notifier.watchdog:
+            logging.info(f"Pinging the systemd watchdog at least every {notifier.watchdog / 2:g}s")
+
+        logging.info(f"Fan profile: {fan_profile}")
+        daemon = Daemon(self._io, sensor, fan_profile, load_profile,
+                        button_profile=button_profile, button_handler=self.handle_button,
+                        button_settle_time=settings.button_settle_time, control_socket=settings.control_socket,
+                        metrics=settings.metrics, history=history,
+                        config_file=str(self._config_file), reload_config=reload_config,
+                        sensor_profiles=sensor_profiles, powering_off=powering_off, throttle=throttle,
+                        notifier=notifier, lease=lease)
+        try:
+            daemon.run()
+        finally:
+            if self._executor:
+                self._executor.close()
+            sensor.close()
+            if throttle is not None:
+                throttle.close()
+            if notifier:
+                notifier.close()
+            if history is not None:
+                history.close()
+
+    def _open_sensors(self, soc_sensor):
+        """Combine `soc_sensor` with the sensors of the `Sensor:*` sections (if any).
+
+        Returns the sensor and the fan profiles of the individual sensors.
+        """
+        specs = self.config.sensors
+        if not specs:
+            return soc_sensor, {}
+        sensors = {'soc': soc_sensor}
+        weights = {'soc': 1.0}
+        for name, spec in specs.items():
+            try:
+                sensor = open_sensor(spec.source)
+            except SensorError as e:
+                logging.warning(f"Sensor '{name}' ({spec.source}) unavailable, ignoring it: {e}")
+                continue
+            sensors[name] = PeriodicSensor(sensor, spec.interval) if spec.interval else sensor
+            weights[name] = spec.weight
+            logging.info(f"Additional temperature sensor '{name}': {sensor.name}"
+                         + (f", read every {spec.interval:g}s" if spec.interval else ''))
+        sensor_profiles = {name: spec.fan_profile for name, spec in specs.items()
+                           if spec.fan_profile and name in sensors}
+        return AggregateSensor(sensors, weights, self.config.settings.temp_combine), sensor_profiles
+
+    # Settings that are only read when the daemon starts:
+    RESTART_SETTINGS = ('temp_sensor', 'temp_combine', 'button_settle_time', 'action_timeout', 'control_socket',
+                        'metrics', 'history', 'history_size', 'backend')
+
+    def _reload_config(self, daemon):
+        """Swap in a new snapshot of the changed config file and apply it to the running `daemon`."""
+        old = self.config
+        try:
+            new = config.load(self._config_file)
+        except ConfigError as e:
+            logging.error(f"Rejected the changed configuration, keeping the current one: {e}")
+            return
+        if new == old:
+            logging.debug("Configuration file touched, but nothing changed.")
+            return
+        self._lazy_config, self._lazy_cfg = new, None
+        logging.info("Configuration changed, applying it.")
+        changed = [name for name in self.RESTART_SETTINGS if getattr(new.settings, name) != getattr(old.settings, name)]
+        # Sources, intervals and weights of the sensors, their fan profiles can be changed on the fly:
+        if ({name: spec[:3] for name, spec in new.sensors.items()}
+                != {name: spec[:3] for name, spec in old.sensors.items()}):
+            changed.append('sensors')
+        if changed:
+            logging.warning(f"Changing {', '.join(changed)} only takes effect after restarting the daemon.")
+        if new.settings.power_mode_always_on != old.settings.power_mode_always_on:
+            self._io.set_power_mode(new.settings.power_mode_always_on)
+        daemon.button_profile = new.settings.button_profile
+        daemon.sensor_profiles = {name: spec.fan_profile for name, spec in new.sensors.items()
+                                  if spec.fan_profile and name in getattr(daemon.sensor, 'values', {})}
+        # A profile switched to at runtime stays active unless the configured one changes (or vanishes):
+        fan_profile = daemon.fan_profile
+        if new.settings.fan_profile != old.settings.fan_profile or fan_profile not in new.fan_profiles:
+            fan_profile = new.settings.fan_profile
+        daemon.switch_profile(fan_profile)
+
+    def history(self, as_csv=False, since: float = None):
+        """Print a summary (or all samples as CSV) of the history recorded by the daemon."""
+        path = self._cfg['Settings'].get('history', History.DEFAULT_PATH)
+        if not path:
+            raise HistoryError("History is disabled (empty 'history' setting).")
+        history = History.open_readonly(path)
+        try:
+            since = time.time() - since if since else None
+            if as_csv:
+                click.echo('timestamp,temp,fan_speed,flags')
+                for stamp, temp, duty, flags in history.samples(since):
+                    click.echo(f"{stamp:.3f},{'' if temp != temp else f'{temp:.2f}'},"
+                               f"{'' if duty is None else duty},{format_flags(flags)}")
+                return
+            summary = history.summary(since)
+            if not summary['samples']:
+                util.warning("No samples recorded (yet).")
+                return
+
+            def at(stamp):
+                return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stamp))
+
+            def temp(value):
+                return 'N/A' if value is None else f'{value:.1f}°C'
+
+            click.echo(f"Samples:        {summary['samples']} of {history.capacity} "
+                       f"({at(summary['first'])} to {at(summary['last'])})")
+            click.echo(f"Temperature:    min {temp(summary['temp_min'])}, avg {temp(summary['temp_avg'])}, "
+                       f"max {temp(summary['temp_max'])}"
+                       + (f" at {at(summary['temp_max_at'])}" if summary['temp_max_at'] else ''))
+            if summary['duty_avg'] is not None:
+                click.echo(f"Fan speed:      avg {summary['duty_avg']:.0f}%, "
+                           f"running {summary['fan_on_ratio'] * 100:.0f}% of the samples")
+            click.echo(f"Events:         " + ', '.join(f"{count}x {name}"
+                                                       for name, count in summary['events'].items() if count))
+        finally:
+            history.close()
+
+    def tune(self, traces=(), max_temp=75.0, name='Fan:Tuned'):
+        """Print the fan table best suited for the recorded `traces` (CSV files), or for the daemon's history."""
+        from argon.fan import FanCurve
+        from argon.tune import format_section, from_samples, read_csv, tune
+        if traces:
+            traces = [read_csv(file) for file in traces]
+        else:
+            path = self._cfg['Settings'].get('history', History.DEFAULT_PATH)
+            if not path:
+                raise HistoryError("History is disabled (empty 'history' setting), pass a trace instead.")
+            history = History.open_readonly(path)
+            try:
+                traces = [from_samples(history.samples())]
+            finally:
+                history.close()
+        # The configured step tables for comparison:
+        references = {}
+        for profile in self.config.fan_profiles:
+            curve = self.config.curve(profile)
+            if type(curve) is FanCurve and not curve.interpolate and len(curve.temps) <= 3:
+                references[profile] = dict(zip(curve.temps, curve.speeds))
+        result = tune(traces, max_temp, interval=self.config.settings.temp_check_interval, references=references)
+        click.echo(format_section(name, result))
 
     def notify_shutdown(self):
+        # Superseded by the lighter `argon-poweroff` (see `argon.poweroff`), kept for existing shutdown scripts:
         logging.info("Got notification for final shutdown sequence (usually called by systemd).")
         self._io.notify_shutdown()
         logging.info("Final shutdown sequence finished, told Argon to shutdown case circuit.")
@@ -257,14 +620,29 @@ class Argon:
     def configure(self):
         logging.info(f"Opening configuration file '{self._config_file}' with preferred text editor.")
         old_cfg = self._config_file.read_text()
-        click.edit(filename=self._config_file, extension='.ini')
-        new_cfg = self._config_file.read_text()
-        if old_cfg == new_cfg:
-            logging.info("No changes have been made.")
-        else:
-            logging.info("Detected changes.")
-            if click.confirm("Apply the changes you just made? This will restart the argon service."):
-                util.info("Restarting via systemctl.")
-                subprocess.run('sudo systemctl restart argond', shell=True)
-            else:
+        new_cfg = old_cfg
+        while True:
+            new_cfg = click.edit(new_cfg, extension='.ini', require_save=False)
+            if new_cfg is None or new_cfg == old_cfg:
+                logging.info("No changes have been made.")
+                return
+            try:
+                parser = ini.ConfigParser()
+                parser.read_string(new_cfg)
+                config.parse(parser)
+            except (ini.Error, ConfigError) as e:
+                util.error(f"Invalid configuration: {e}")
+                if click.confirm("Edit again?", default=True):
+                    continue
                 util.info("Changes will not be applied.")
+                return
+            break
+        logging.info("Detected valid changes.")
+        if click.confirm("Apply the changes you just made? A running daemon picks them up without restarting."):
+            # Replace the file atomically, so that the daemon never reads a half-written one:
+            tmp = self._config_file.with_name(f'.{self._config_file.name}.tmp')
+            tmp.write_text(new_cfg)
+            os.replace(tmp, self._config_file)
+            util.success("Changes applied.")
+        else:
+            util.info("Changes will not be applied.")
@@ -0,0 +1,77 @@
+from array import array
+from typing import Optional
+
+
+class ButtonClassifier:
+    """Pure state machine turning the edges of the case's button signal into interactions.
+
+    The case's MCU does not forward the raw button state but encodes interactions as pulses on the GPIO:
+    A single wide pulse means the button has been held (`long`), a single narrow one or two pulses mean a
+    `double` push, and everything above is counted as `many` pushes.
+    Edges are recorded into a fixed-size ring buffer. The sequence is classified once no further edge
+    arrived within `settle` seconds, i.e. there is exactly one deadline to wait for and nothing to poll.
+    """
+    INTERACTIONS = ('long', 'double', 'many')
+
+    def __init__(self, settle: float = 1.0, min_pulse: float = 0.01, long_pulse: float = 0.03, capacity: int = 32):
+        self.settle = settle
+        self.min_pulse = min_pulse
+        self.long_pulse = long_pulse
+        self._stamps = array('d', bytes(8 * capacity))
+        self._levels = bytearray(capacity)
+        self._head = 0
+        self._count = 0
+        self.deadline = None  # type: Optional[float]
+
+    def edge(self, timestamp: float, level: int) -> float:
+        """Record an edge (`level` is the pin state after it) and return the new classification deadline."""
+        capacity = len(self._levels)
+        self._stamps[self._head] = timestamp
+        self._levels[self._head] = 1 if level else 0
+        self._head = (self._head + 1) % capacity
+        self._count = min(self._count + 1, capacity)
+        self.deadline = timestamp + self.settle
+        return self.deadline
+
+    def expire(self, now: float) -> Optional[str]:
+        """Classify and reset if the deadline has passed. Returns `long`, `double`, `many` or None."""
+        if self.deadline is None or now < self.deadline:
+            return None
+        interaction = self.classify(now)
+        self.reset()
+        return interaction
+
+    def edges(self):
+        capacity = len(self._levels)
+        start = (self._head - self._count) % capacity
+        for i in range(self._count):
+            idx = (start + i) % capacity
+            yield self._stamps[idx], self._levels[idx]
+
+    def pulses(self, now: float):
+        """Widths of the recorded high pulses; a pulse still high at `now` ends there."""
+        widths = []
+        rise = None
+        for stamp, level in self.edges():
+            if level and rise is None:
+                rise = stamp
+            elif not level and rise is not None:
+                widths.append(stamp - rise)
+                rise = None
+        if rise is not None:
+            widths.append(now - rise)
+        return [w for w in widths if w >= self.min_pulse]
+
+    def classify(self, now: float) -> Optional[str]:
+        pulses = self.pulses(now)
+        if not pulses:
+            return None
+        if len(pulses) == 1:
+            return 'long' if pulses[0] >= self.long_pulse else 'double'
+        return 'double' if len(pulses) == 2 else 'many'
+
+    def reset(self):
+        self._head = 0
+        self._count = 0
+        self.deadline = None
+
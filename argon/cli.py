@@ -15,6 +15,9 @@ os.chdir(home_dir)
 
 from argon.util import get_temp
 from argon.argon import Argon
+from argon.config import ConfigError
+from argon.control import ControlError
+from argon.history import HistoryError
 
 
 @click.group()
@@ -39,30 +42,115 @@ def cli(ctx, verbose: bool, config: str):
 
 
 @cli.command()
+@click.option('--batch', is_flag=True, default=False,
+              help='run all checks concurrently without asking and print a JSON report (exit code 1 on failures)')
+@click.option('--button', type=float, default=0, metavar='SECONDS',
+              help='in batch mode, also wait up to SECONDS for a button push')
 @click.pass_obj
-def doctor(argon):
+def doctor(argon, batch: bool, button: float):
     """Run interactive checks to verify hardware and software functionality.
     """
+    if batch:
+        sys.exit(0 if argon.doctor_batch(button) else 1)
     argon.doctor()
 
 
 @cli.command()
-def temp():
-    """Print the detected temperature to stdout.
+@click.pass_obj
+def temp(argon):
+    """Print the temperature of the configured sensor (`temp_sensor`) to stdout.
     """
-    print(get_temp(as_str=True))
+    try:
+        print(get_temp(argon.config.settings.temp_sensor, as_str=True))
+    except ConfigError as e:
+        raise click.ClickException(str(e))
 
 
-@click.argument('speed', type=int, nargs=1)
+@click.argument('speed', type=click.IntRange(0, 100), nargs=1)
+@click.option('--duration', type=float, default=None,
+              help='seconds until a running daemon returns to its fan profile (default: 600)')
 @cli.command()
 @click.pass_obj
-def fan(argon, speed: int):
+def fan(argon, speed: int, duration: float):
     """
-    Set fan SPEED. Note: Might interfere with running daemon.
+    Set fan SPEED. If the daemon is running, it keeps the SPEED for the given duration.
 
     SPEED is in percent, 0 (off) to 100 (max).
     """
-    argon.set_fan(speed)
+    try:
+        argon.set_fan(speed, duration)
+    except ControlError as e:
+        raise click.ClickException(str(e))
+
+
+@click.argument('fan_profile', type=str, nargs=1)
+@cli.command()
+@click.pass_obj
+def profile(argon, fan_profile: str):
+    """Switch the running daemon to FAN_PROFILE (e.g. Fan:Silent) without restarting it.
+    """
+    try:
+        argon.switch_profile(fan_profile)
+    except ControlError as e:
+        raise click.ClickException(str(e))
+
+
+@cli.command()
+@click.pass_obj
+def status(argon):
+    """Show the status of the running daemon.
+    """
+    try:
+        argon.status()
+    except ConfigError as e:
+        raise click.ClickException(str(e))
+
+
+@click.option('--json', 'as_json', default=False, is_flag=True, help='print the raw report as JSON')
+@cli.command()
+@click.pass_obj
+def report(argon, as_json: bool):
+    """Show the time spent throttled (soft temperature limit, frequency capped, throttled, under-voltage),
+    the maximum temperature and the average fan speed per fan profile since the daemon started.
+    """
+    try:
+        argon.report(as_json)
+    except ControlError as e:
+        raise click.ClickException(str(e))
+
+
+@click.argument('traces', type=click.File('r'), nargs=-1)
+@click.option('--max-temp', type=float, default=75.0, show_default=True,
+              help='highest temperature the fan table may allow on the traces')
+@click.option('--name', default='Fan:Tuned', show_default=True, help='name of the printed section')
+@cli.command()
+@click.pass_obj
+def tune(argon, traces, max_temp: float, name: str):
+    """Find the fan table with the lowest average fan speed, loudness and number of speed changes that keeps the
+    temperature below MAX_TEMP, by replaying recorded TRACES (CSV files as printed by `argon history --csv`,
+    `-` for stdin; the daemon's history by default). Prints a ready-to-use [Fan:*] section. Needs NumPy.
+    """
+    try:
+        from argon.tune import TuneError
+    except ImportError:
+        raise click.ClickException("'argon tune' needs NumPy, e.g.: pip3 install numpy")
+    try:
+        argon.tune(traces, max_temp, name)
+    except (TuneError, HistoryError) as e:
+        raise click.ClickException(str(e))
+
+
+@click.option('--csv', 'as_csv', default=False, is_flag=True, help='print all samples as CSV')
+@click.option('--since', type=float, default=None, help='only consider the last SINCE seconds')
+@cli.command()
+@click.pass_obj
+def history(argon, as_csv: bool, since: float):
+    """Summarize the temperature and fan speed history recorded by the daemon.
+    """
+    try:
+        argon.history(as_csv, since)
+    except HistoryError as e:
+        raise click.ClickException(str(e))
 
 
 @cli.command()
@@ -71,17 +159,23 @@ def daemon(argon):
     """Start daemon/driver mode (non-forking), reacting to your button pushes
     and setting the temperature according to the chosen profile.
 
-    Warnings:
-        Running multiple daemons can cause interferences.
+    Only one daemon runs at a time, a second one exits right away.
     """
-    argon.daemon()
+    from argon.lock import LockError
+    from argon.logs import setup_daemon
+    setup_daemon(logging.root.isEnabledFor(logging.DEBUG))
+    try:
+        argon.daemon()
+    except (ConfigError, LockError) as e:
+        raise click.ClickException(str(e))
 
 
 @cli.command()
 @click.pass_obj
 def config(argon):
     """Call your preferred editor for configuring CONFIG, plus other safety checks.
-    Prefer this over editing the file manually."""
+    Prefer this over editing the file manually: Invalid changes are rejected, valid ones are
+    applied atomically and picked up by the running daemon without a restart."""
     argon.configure()
 
 
@@ -0,0 +1,274 @@
+import configparser as ini
+import logging
+import os
+import struct
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable, Mapping, NamedTuple, Optional
+
+from argon.action import Argv, parse as parse_action
+from argon.button import ButtonClassifier
+from argon.control import ControlServer
+from argon.fan import FanCurve, compile_profile
+from argon.history import History
+from argon.schedule import AdaptiveInterval, FixedInterval
+from argon.sensor import SPECS, AggregateSensor
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class Settings(NamedTuple):
+    fan_profile: str
+    button_profile: str
+    power_mode_always_on: bool
+    temp_sensor: str
+    temp_combine: str
+    temp_check_mode: str
+    temp_check_interval: float
+    temp_check_interval_min: float
+    temp_check_interval_max: float
+    button_settle_time: float
+    action_timeout: float
+    control_socket: str
+    metrics: Optional[str]
+    history: Optional[str]
+    history_size: int
+    backend: str
+
+
+class SensorSpec(NamedTuple):
+    """An additional temperature source from a `Sensor:*` section."""
+    source: str
+    # Seconds between reads in the background (0: read on every tick):
+    interval: float
+    # Weight when combining it with the other sensors (0: only used for its own fan profile):
+    weight: float
+    # Fan profile applied to this sensor's temperature (the fan runs at the highest speed of all profiles):
+    fan_profile: Optional[str]
+
+
+class Config(NamedTuple):
+    """Immutable, validated snapshot of the config file.
+
+    Parsed once, so nothing has to index the `ConfigParser` afterwards. A new snapshot replaces the old one as
+    a whole, i.e. the daemon either sees the old or the new configuration, never a mix.
+    """
+    settings: Settings
+    # Profile name → (key, value) pairs of the `Fan:*` section, validated by compiling them once:
+    fan_profiles: Mapping[str, Mapping[str, str]]
+    # Profile name → interaction → action (argv, empty for no action):
+    button_profiles: Mapping[str, Mapping[str, Argv]]
+    # Sensor name (section name without `Sensor:`) → spec:
+    sensors: Mapping[str, SensorSpec] = MappingProxyType({})
+
+    def curve(self, fan_profile: str, load: Callable[[], float] = None) -> FanCurve:
+        """Compile a fresh (stateful) fan curve or PID controller of `fan_profile` (see `compile_profile`)."""
+        try:
+            return compile_profile(self.fan_profiles[fan_profile], load)
+        except KeyError:
+            raise ConfigError(f"Unknown fan profile '{fan_profile}'")
+
+    def scheduler(self, curve: FanCurve) -> FixedInterval:
+        if self.settings.temp_check_mode == 'adaptive':
+            return AdaptiveInterval(curve, min_interval=self.settings.temp_check_interval_min,
+                                    max_interval=self.settings.temp_check_interval_max)
+        return FixedInterval(self.settings.temp_check_interval)
+
+    def action(self, button_profile: str, interaction: str) -> Argv:
+        return self.button_profiles.get(button_profile, {}).get(interaction, ())
+
+
+def parse(cfg: ini.ConfigParser) -> Config:
+    """Validate `cfg` and turn it into a `Config` snapshot. Raises `ConfigError` describing the first problem."""
+    if 'Settings' not in cfg:
+        raise ConfigError("Missing section [Settings]")
+    section = cfg['Settings']
+    try:
+        settings = Settings(
+            fan_profile=section.get('fan_profile', 'Fan:Vendor'),
+            button_profile=section.get('button_profile', 'Button:Vendor'),
+            power_mode_always_on=section.getboolean('power_mode_always_on', False),
+            temp_sensor=section.get('temp_sensor', 'auto'),
+            temp_combine=section.get('temp_combine', 'max'),
+            temp_check_mode=section.get('temp_check_mode', 'fixed'),
+            temp_check_interval=section.getfloat('temp_check_interval', 10.0),
+            temp_check_interval_min=section.getfloat('temp_check_interval_min', 2.0),
+            temp_check_interval_max=section.getfloat('temp_check_interval_max', 60.0),
+            button_settle_time=section.getfloat('button_settle_time', 1.0),
+            action_timeout=section.getfloat('action_timeout', 60.0),
+            control_socket=section.get('control_socket') or ControlServer.DEFAULT_PATH,
+            metrics=section.get('metrics') or None,
+            history=section.get('history', History.DEFAULT_PATH) or None,
+            history_size=section.getint('history_size', History.DEFAULT_CAPACITY),
+            backend=section.get('backend', 'hardware'),
+        )
+    except ValueError as e:
+        raise ConfigError(f"Invalid value in [Settings]: {e}")
+    if settings.temp_check_mode not in ('fixed', 'adaptive'):
+        raise ConfigError(f"Unknown temp_check_mode '{settings.temp_check_mode}', must be 'fixed' or 'adaptive'")
+    if (settings.temp_check_interval <= 0
+            or not 0 < settings.temp_check_interval_min <= settings.temp_check_interval_max):
+        raise ConfigError("Temperature check intervals must be positive (and min <= max)")
+    if settings.button_settle_time <= 0 or settings.action_timeout <= 0 or settings.history_size <= 0:
+        raise ConfigError("button_settle_time, action_timeout and history_size must be positive")
+    if settings.temp_combine not in AggregateSensor.MODES:
+        raise ConfigError(f"Unknown temp_combine '{settings.temp_combine}', must be 'max' or 'weighted'")
+    if settings.backend not in ('hardware', 'sim'):
+        raise ConfigError(f"Unknown backend '{settings.backend}', must be 'hardware' or 'sim'")
+
+    fan_profiles = {}
+    button_profiles = {}
+    sensors = {}
+    for name in cfg.sections():
+        items = MappingProxyType(dict(cfg[name]))
+        if name.startswith('Fan:'):
+            try:
+                compile_profile(items)
+            except ValueError as e:
+                raise ConfigError(f"Invalid fan profile [{name}]: {e}")
+            fan_profiles[name] = items
+        elif name.startswith('Button:'):
+            unknown = set(items) - set(ButtonClassifier.INTERACTIONS)
+            if unknown:
+                raise ConfigError(f"Invalid button profile [{name}]: "
+                                  f"unknown interaction(s) {', '.join(sorted(unknown))}")
+            try:
+                button_profiles[name] = MappingProxyType({key: parse_action(value) for key, value in items.items()})
+            except ValueError as e:
+                raise ConfigError(f"Invalid action in button profile [{name}]: {e}")
+        elif name.startswith('Sensor:'):
+            if name == 'Sensor:soc':
+                raise ConfigError("[Sensor:soc] is reserved for `temp_sensor`")
+            sensors[name[len('Sensor:'):]] = _sensor_spec(name, cfg[name])
+    for name, sensor in sensors.items():
+        if sensor.fan_profile and sensor.fan_profile not in fan_profiles:
+            raise ConfigError(f"Fan profile '{sensor.fan_profile}' of [Sensor:{name}] does not exist")
+    if settings.fan_profile not in fan_profiles:
+        raise ConfigError(f"Fan profile '{settings.fan_profile}' does not exist")
+    if settings.button_profile not in button_profiles:
+        raise ConfigError(f"Button profile '{settings.button_profile}' does not exist")
+    return Config(settings, MappingProxyType(fan_profiles), MappingProxyType(button_profiles),
+                  MappingProxyType(sensors))
+
+
+def _sensor_spec(name: str, section: ini.SectionProxy) -> SensorSpec:
+    unknown = set(section) - set(SensorSpec._fields)
+    if unknown:
+        raise ConfigError(f"Invalid sensor [{name}]: unknown option(s) {', '.join(sorted(unknown))}")
+    try:
+        spec = SensorSpec(source=section['source'], interval=section.getfloat('interval', 0.0),
+                          weight=section.getfloat('weight', 1.0), fan_profile=section.get('fan_profile') or None)
+    except (KeyError, ValueError) as e:
+        raise ConfigError(f"Invalid sensor [{name}]: {e}")
+    if spec.source.partition(':')[0] not in SPECS:
+        raise ConfigError(f"Invalid sensor [{name}]: unknown source '{spec.source}'")
+    if spec.interval < 0 or spec.weight < 0:
+        raise ConfigError(f"Invalid sensor [{name}]: interval and weight must not be negative")
+    return spec
+
+
+def load(path) -> Config:
+    cfg = ini.ConfigParser()
+    try:
+        with open(path) as file:
+            cfg.read_file(file)
+    except (OSError, ini.Error) as e:
+        raise ConfigError(f"Unable to read config '{path}': {e}")
+    return parse(cfg)
+
+
+class ConfigWatcher:
+    """Calls `callback` (on the event loop) after the file at `path` has been changed.
+
+    Uses inotify on the file's directory, which also catches editors replacing the file, and falls back to
+    polling the file's mtime every `poll_interval` seconds where inotify is unavailable. Changes are debounced
+    by `delay` seconds, so that a burst of writes results in a single callback.
+    """
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, path, callback: Callable[[], None], poll_interval: float = 5.0, delay: float = 0.5):
+        self.path = Path(path).absolute()
+        self._callback = callback
+        self.poll_interval = poll_interval
+        self.delay = delay
+        self._loop = None
+        self._fd = None
+        self._handle = None
+        self._stat = self._current_stat()
+
+    def start(self, loop):
+        self._loop = loop
+        try:
+            self._fd = self._inotify(str(self.path.parent))
+        except OSError as e:
+            logging.info(f"inotify unavailable ({e}), polling '{self.path}' for changes instead.")
+            self._handle = loop.call_later(self.poll_interval, self._poll)
+        else:
+            loop.add_reader(self._fd, self._read_events)
+
+    def close(self):
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+
+    def _inotify(self, directory: str) -> int:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except AttributeError:
+            raise OSError("no inotify in libc")
+        fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        if add_watch(fd, directory.encode(), self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno))
+        return fd
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        name = self.path.name.encode()
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            if data[offset:offset + length].rstrip(b'\0') == name:
+                self._debounce()
+            offset += length
+
+    def _current_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _poll(self):
+        self._handle = self._loop.call_later(self.poll_interval, self._poll)
+        if self._current_stat() != self._stat:
+            self._fire()
+
+    def _debounce(self):
+        if self._handle:
+            self._handle.cancel()
+        self._handle = self._loop.call_later(self.delay, self._fire)
+
+    def _fire(self):
+        if self._fd is not None:
+            self._handle = None
+        self._stat = self._current_stat()
+        self._callback()
@@ -0,0 +1,129 @@
+import grp
+import json
+import logging
+import os
+import socket
+
+
+class ControlError(Exception):
+    pass
+
+
+class DaemonUnavailable(ControlError):
+    pass
+
+
+class ControlServer:
+    """Serves a running `Daemon` on a Unix domain socket.
+
+    The protocol is one JSON object per line in both directions. Requests have an `op` and its arguments:
+        {"op": "status"}
+        {"op": "fan", "speed": 80, "duration": 600}  (`"speed": null` clears the override)
+        {"op": "profile", "fan": "Fan:Silent"}
+        {"op": "report"}  (time throttled etc. per fan profile)
+    Responses contain `"ok": true` and the result, or `"ok": false` and an `error` message.
+    """
+    DEFAULT_PATH = '/run/argond/control.sock'
+    # Users allowed to access the fan via i2c directly are allowed to control it via the daemon, too:
+    GROUP = 'i2c'
+    MAX_REQUEST = 4096
+    DEFAULT_OVERRIDE_DURATION = 600
+
+    def __init__(self, daemon, path: str = DEFAULT_PATH):
+        self._daemon = daemon
+        self.path = path
+        self._server = None
+
+    async def start(self):
+        import asyncio
+        try:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._serve, self.path, limit=self.MAX_REQUEST)
+        except OSError:
+            logging.exception(f"Unable to listen on control socket '{self.path}', continuing without it.")
+            return
+        os.chmod(self.path, 0o660)
+        try:
+            os.chown(self.path, -1, grp.getgrnam(self.GROUP).gr_gid)
+        except (KeyError, PermissionError):
+            logging.warning(f"Unable to hand control socket '{self.path}' over to group '{self.GROUP}'.")
+        logging.info(f"Listening on control socket '{self.path}'.")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    async def _serve(self, reader: 'asyncio.StreamReader', writer: 'asyncio.StreamWriter'):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(json.dumps(self.handle(line)).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logging.debug(f"Control connection closed: {e}")
+        finally:
+            writer.close()
+
+    def handle(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            op = request['op']
+            handler = getattr(self, f'_op_{op}')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {'ok': False, 'error': f"Invalid request {line[:80]!r}"}
+        try:
+            result = handler(request)
+        except (ValueError, KeyError, TypeError) as e:
+            return {'ok': False, 'error': str(e)}
+        return dict(result or {}, ok=True)
+
+    def _op_status(self, request):
+        return self._daemon.status()
+
+    def _op_report(self, request):
+        return self._daemon.report()
+
+    def _op_fan(self, request):
+        speed = request['speed']
+        self._daemon.set_override(None if speed is None else int(speed),
+                                  float(request.get('duration') or self.DEFAULT_OVERRIDE_DURATION))
+
+    def _op_profile(self, request):
+        self._daemon.switch_profile(str(request['fan']))
+
+
+class ControlClient:
+    """Talks to a running daemon via its control socket, see `ControlServer` for the protocol."""
+
+    def __init__(self, path: str = ControlServer.DEFAULT_PATH, timeout: float = 2.0):
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, op: str, **kwargs) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+                raise DaemonUnavailable(f"Daemon not reachable via '{self.path}': {e}") from e
+            try:
+                sock.sendall(json.dumps(dict(kwargs, op=op)).encode() + b'\n')
+                response = sock.makefile('rb').readline()
+            except OSError as e:
+                raise ControlError(f"Communication with daemon failed: {e}") from e
+        try:
+            response = json.loads(response)
+        except ValueError:
+            raise ControlError(f"Invalid response {response[:80]!r}")
+        if not response.pop('ok', False):
+            raise ControlError(response.get('error', "Unknown error"))
+        return response
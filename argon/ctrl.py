@@ -1,10 +1,10 @@
 import logging
-from typing import Dict, Callable
+from typing import Callable, Dict, Optional
 
-import smbus
-import RPi.GPIO as GPIO
 import time
 
+from argon.i2c import Register
+
 
 class IO:
     # IO Layout
@@ -15,11 +15,33 @@ class IO:
 
     FAN_RPM = 11_000
 
-    def __init__(self):
-        # Setup IO
-        self._bus = smbus.SMBus(1 if GPIO.RPI_REVISION in (2, 3) else 0)
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+    def __init__(self, bus=None, gpio=None, clock=time.monotonic):
+        """Set up i2c and GPIO. Pass `bus` (SMBus-like) and `gpio` (RPi.GPIO-like) to use another backend,
+        e.g. the simulated one from `argon.sim`. `clock` timestamps the button edges."""
+        if gpio is None:
+            import RPi.GPIO as gpio
+        if bus is None:
+            import smbus
+            bus = smbus.SMBus(1 if gpio.RPI_REVISION in (2, 3) else 0)
+        self._bus = bus
+        self._gpio = gpio
+        self._clock = clock
+        self._registers = {}  # type: Dict[int, Register]
+        gpio.setmode(gpio.BCM)
+        gpio.setup(self.BUTTON_PIN, gpio.IN, pull_up_down=gpio.PUD_DOWN)
+
+    def register(self, i2c_addr=I2C_ADDR) -> Register:
+        """Register 0 of the device at `i2c_addr`, all writes go through it."""
+        if i2c_addr not in self._registers:
+            self._registers[i2c_addr] = Register(self._bus, i2c_addr, 0)
+        return self._registers[i2c_addr]
+
+    def invalidate(self, i2c_addr=I2C_ADDR):
+        """Forget the register's value, e.g. after another process has written it."""
+        self.register(i2c_addr).invalidate()
+
+    def i2c_stats(self) -> Dict[int, dict]:
+        return {addr: dict(register.stats) for addr, register in self._registers.items()}
 
     def button_pushed(self, channel: int, callback=None):
         logging.info("Button pushed (channel: %s)", channel)
@@ -29,14 +51,26 @@ class IO:
     def set_power_mode(self, always_on=False):
         if always_on:
             logging.info("Set power mode to 'always on'")
-            self._bus.write_byte_data(self.I2C_ADDR, 0, 0xFE)
+            self.register().write(0xFE, force=True)
         else:
             logging.info("Set powermode to default")
-            self._bus.write_byte_data(self.I2C_ADDR, 0, 0xFD)
+            self.register().write(0xFD, force=True)
 
-    def wait_for_button(self):
-        while GPIO.input(self.BUTTON_PIN) == 0:
-            pass
+    def probe(self, i2c_addr=I2C_ADDR):
+        """Read a byte from the device at `i2c_addr`, raises `OSError` if it does not acknowledge."""
+        self._bus.read_byte(i2c_addr)
+
+    def wait_for_edge(self, timeout: float = None) -> Optional[int]:
+        """Block (in the GPIO library, without spinning) until the button signal changes or `timeout` seconds have
+        passed. Returns the pin's level after the edge, or None on timeout."""
+        timeout_ms = -1 if timeout is None else max(1, int(timeout * 1000))
+        if self._gpio.wait_for_edge(self.BUTTON_PIN, self._gpio.BOTH, timeout=timeout_ms) is None:
+            return None
+        return self._gpio.input(self.BUTTON_PIN)
+
+    def wait_for_button(self, timeout: float = None) -> bool:
+        """Wait for a push of the button, returns False if there was none within `timeout` seconds."""
+        return self.wait_for_edge(timeout) is not None
 
     def button_listen(self):
         start = time.time()
@@ -45,52 +79,27 @@ class IO:
             #     print(push_count)
             #     push_count += 1
             #     start = time.time()
-            print(GPIO.input(self.BUTTON_PIN), end=' ')
-
-    def register_callback(self, callback):
-        def callback_wrapper(_):
-            """This weird debouncing circuit is needed because of the way the case sends the inputs to the Pi's GPIO"""
-            logging.debug("Callback button debouncing started")
-            signal_count = 1
-            # Needed to differentiate between shutdown and multiple pushes:
-            continuous = True
-            falling = False
-            start = time.time()
-            while (time.time() - start) < 1.0:
-                if GPIO.input(self.BUTTON_PIN) == 1:
-                    signal_count += 1
-                    start = time.time()
-                    if falling:
-                        continuous = False
-                else:
-                    falling = True
-                time.sleep(0.01)
-
-            if signal_count > 1:
-                if continuous:
-                    pushed_times = 1 if signal_count >= 4 else 2
-                else:
-                    pushed_times = signal_count - 1
-                logging.info(f"Detected {signal_count}{' continuous' if continuous else ''} signals. "
-                             f"Probably pushed {pushed_times} times.")
-                if pushed_times == 1 and continuous:
-                    callback('long')
-                elif pushed_times == 2:
-                    callback('double')
-                else:
-                    callback('many')
-            else:
-                logging.debug("Not a recognized button push")
-
-        GPIO.add_event_detect(self.BUTTON_PIN, GPIO.RISING, callback=callback_wrapper)
-
-    def set_fan_speed(self, speed_percent: int, i2c_addr=I2C_ADDR, debug=True):
+            print(self._gpio.input(self.BUTTON_PIN), end=' ')
+
+    def register_edge_callback(self, callback: Callable[[int, float], None]):
+        """Call `callback(level, timestamp)` from the GPIO thread on both edges of the button signal."""
+        self._gpio.add_event_detect(self.BUTTON_PIN, self._gpio.BOTH,
+                                    callback=lambda channel: callback(self._gpio.input(channel), self._clock()))
+
+    def set_fan_speed(self, speed_percent: int, i2c_addr=I2C_ADDR, debug=True) -> bool:
+        """Set the fan speed, returns False if that was not possible (even after retrying)."""
         if 0 <= speed_percent <= 100:
-            if debug:
+            if debug and logging.root.isEnabledFor(logging.DEBUG):
                 logging.debug("Set fan speed to %d%% (%d rpm)", speed_percent, self.guess_rpm(speed_percent))
-            self._bus.write_byte_data(i2c_addr, 0, speed_percent)
+            try:
+                self.register(i2c_addr).write(speed_percent)
+            except OSError:
+                logging.exception(f"Unable to set fan speed to {speed_percent}%")
+                return False
+            return True
         else:
             logging.error("Fan speed must be in range from 0 to 100.")
+            return False
 
     def guess_rpm(self, speed):
         return round(speed / 100 * IO.FAN_RPM, 1)
@@ -105,4 +114,4 @@ class IO:
         # 4. Argon: Turn off the power internal supply (Red Power LED of the Pi turns off)
         # Ha! Guessed correctly! Found this afterwards: https://github.com/Argon40Tech/Argon-ONE-i2c-Codes/blob/master/README.md
         self.set_fan_speed(0)
-        self._bus.write_byte_data(self.I2C_ADDR, 0, 0xFF)
+        self.register().write(0xFF, force=True)
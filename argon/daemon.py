@@ -0,0 +1,426 @@
+import asyncio
+import logging
+import math
+import signal
+import time
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from argon.button import ButtonClassifier
+from argon.config import ConfigWatcher
+from argon.control import ControlServer
+from argon.fan import FanCurve
+from argon.history import (FLAG_BUTTON, FLAG_OVERRIDE, FLAG_PROFILE, FLAG_SENSOR_ERROR, FLAG_STARTED, FLAG_THROTTLED,
+                           FLAG_UNDER_VOLTAGE, History)
+from argon.metrics import Counter, Histogram, MetricsServer, daemon_registry
+from argon.schedule import FixedInterval
+from argon.sensor import Sensor, SensorError
+from argon.throttle import FREQ_CAPPED, SOFT_TEMP_LIMIT, THROTTLED, UNDER_VOLTAGE, ThrottleAccounting, format_states
+
+
+class Daemon:
+    """Event loop of the daemon/driver mode.
+
+    Everything happens on a single asyncio loop: the control tick (sample the temperature, set the fan speed)
+    is a timer, button edges are bridged from the GPIO thread into the loop and classified with a deadline timer,
+    and signals are handled by the loop itself. That way, shutting down or reconfiguring takes effect immediately
+    instead of after the current check interval.
+
+    Signals:
+        SIGUSR1: Log the current status
+        SIGUSR2: Tell the case to cut the power after the upcoming shutdown and exit
+        SIGHUP: Reload the configuration (or at least the active fan profile)
+        SIGTERM, SIGINT: Exit (after telling the case to cut the power if `powering_off()`, called in an executor,
+                         says the system is about to power off, so that this does not depend on the shutdown script
+                         alone)
+
+    If `control_socket` is given, the daemon can also be queried and controlled via `argon.control`.
+    If `metrics` (`host:port` or `unix:/path`) is given, it is exported in the OpenMetrics format via HTTP.
+    Each tick is recorded into `history` if given.
+    With an `AggregateSensor`, `sensor_profiles` maps sensor names to fan profiles applied to the respective sensor's
+    temperature in addition to the main fan profile; the fan runs at the highest speed of all of them.
+    If `throttle` (a source of the firmware's throttle flags, see `argon.throttle`) is given, the time spent throttled
+    is accounted per fan profile, see `report`.
+    With a `notifier` (see `argon.notify`), systemd is told when the daemon is ready and gets the current temperature
+    and fan speed as status, and the watchdog is pinged on each tick (which runs at least every half watchdog timeout).
+    While another process holds the `lease` of the fan register (see `argon.lock`), the daemon does not set the fan
+    speed; it sets it again once the lease has ended.
+    If `config_file` is given, it is watched and `reload_config` is called after it has been changed (and on SIGHUP).
+    """
+    RATE_LOG_INTERVAL = 3600
+    TICK_BUCKETS = (25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3)
+    SENSOR_BUCKETS = (1e-6, 2.5e-6, 5e-6, 10e-6, 25e-6, 50e-6, 100e-6, 1e-3, 10e-3, 25e-3, 50e-3)
+
+    def __init__(self, io, sensor: Sensor, fan_profile: str, load_profile: Callable[[str], Tuple[FanCurve, FixedInterval]],
+                 button_profile: str = None, button_handler: Callable[[str, str], None] = None,
+                 button_settle_time: float = 1.0, control_socket: str = None, metrics: str = None,
+                 history: History = None, config_file: str = None, reload_config: Callable[[], None] = None,
+                 sensor_profiles: Mapping[str, str] = None, powering_off: Callable[[], bool] = None,
+                 throttle=None, notifier=None, lease=None):
+        self._io = io
+        self.sensor = sensor
+        self._load_profile = load_profile
+        self.fan_profile = fan_profile
+        self.curve, self.scheduler = load_profile(fan_profile)
+        self.sensor_profiles = dict(sensor_profiles or {})
+        self.sensor_curves = self._load_sensor_curves()  # type: Dict[str, FanCurve]
+        self.button_profile = button_profile
+        self._button_handler = button_handler
+        self._classifier = ButtonClassifier(settle=button_settle_time)
+        self._control = ControlServer(self, control_socket) if control_socket else None
+
+        self.temp = None  # type: Optional[float]
+        self.fan_speed = None  # type: Optional[int]
+        self.override = None  # type: Optional[Tuple[int, float]]
+        self.ticks = 0
+        self.tick_time = 0.0
+        self.tick_time_max = 0.0
+        self.temp_max = None  # type: Optional[float]
+        self.tick_duration = Histogram('argon_tick_duration_seconds', "Duration of control ticks", self.TICK_BUCKETS)
+        self.sensor_duration = Histogram('argon_sensor_read_duration_seconds', "Duration of temperature readings",
+                                         self.SENSOR_BUCKETS)
+        self.button_events = Counter('argon_button_events', "Recognized button interactions", 'type',
+                                     ButtonClassifier.INTERACTIONS)
+        self._throttle = throttle
+        self.accounting = ThrottleAccounting()
+        self._metrics = MetricsServer(daemon_registry(self, io), metrics) if metrics else None
+        self._history = history
+        self._history_flags = FLAG_STARTED
+        self._reload_config = reload_config
+        self._config_watcher = ConfigWatcher(config_file, self.reload) if config_file else None
+        self._powering_off = powering_off
+        self._notifier = notifier
+        self._lease = lease
+        self.leased = 0.0
+        self.started = None  # type: Optional[float]
+        self._loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self._stopped = None  # type: Optional[asyncio.Event]
+        self._tick_handle = None  # type: Optional[asyncio.Handle]
+        self._button_handle = None  # type: Optional[asyncio.Handle]
+        self._rate_logged_at = 0.0
+
+    def run(self, loop: asyncio.AbstractEventLoop = None):
+        """Run until stopped (by signal or `stop`). Creates and closes a new event loop if none is given."""
+        own_loop = loop is None
+        loop = loop or asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.main(loop))
+        finally:
+            if own_loop:
+                loop.close()
+
+    async def main(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._stopped = asyncio.Event()
+        self.started = self._rate_logged_at = loop.time()
+        signals = {
+            signal.SIGUSR1: self.log_status,
+            signal.SIGUSR2: self.shutdown,
+            signal.SIGHUP: self.reload,
+            signal.SIGTERM: self.terminate,
+            signal.SIGINT: self.stop,
+        }
+        for signum, handler in signals.items():
+            loop.add_signal_handler(signum, self._signal_received, signum, handler)
+        if self._button_handler:
+            self._io.register_edge_callback(self._edge_threadsafe)
+        if self._control:
+            await self._control.start()
+        if self._metrics:
+            await self._metrics.start()
+        if self._config_watcher:
+            self._config_watcher.start(loop)
+        try:
+            self._tick_handle = loop.call_soon(self.tick)
+            await self._stopped.wait()
+        finally:
+            if self._control:
+                await self._control.close()
+            if self._metrics:
+                await self._metrics.close()
+            if self._history is not None:
+                self._history.flush()
+            if self._notifier:
+                self._notifier.stopping()
+            if self._config_watcher:
+                self._config_watcher.close()
+            for signum in signals:
+                loop.remove_signal_handler(signum)
+            for handle in (self._tick_handle, self._button_handle):
+                if handle:
+                    handle.cancel()
+            self._loop = None
+        logging.info("Daemon stopped.")
+
+    def _signal_received(self, signum, handler):
+        logging.warning(f"{signal.Signals(signum).name} received.")
+        handler()
+
+    def tick(self):
+        """Sample the temperature, set the fan speed accordingly and schedule the next tick."""
+        started = time.perf_counter()
+        now = self._loop.time()
+        self.ticks += 1
+        try:
+            interval = self._tick(now)
+        except Exception:
+            # Keep controlling the fan. Without the watchdog ping (see `_tick`), systemd restarts us if this persists:
+            logging.exception("Temperature check failed, trying again in the next check interval.")
+            interval = self.scheduler.interval
+        self._tick_handle = self._loop.call_at(now + interval, self.tick)
+        duration = time.perf_counter() - started
+        self.tick_time += duration
+        self.tick_time_max = max(self.tick_time_max, duration)
+        self.tick_duration.observe(duration)
+
+    def _tick(self, now: float) -> float:
+        """The body of `tick`, returns the interval until the next one."""
+        if self.override and now >= self.override[1]:
+            logging.info("Fan speed override of %d%% expired, back to profile '%s'.", self.override[0], self.fan_profile,
+                         extra=self.log_fields())
+            self.override = None
+            self.curve.speed = None
+        # A single stat() while nobody leases the fan:
+        leased = self._lease.held() if self._lease is not None else 0.0
+        if bool(leased) != bool(self.leased):
+            self._lease_changed(leased)
+        self.leased = leased
+        read_started = time.perf_counter()
+        try:
+            self.temp = self.sensor.read()
+        except SensorError:
+            logging.exception("Unable to get temperature, trying again in the next check interval.")
+            self._history_flags |= FLAG_SENSOR_ERROR
+            interval = self.scheduler.interval
+            temp = None
+        else:
+            temp = self.temp
+            self.sensor_duration.observe(time.perf_counter() - read_started)
+            if self.temp_max is None or self.temp > self.temp_max:
+                self.temp_max = self.temp
+            if not leased:
+                self._set_fan_speed(now)
+            interval = self.scheduler.next(self.temp, now)
+        if self.override:
+            interval = min(interval, self.override[1] - now)
+            self._history_flags |= FLAG_OVERRIDE
+        if leased:
+            interval = min(interval, leased)
+            self._history_flags |= FLAG_OVERRIDE
+        self._account(now, temp)
+        if self._history is not None:
+            self._history.append(None if self._history_flags & FLAG_SENSOR_ERROR else self.temp, self.fan_speed,
+                                 self._history_flags)
+            self._history_flags = 0
+
+        if self._notifier:
+            if self._notifier.watchdog:
+                interval = min(interval, self._notifier.watchdog / 2)
+            # The first tick has set the fan speed, so the daemon is ready once it is done:
+            self._notifier.alive(self.status_line())
+
+        if now - self._rate_logged_at >= self.RATE_LOG_INTERVAL:
+            logging.info("Effective temperature check rate: %.2f wakeups/min", self.scheduler.rate(now))
+            self._rate_logged_at = now
+        # A single record per tick, the fan speed is only logged at info level when it changes:
+        logging.debug("Temperature %s°C, fan speed %s%%, next check in %.1fs", self.temp, self.fan_speed, interval)
+        return interval
+
+    def _set_fan_speed(self, now: float):
+        new_speed = self.override[0] if self.override else self._curve_speed(now)
+        if new_speed is not None and new_speed != self.fan_speed:
+            if self._io.set_fan_speed(new_speed):
+                self.fan_speed = new_speed
+                logging.info("Set fan speed to %d%% (current temperature: %.1f°C).", new_speed, self.temp,
+                             extra=self.log_fields())
+            else:
+                self._forget_speed()
+
+    def _forget_speed(self):
+        """The fan speed is unknown, make the curves set it again in the next tick."""
+        self.fan_speed = self.curve.speed = None
+        for curve in self.sensor_curves.values():
+            curve.speed = None
+
+    def _lease_changed(self, leased: float):
+        if leased:
+            logging.info("Fan leased by pid %s for %.0fs, not setting the fan speed meanwhile.", self._lease.owner,
+                         leased, extra=self.log_fields())
+        else:
+            logging.info("Fan lease ended, back to profile '%s'.", self.fan_profile, extra=self.log_fields())
+            # The lease holder has written the register behind our back:
+            self._io.invalidate()
+        self._forget_speed()
+
+    def _account(self, now: float, temp: Optional[float]):
+        flags = self.accounting.flags
+        if self._throttle is not None:
+            try:
+                flags = self._throttle.read()
+            except SensorError as e:
+                # Keep the last known state (e.g. no recent value of a slow source yet):
+                logging.debug("Unable to get throttle state: %s", e)
+        self.accounting.update(now, self.fan_profile, temp, self.fan_speed, flags)
+        if flags & (SOFT_TEMP_LIMIT | FREQ_CAPPED | THROTTLED):
+            self._history_flags |= FLAG_THROTTLED
+        if flags & UNDER_VOLTAGE:
+            self._history_flags |= FLAG_UNDER_VOLTAGE
+
+    def _curve_speed(self, now: float) -> Optional[int]:
+        """Feed the curves and return the fan speed if it has to be changed (see `FanCurve.update`)."""
+        new_speed = self.curve.update(self.temp, now)
+        if not self.sensor_curves:
+            return new_speed
+        speeds = [self.curve.speed]
+        for name, curve in self.sensor_curves.items():
+            temp = self.sensor.values.get(name)
+            if temp is not None:
+                curve.update(temp, now)
+            speeds.append(curve.speed)
+        return max((speed for speed in speeds if speed is not None), default=None)
+
+    def _load_sensor_curves(self) -> Dict[str, FanCurve]:
+        return {name: self._load_profile(profile)[0] for name, profile in self.sensor_profiles.items()}
+
+    def wakeup(self):
+        """Run the next tick right away."""
+        if self._tick_handle:
+            self._tick_handle.cancel()
+        self._tick_handle = self._loop.call_soon(self.tick)
+
+    def _edge_threadsafe(self, level: int, timestamp: float):
+        # Called from the GPIO thread:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._edge, level, timestamp)
+
+    def _edge(self, level: int, timestamp: float):
+        deadline = self._classifier.edge(timestamp, level)
+        if self._button_handle:
+            self._button_handle.cancel()
+        self._button_handle = self._loop.call_at(deadline, self._button_deadline)
+
+    def _button_deadline(self):
+        self._button_handle = None
+        # The loop might run timers a tiny bit early, the deadline itself is what counts:
+        interaction = self._classifier.expire(self._classifier.deadline)
+        if interaction:
+            logging.info(f"Detected '{interaction}' button interaction.")
+            self.button_events.inc(interaction)
+            self._history_flags |= FLAG_BUTTON
+            try:
+                self._button_handler(self.button_profile, interaction)
+            except Exception:
+                logging.exception(f"Handling button interaction '{interaction}' failed")
+        else:
+            logging.debug("Not a recognized button push")
+
+    def status(self) -> dict:
+        now = self._loop.time() if self._loop else self.started
+        return {
+            'temp': self.temp,
+            'fan_speed': self.fan_speed,
+            'fan_profile': self.fan_profile,
+            'button_profile': self.button_profile,
+            'override': {'speed': self.override[0], 'remaining': self.override[1] - now} if self.override else None,
+            'uptime': now - self.started,
+            'ticks': self.ticks,
+            'tick_time_avg': self.tick_time / self.ticks if self.ticks else None,
+            'tick_time_max': self.tick_time_max,
+            'check_interval': self.scheduler.interval,
+            'check_rate': self.scheduler.rate(now),
+            'sensors': dict(getattr(self.sensor, 'values', {})),
+            'i2c': {f'{addr:#04x}': stats for addr, stats in self._io.i2c_stats().items()},
+            'lease': {'pid': self._lease.owner, 'remaining': self._lease.held()} if self.leased else None,
+            'throttle': format_states(self.accounting.flags) if self._throttle is not None else None,
+        }
+
+    def report(self) -> dict:
+        """Time spent throttled, maximum temperature and average fan duty per fan profile since the start."""
+        return {
+            'since': time.time() - (self._loop.time() - self.started) if self._loop else None,
+            'throttle_source': getattr(self._throttle, 'name', None),
+            'profiles': self.accounting.report(),
+        }
+
+    def status_line(self) -> str:
+        temp = 'N/A' if self.temp is None else f"{self.temp:.1f}°C"
+        fan = 'N/A' if self.fan_speed is None else f"{self.fan_speed}%"
+        override = ', overridden' if self.override else ''
+        return f"Temperature {temp}, fan speed {fan} ({self.fan_profile}{override})"
+
+    def log_fields(self) -> dict:
+        """Structured fields for log records (see `argon.logs`), to be passed as `extra`."""
+        return {'TEMP': self.temp, 'FAN_DUTY': self.fan_speed, 'PROFILE': self.fan_profile}
+
+    def log_status(self):
+        logging.info("Status: temperature %s°C, fan speed %s%%, fan profile '%s', check interval %.1fs, %d ticks",
+                     self.temp, self.fan_speed, self.fan_profile, self.scheduler.interval, self.ticks,
+                     extra=self.log_fields())
+
+    def set_override(self, speed: Optional[int], duration: float):
+        """Run the fan at `speed` for `duration` seconds regardless of the fan profile (or stop overriding if None)."""
+        if speed is None:
+            logging.info("Fan speed override cleared.")
+            self.override = None
+            self.curve.speed = None
+        else:
+            if not 0 <= speed <= 100:
+                raise ValueError("Fan speed must be in range from 0 to 100.")
+            if not math.isfinite(duration) or duration <= 0:
+                raise ValueError("Duration must be positive and finite.")
+            logging.info("Fan speed overridden with %d%% for %.0fs.", speed, duration, extra=self.log_fields())
+            self.override = (speed, self._loop.time() + duration)
+        self.wakeup()
+
+    def switch_profile(self, fan_profile: str):
+        """(Re-)load a fan profile via `load_profile` and activate it."""
+        curve, scheduler = self._load_profile(fan_profile)
+        sensor_curves = self._load_sensor_curves()
+        curve.speed = self.curve.speed
+        for name, sensor_curve in sensor_curves.items():
+            sensor_curve.speed = self.sensor_curves[name].speed if name in self.sensor_curves else None
+        self.fan_profile, self.curve, self.scheduler, self.sensor_curves = fan_profile, curve, scheduler, sensor_curves
+        self._history_flags |= FLAG_PROFILE
+        logging.info("Fan profile '%s' active: %s, check interval %s.", fan_profile, curve, scheduler,
+                     extra=self.log_fields())
+        self.wakeup()
+
+    def reload(self):
+        try:
+            if self._reload_config:
+                self._reload_config()
+            else:
+                self.switch_profile(self.fan_profile)
+        except Exception:
+            logging.exception("Reloading failed, keeping the current configuration.")
+
+    def shutdown(self):
+        logging.warning("Preparing for shutdown.")
+        try:
+            self._io.notify_shutdown()
+        except OSError:
+            logging.exception("Unable to tell the case to cut the power.")
+        finally:
+            self.stop()
+
+    def terminate(self):
+        if not self._powering_off or self._loop is None:
+            self.stop()
+            return
+        # Asking systemd takes a subprocess, keep the loop (ticks, watchdog) running meanwhile:
+        self._loop.run_in_executor(None, self._powering_off).add_done_callback(self._terminate)
+
+    def _terminate(self, powering_off: asyncio.Future):
+        try:
+            powering_off = powering_off.result()
+        except Exception:
+            logging.exception("Unable to find out whether the system is powering off.")
+            powering_off = False
+        if powering_off:
+            self.shutdown()
+        else:
+            self.stop()
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
@@ -0,0 +1,153 @@
+"""Non-interactive checks of `argon doctor --batch`, e.g. for provisioning many cases.
+
+All checks run concurrently, each in a daemon thread with its own timeout, so a hanging check (e.g. a stuck bus
+or an unresponsive systemd) neither delays the other checks nor the exit. Checks of the same `group` (e.g. those
+sharing the i2c bus) run one after the other in a single thread instead; their timeouts add up. The report is JSON:
+
+    {"ok": false, "checks": [{"name": "i2c", "status": "fail", "detail": "...", "duration_ms": 0.4}, ...]}
+
+The status is `ok`, `fail`, `timeout` or `skipped`; only `fail` and `timeout` make the report fail.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+
+class CheckSkipped(Exception):
+    pass
+
+
+class Check(NamedTuple):
+    name: str
+    # Returns a short detail on success, raises on failures (or `CheckSkipped`):
+    run: Callable[[], str]
+    timeout: float
+    group: Optional[str] = None
+
+
+class Result(NamedTuple):
+    name: str
+    status: str
+    detail: str
+    duration_ms: float
+
+
+def run(checks: List[Check]) -> List[Result]:
+    """Run all `checks` concurrently and return their results in the same order."""
+    from concurrent.futures import Future, TimeoutError
+    started = time.monotonic()
+    futures = []
+    timeouts = []
+    groups = {}  # type: Dict[str, List[Tuple[Future, Check]]]
+    for check in checks:
+        future = Future()
+        if check.group is None:
+            threading.Thread(target=_run_into, args=(future, check), name=f'check {check.name}', daemon=True).start()
+            timeouts.append(check.timeout)
+        else:
+            group = groups.setdefault(check.group, [])
+            group.append((future, check))
+            timeouts.append(sum(check.timeout for _, check in group))
+        futures.append(future)
+    for name, group in groups.items():
+        threading.Thread(target=_run_group, args=(group,), name=f'checks {name}', daemon=True).start()
+    results = []
+    for check, future, timeout in zip(checks, futures, timeouts):
+        try:
+            status, detail, duration = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+        except TimeoutError:
+            status, detail, duration = 'timeout', f"No result after {timeout:g}s", timeout
+        results.append(Result(check.name, status, detail, round(duration * 1e3, 1)))
+    return results
+
+
+def _run_group(group: List[Tuple['Future', Check]]):
+    for future, check in group:
+        _run_into(future, check)
+
+
+def _run_into(future, check: Check):
+    started = time.monotonic()
+    try:
+        status, detail = 'ok', check.run()
+    except CheckSkipped as e:
+        status, detail = 'skipped', str(e)
+    except Exception as e:
+        status, detail = 'fail', str(e) or type(e).__name__
+    future.set_result((status, detail, time.monotonic() - started))
+
+
+def report(results: List[Result]) -> Tuple[str, bool]:
+    """Return the JSON report of `results` and whether all checks passed."""
+    ok = all(result.status in ('ok', 'skipped') for result in results)
+    checks = [result._asdict() for result in results]
+    return json.dumps({'ok': ok, 'checks': checks}, indent=2, ensure_ascii=False), ok
+
+
+def check_sensor(sensor) -> str:
+    return f"{sensor.read():.1f}°C ({sensor.name})"
+
+
+def check_files(paths: Mapping[str, str]) -> str:
+    missing = [name for name, path in paths.items() if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Missing {', '.join(missing)}, consider re-running the installer")
+    return ', '.join(paths.values())
+
+
+def check_service(name: str, timeout: float) -> str:
+    import subprocess
+    state = subprocess.run(['systemctl', 'is-active', name], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                           universal_newlines=True, timeout=timeout).stdout.strip()
+    if state != 'active':
+        raise RuntimeError(f"Service '{name}' is {state or 'unknown'}")
+    return f"Service '{name}' is active"
+
+
+def check_i2c(io) -> str:
+    io.probe()
+    return f"Device {io.I2C_ADDR:#04x} acknowledged"
+
+
+def check_fan(io, daemon_running: Callable[[], bool], steps=(50, 100, 0), step_time: float = 0.5, lease=None) -> str:
+    """Shortened sweep over a few speeds (writes only: the case does not report the fan's actual speed).
+
+    The fan is leased via `lease` (see `argon.lock.Lease`) during the sweep, if given.
+    """
+    if daemon_running():
+        raise CheckSkipped("The daemon controls the fan, not interfering")
+    with contextlib.ExitStack() as stack:
+        if lease is not None:
+            stack.enter_context(lease.hold(len(steps) * step_time + 5))
+        for speed in steps:
+            if not io.set_fan_speed(speed, debug=False):
+                raise RuntimeError(f"Unable to set fan speed to {speed}%")
+            time.sleep(step_time)
+    stats = io.i2c_stats()[io.I2C_ADDR]
+    return f"{len(steps)} speeds set, {stats['writes']} writes, {stats['errors']} errors"
+
+
+def check_button(io, duration: float, settle: float = 1.0) -> str:
+    """Capture the button's edges for up to `duration` seconds (blocking on the GPIO, without spinning),
+    until the signal has been quiet for `settle` seconds after a push."""
+    deadline = time.monotonic() + duration
+    edges = 0
+    remaining = duration
+    while remaining > 0:
+        if io.wait_for_edge(remaining) is not None:
+            edges += 1
+            deadline = min(deadline, time.monotonic() + settle)
+        remaining = deadline - time.monotonic()
+    if not edges:
+        raise RuntimeError(f"No button signal within {duration:g}s")
+    return f"Button signal with {edges} edges"
+
+
+def failing(error: Exception) -> Callable[[], str]:
+    """A check failing with `error`, e.g. for all hardware checks if the hardware could not be initialized."""
+    def check() -> str:
+        raise error
+    return check
@@ -0,0 +1,305 @@
+from array import array
+from bisect import bisect_right
+from typing import Callable, Iterable, List, Mapping, Optional, Tuple
+
+
+class FanCurve:
+    """Fan curve compiled from a `Fan:*` profile section.
+
+    Numeric keys map a temperature threshold (°C) to a fan speed (%), the speed of the highest exceeded
+    threshold applies (or, if `interpolate` is set, a linear interpolation between the two nearest points).
+    The remaining keys are options:
+        interpolate:     Interpolate linearly between two points instead of stepping (default: no)
+        hysteresis_up:   Degrees the temperature has to be above a threshold to speed up (default: 0)
+        hysteresis_down: Degrees the temperature has to fall below a threshold to slow down (default: 3)
+        min_dwell:       Minimum seconds between the last change and slowing down again (default: 30)
+    Speeding up is never delayed by `min_dwell`, as it is the direction that protects the Pi.
+    """
+    INTERPOLATE = False
+    HYSTERESIS_UP = 0.0
+    HYSTERESIS_DOWN = 3.0
+    MIN_DWELL = 30.0
+
+    def __init__(self, points: Mapping[float, int], interpolate=INTERPOLATE,
+                 hysteresis_up=HYSTERESIS_UP, hysteresis_down=HYSTERESIS_DOWN, min_dwell=MIN_DWELL):
+        if not points:
+            raise ValueError("A fan curve needs at least one point")
+        for temp, speed in points.items():
+            if not 0 <= speed <= 100:
+                raise ValueError(f"Fan speed {speed}% for {temp}°C is not in range from 0 to 100")
+        if hysteresis_up < 0 or hysteresis_down < 0 or min_dwell < 0:
+            raise ValueError("Hysteresis and dwell time must not be negative")
+        ordered = sorted(points.items())
+        self.temps = array('d', (t for t, _ in ordered))
+        self.speeds = array('B', (s for _, s in ordered))
+        self.interpolate = interpolate
+        self.hysteresis_up = hysteresis_up
+        self.hysteresis_down = hysteresis_down
+        self.min_dwell = min_dwell
+        self.speed = None  # type: Optional[int]
+        self._changed_at = float('-inf')
+
+    @classmethod
+    def from_section(cls, section: Mapping[str, str]) -> 'FanCurve':
+        points = {}
+        options = {}
+        for key, value in section.items():
+            try:
+                points[float(key)] = int(value)
+            except ValueError:
+                if key == 'interpolate':
+                    options[key] = value.strip().lower() in ('1', 'yes', 'true', 'on')
+                elif key in ('hysteresis_up', 'hysteresis_down', 'min_dwell'):
+                    options[key] = float(value)
+                else:
+                    raise ValueError(f"Invalid fan curve entry '{key} = {value}'")
+        return cls(points, **options)
+
+    def lookup(self, temp: float) -> int:
+        """Fan speed for `temp`, O(log n) in the number of points."""
+        i = bisect_right(self.temps, temp)
+        if i == 0:
+            return 0
+        if not self.interpolate or i == len(self.temps):
+            return self.speeds[i - 1]
+        t0, t1 = self.temps[i - 1], self.temps[i]
+        s0, s1 = self.speeds[i - 1], self.speeds[i]
+        return round(s0 + (s1 - s0) * (temp - t0) / (t1 - t0))
+
+    def update(self, temp: float, now: float) -> Optional[int]:
+        """Feed a temperature sample taken at `now` (seconds, monotonic).
+
+        Returns the new fan speed if it has to be changed, None if the fan should keep its current speed.
+        """
+        if self.speed is None:
+            new_speed = self.lookup(temp)
+        else:
+            new_speed = self.lookup(temp - self.hysteresis_up)
+            if new_speed <= self.speed:
+                new_speed = self.lookup(temp + self.hysteresis_down)
+                if new_speed >= self.speed or now - self._changed_at < self.min_dwell:
+                    return None
+        if new_speed == self.speed:
+            return None
+        self.speed = new_speed
+        self._changed_at = now
+        return new_speed
+
+    def distance(self, temp: float, direction: int = 0) -> float:
+        """Degrees between `temp` and the nearest temperature at which the fan speed could change.
+
+        Only temperatures above (`direction` > 0) or below (`direction` < 0) are considered if a direction is given.
+        """
+        triggers = [t + self.hysteresis_up for t in self.temps] + [t - self.hysteresis_down for t in self.temps]
+        return min((abs(t - temp) for t in triggers if direction == 0 or (t - temp) * direction >= 0),
+                   default=float('inf'))
+
+    def __repr__(self):
+        points = ', '.join(f"{t:g}°C: {s}%" for t, s in zip(self.temps, self.speeds))
+        return f"FanCurve({points}{', interpolated' if self.interpolate else ''})"
+
+
+class PIDController:
+    """Continuous fan speed holding the temperature at a `target`, compiled from a `Fan:*` section with a
+    `target` key:
+        target:            Temperature to hold (°C)
+        kp:                Proportional gain (% per °C above the target, default: 8)
+        ki:                Integral gain (% per °C and second, default: 0.02)
+        kd:                Derivative gain (% per °C/s, default: 60)
+        derivative_filter: Time constant of the low-pass filter on the derivative in seconds (default: 20)
+        min_speed:         Lowest speed while the fan is running, below it is off (default: 0)
+        max_speed:         Highest speed (default: 100)
+        max_temp:          Run at `max_speed` right away at or above this temperature, e.g. well below the
+                           throttle point (default: target + 15)
+        deadband:          Minimum change in % worth a write to the case (default: 3)
+
+    The derivative acts on the (filtered) temperature, not on the error, so changing the target does not kick.
+    Anti-windup: the integral only grows while the output is not saturated in the same direction.
+    All timing comes from `now` of `update`, i.e. replaying a recorded trace gives the same speeds each time.
+    """
+    KP = 8.0
+    KI = 0.02
+    KD = 60.0
+    DERIVATIVE_FILTER = 20.0
+    DEADBAND = 3
+    OPTIONS = ('target', 'kp', 'ki', 'kd', 'derivative_filter', 'min_speed', 'max_speed', 'max_temp', 'deadband')
+
+    def __init__(self, target: float, kp=KP, ki=KI, kd=KD, derivative_filter=DERIVATIVE_FILTER,
+                 min_speed: int = 0, max_speed: int = 100, max_temp: float = None, deadband: int = DEADBAND):
+        if not 0 <= min_speed <= max_speed <= 100:
+            raise ValueError("Fan speeds must satisfy 0 <= min_speed <= max_speed <= 100")
+        if kp < 0 or ki < 0 or kd < 0 or derivative_filter < 0 or deadband < 0:
+            raise ValueError("Gains, filter and deadband must not be negative")
+        self.target = target
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.derivative_filter = derivative_filter
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.max_temp = target + 15 if max_temp is None else max_temp
+        if self.max_temp <= target:
+            raise ValueError("max_temp must be above the target")
+        self.deadband = deadband
+        self.speed = None  # type: Optional[int]
+        self.output = 0.0
+        self.integral = 0.0
+        self.slope = 0.0
+        self._last = None
+
+    @classmethod
+    def from_section(cls, section: Mapping[str, str]) -> 'PIDController':
+        options = {}
+        for key, value in section.items():
+            if key not in cls.OPTIONS:
+                raise ValueError(f"Invalid PID profile entry '{key} = {value}'")
+            options[key] = int(value) if key in ('min_speed', 'max_speed', 'deadband') else float(value)
+        return cls(**options)
+
+    def update(self, temp: float, now: float) -> Optional[int]:
+        """Feed a temperature sample taken at `now` (seconds, monotonic).
+
+        Returns the new fan speed if it has to be changed, None if the fan should keep its current speed.
+        """
+        if self._last is not None and now > self._last[1]:
+            dt = now - self._last[1]
+            alpha = dt / (self.derivative_filter + dt)
+            self.slope += alpha * ((temp - self._last[0]) / dt - self.slope)
+        else:
+            dt = 0.0
+        self._last = (temp, now)
+
+        error = temp - self.target
+        unsaturated = self.kp * error + self.ki * self.integral + self.kd * self.slope
+        # Anti-windup (conditional integration): stop integrating into the direction the output is stuck in:
+        if not (unsaturated >= self.max_speed and error > 0 or unsaturated <= 0 and error < 0):
+            self.integral += error * dt
+        self.output = min(self.max_speed, max(0.0, self.kp * error + self.ki * self.integral + self.kd * self.slope))
+
+        if temp >= self.max_temp:
+            new_speed = self.max_speed
+        elif self.output < self.min_speed:
+            # Below its minimum speed the fan might stall. Once running, keep it at the minimum until the output
+            # drops below half of it:
+            running = self.speed is not None and self.speed > 0
+            new_speed = self.min_speed if running and self.output >= self.min_speed / 2 else 0
+        else:
+            new_speed = round(self.output)
+        if (self.speed is not None and abs(new_speed - self.speed) < self.deadband
+                and new_speed not in (0, self.max_speed)):
+            return None
+        if new_speed == self.speed:
+            return None
+        self.speed = new_speed
+        return new_speed
+
+    def distance(self, temp: float, direction: int = 0) -> float:
+        """Degrees between `temp` and the target or `max_temp` (only those above or below if `direction` is given)."""
+        return min((abs(t - temp) for t in (self.target, self.max_temp)
+                    if direction == 0 or (t - temp) * direction >= 0), default=float('inf'))
+
+    def __repr__(self):
+        return (f"PIDController(target {self.target:g}°C, kp {self.kp:g}, ki {self.ki:g}, kd {self.kd:g}, "
+                f"{self.min_speed}-{self.max_speed}%)")
+
+
+class FeedForward:
+    """Raises the fan speed of a `FanCurve` or `PIDController` with the CPU load, before the temperature follows.
+
+    Configured by the `load_*` keys of a `Fan:*` section:
+        load_speed:     Fan speed at full sustained load (%, default: 0, i.e. no feed-forward)
+        load_threshold: Smoothed load (0..1) from which on the fan speeds up (default: 0.5)
+        load_window:    Time constant of the load smoothing in seconds, i.e. how long a load has to last (default: 10)
+        load_cpufreq:   Weigh the load with the current CPU clock, if cpufreq is available (default: no)
+
+    The smoothed load above the threshold maps linearly to 0..`load_speed` (in steps of `STEP`%), and the fan runs at
+    the higher speed of that and the wrapped profile. `load` returns the load since its last call (0..1); by default,
+    `/proc/stat` is read (see `argon.sensor.CpuLoad`).
+    """
+    OPTIONS = ('load_speed', 'load_threshold', 'load_window', 'load_cpufreq')
+    THRESHOLD = 0.5
+    WINDOW = 10.0
+    STEP = 5
+
+    def __init__(self, profile, load_speed: int, load_threshold: float = THRESHOLD, load_window: float = WINDOW,
+                 load_cpufreq: bool = False, load: Callable[[], float] = None):
+        if not 0 < load_speed <= 100:
+            raise ValueError("load_speed must be in range from 1 to 100")
+        if not 0 <= load_threshold < 1 or load_window < 0:
+            raise ValueError("load_threshold must be in range from 0 to 1 (exclusive), load_window not negative")
+        self.profile = profile
+        self.load_speed = load_speed
+        self.load_threshold = load_threshold
+        self.load_window = load_window
+        self.load_cpufreq = load_cpufreq
+        self._load = load
+        self.load = 0.0
+        self.floor = 0
+        self._speed = None  # type: Optional[int]
+        self._last = None  # type: Optional[float]
+
+    @property
+    def speed(self) -> Optional[int]:
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed: Optional[int]):
+        # E.g. reset after a failed write, so both have to tell their speed again:
+        self._speed = self.profile.speed = speed
+
+    def update(self, temp: float, now: float) -> Optional[int]:
+        """Feed a temperature sample taken at `now` (seconds, monotonic), the load is sampled along with it.
+
+        Returns the new fan speed if it has to be changed, None if the fan should keep its current speed.
+        """
+        if self._load is None:
+            from argon.sensor import CpuLoad
+            self._load = CpuLoad(cpufreq=self.load_cpufreq).read
+        load = self._load()
+        if self._last is None:
+            self.load = load
+        elif now > self._last:
+            dt = now - self._last
+            self.load += dt / (self.load_window + dt) * (load - self.load)
+        self._last = now
+        excess = max(0.0, (self.load - self.load_threshold) / (1 - self.load_threshold))
+        self.floor = int(self.load_speed * excess / self.STEP) * self.STEP
+        self.profile.update(temp, now)
+        new_speed = max(self.profile.speed or 0, self.floor)
+        if new_speed == self._speed:
+            return None
+        self._speed = new_speed
+        return new_speed
+
+    def distance(self, temp: float, direction: int = 0) -> float:
+        return self.profile.distance(temp, direction)
+
+    def __repr__(self):
+        return (f"{self.profile!r} + FeedForward(up to {self.load_speed}% above {self.load_threshold:.0%} load, "
+                f"{self.load_window:g}s)")
+
+
+def compile_profile(section: Mapping[str, str], load: Callable[[], float] = None):
+    """Compile a `Fan:*` section into a `PIDController` (if it has a `target`) or a `FanCurve`,
+    wrapped into a `FeedForward` if it has a `load_speed`."""
+    options = {key: section[key] for key in FeedForward.OPTIONS if key in section}
+    if options:
+        section = {key: value for key, value in section.items() if key not in options}
+    profile = PIDController.from_section(section) if 'target' in section else FanCurve.from_section(section)
+    if float(options.get('load_speed', 0)) <= 0:
+        return profile
+    return FeedForward(profile, load_speed=int(options['load_speed']),
+                       load_threshold=float(options.get('load_threshold', FeedForward.THRESHOLD)),
+                       load_window=float(options.get('load_window', FeedForward.WINDOW)),
+                       load_cpufreq=options.get('load_cpufreq', 'no').strip().lower() in ('1', 'yes', 'true', 'on'),
+                       load=load)
+
+
+def replay(profile, trace: Iterable[Tuple[float, float]]) -> List[Tuple[float, float, int]]:
+    """Feed a recorded (time, temperature) trace into a fresh profile (`FanCurve` or `PIDController`),
+    returning (time, temperature, speed) for every sample. Deterministic, e.g. for tuning gains offline."""
+    speeds = []
+    for now, temp in trace:
+        profile.update(temp, now)
+        speeds.append((now, temp, profile.speed))
+    return speeds
@@ -0,0 +1,169 @@
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+FLAG_STARTED = 0x01
+FLAG_SENSOR_ERROR = 0x02
+FLAG_OVERRIDE = 0x04
+FLAG_PROFILE = 0x08
+FLAG_BUTTON = 0x10
+FLAG_THROTTLED = 0x20  # soft temperature limit, frequency capped or throttled (see `argon.throttle`)
+FLAG_UNDER_VOLTAGE = 0x40
+FLAGS = {
+    FLAG_STARTED: 'started',
+    FLAG_SENSOR_ERROR: 'sensor_error',
+    FLAG_OVERRIDE: 'override',
+    FLAG_PROFILE: 'profile',
+    FLAG_BUTTON: 'button',
+    FLAG_THROTTLED: 'throttled',
+    FLAG_UNDER_VOLTAGE: 'under_voltage',
+}
+UNKNOWN_DUTY = 0xFF
+
+Sample = Tuple[float, float, Optional[int], int]
+
+
+class HistoryError(Exception):
+    pass
+
+
+class History:
+    """Fixed-size ring buffer of (timestamp, temperature, fan duty, flags) samples in a memory-mapped file.
+
+    The file consists of a header and one column per field (float64, float32, uint8, uint8), which are accessed
+    as typed memoryviews of the mapping: Appending is a few stores without any syscall (the kernel writes the dirty
+    pages back), and readers get zero-copy access. Unknown temperatures are NaN, unknown duties `UNKNOWN_DUTY`.
+    """
+    MAGIC = b'ARGNHST1'
+    HEADER = struct.Struct('=8sIII4x')  # magic, capacity, head, count (native byte order like the memoryviews)
+    DEFAULT_PATH = '/var/lib/argond/history'
+    DEFAULT_CAPACITY = 16384  # ~2 days with the default check interval, 224 KiB
+    SAMPLE_SIZE = 8 + 4 + 1 + 1
+
+    def __init__(self, mapping: mmap.mmap, clock: Callable[[], float] = time.time):
+        self._mmap = mapping
+        self._clock = clock
+        magic, capacity, _, _ = self.HEADER.unpack_from(mapping)
+        if magic != self.MAGIC or len(mapping) != self.file_size(capacity):
+            raise HistoryError("Not a history file (or a corrupt one)")
+        self.capacity = capacity
+        self._view = view = memoryview(mapping)
+        self._header = view[8:self.HEADER.size].cast('I')
+        offset = self.HEADER.size
+        self._stamps = view[offset:offset + 8 * capacity].cast('d')
+        offset += 8 * capacity
+        self._temps = view[offset:offset + 4 * capacity].cast('f')
+        offset += 4 * capacity
+        self._duties = view[offset:offset + capacity]
+        self._flags = view[offset + capacity:offset + 2 * capacity]
+
+    @classmethod
+    def file_size(cls, capacity: int) -> int:
+        return cls.HEADER.size + cls.SAMPLE_SIZE * capacity
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_PATH, capacity: int = DEFAULT_CAPACITY, clock=time.time) -> 'History':
+        """Open the history at `path` for writing, (re-)creating it if it does not exist or has another capacity."""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            size = cls.file_size(capacity)
+            header = os.pread(fd, cls.HEADER.size, 0)
+            if (len(header) < cls.HEADER.size or cls.HEADER.unpack(header)[:2] != (cls.MAGIC, capacity)
+                    or os.fstat(fd).st_size != size):
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, cls.HEADER.pack(cls.MAGIC, capacity, 0, 0), 0)
+            return cls(mmap.mmap(fd, size), clock)
+        finally:
+            os.close(fd)
+
+    @classmethod
+    def open_readonly(cls, path: str = DEFAULT_PATH) -> 'History':
+        try:
+            with open(path, 'rb') as file:
+                return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError, struct.error) as e:
+            raise HistoryError(f"Unable to read history '{path}': {e}") from e
+
+    def __len__(self) -> int:
+        return self._header[2]
+
+    def append(self, temp: Optional[float], duty: Optional[int], flags: int = 0, timestamp: float = None):
+        head = self._header[1]
+        self._stamps[head] = self._clock() if timestamp is None else timestamp
+        self._temps[head] = math.nan if temp is None else temp
+        self._duties[head] = UNKNOWN_DUTY if duty is None else duty
+        self._flags[head] = flags
+        self._header[1] = (head + 1) % self.capacity
+        if self._header[2] < self.capacity:
+            self._header[2] += 1
+
+    def ranges(self) -> Iterator[Tuple[int, int]]:
+        """Index ranges of the samples in chronological order (two if the buffer has wrapped around)."""
+        head, count = self._header[1], self._header[2]
+        start = (head - count) % self.capacity
+        if start + count <= self.capacity:
+            yield start, start + count
+        else:
+            yield start, self.capacity
+            yield 0, head
+
+    def samples(self, since: float = None) -> Iterator[Sample]:
+        for start, stop in self.ranges():
+            for i in range(start, stop):
+                if since is None or self._stamps[i] >= since:
+                    duty = self._duties[i]
+                    yield self._stamps[i], self._temps[i], None if duty == UNKNOWN_DUTY else duty, self._flags[i]
+
+    def summary(self, since: float = None) -> dict:
+        count = temp_count = duty_count = fan_on = 0
+        temp_sum = duty_sum = 0.0
+        temp_max = temp_min = temp_max_at = first = last = None
+        events = dict.fromkeys(FLAGS.values(), 0)
+        for stamp, temp, duty, flags in self.samples(since):
+            count += 1
+            if first is None:
+                first = stamp
+            last = stamp
+            if temp == temp:  # not NaN
+                temp_count += 1
+                temp_sum += temp
+                if temp_max is None or temp > temp_max:
+                    temp_max, temp_max_at = temp, stamp
+                if temp_min is None or temp < temp_min:
+                    temp_min = temp
+            if duty is not None:
+                duty_count += 1
+                duty_sum += duty
+                fan_on += duty > 0
+            if flags:
+                for flag, name in FLAGS.items():
+                    if flags & flag:
+                        events[name] += 1
+        return {
+            'samples': count,
+            'first': first,
+            'last': last,
+            'temp_min': temp_min,
+            'temp_avg': temp_sum / temp_count if temp_count else None,
+            'temp_max': temp_max,
+            'temp_max_at': temp_max_at,
+            'duty_avg': duty_sum / duty_count if duty_count else None,
+            'fan_on_ratio': fan_on / duty_count if duty_count else None,
+            'events': events,
+        }
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        for view in (self._header, self._stamps, self._temps, self._duties, self._flags, self._view):
+            view.release()
+        self._mmap.close()
+
+
+def format_flags(flags: int) -> str:
+    return '|'.join(name for flag, name in FLAGS.items() if flags & flag)
@@ -0,0 +1,69 @@
+import errno
+import logging
+import time
+from typing import Optional
+
+
+class Register:
+    """A write-only register of an i2c device, e.g. register 0 of the Argon's MCU.
+
+    Remembers the last acknowledged value to suppress redundant writes, and retries transient bus errors
+    (such as `[Errno 121] Remote I/O error` on busy buses with other HATs attached) with bounded exponential backoff.
+    Writes, suppressed writes, errors and latencies are counted in `stats`.
+    """
+    TRANSIENT_ERRNOS = frozenset((errno.EREMOTEIO, errno.EIO, errno.EAGAIN, errno.ETIMEDOUT, errno.EBUSY))
+
+    def __init__(self, bus, addr: int, reg: int = 0, retries: int = 3, backoff: float = 0.005,
+                 max_backoff: float = 0.1, sleep=time.sleep, clock=time.perf_counter):
+        self._bus = bus
+        self.addr = addr
+        self.reg = reg
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+        self._clock = clock
+        self.value = None  # type: Optional[int]
+        self.stats = {
+            'writes': 0,
+            'suppressed': 0,
+            'errors': 0,
+            'failures': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+
+    def write(self, value: int, force=False) -> bool:
+        """Write `value` unless it is already the last acknowledged one (or `force` is set).
+
+        Returns whether the value has actually been written. Raises `OSError` if the write still fails after
+        all retries (or with a non-transient error), the register's value is unknown afterwards.
+        """
+        if value == self.value and not force:
+            self.stats['suppressed'] += 1
+            return False
+        started = self._clock()
+        for attempt in range(self.retries + 1):
+            try:
+                self._bus.write_byte_data(self.addr, self.reg, value)
+                break
+            except OSError as e:
+                self.stats['errors'] += 1
+                if e.errno not in self.TRANSIENT_ERRNOS or attempt == self.retries:
+                    self.stats['failures'] += 1
+                    self.value = None
+                    raise
+                delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+                logging.debug(f"Writing {value:#04x} to {self.addr:#04x}/{self.reg} failed ({e}), "
+                              f"retrying in {delay * 1e3:.0f}ms")
+                self._sleep(delay)
+        latency = self._clock() - started
+        self.value = value
+        self.stats['writes'] += 1
+        self.stats['latency_total'] += latency
+        self.stats['latency_max'] = max(self.stats['latency_max'], latency)
+        return True
+
+    def invalidate(self):
+        """Forget the last value, e.g. if something else might have written the register."""
+        self.value = None
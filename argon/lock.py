@@ -0,0 +1,159 @@
+"""Arbitration between processes driving the case: a single daemon, and leases on the fan register.
+
+Only one daemon may run at a time (`DaemonLock`). Commands writing the fan register directly while a daemon is
+running (e.g. the fan test of `argon doctor`) take a `Lease` of the register for a bounded time, during which the
+daemon does not write it; afterwards, it sets the fan speed of its profile again.
+Both are advisory: they only guard against other `argon` processes.
+"""
+import contextlib
+import grp
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+
+class LockError(Exception):
+    pass
+
+
+class DaemonLock:
+    """An exclusive `flock` on a PID file, held as long as the daemon runs.
+
+    The kernel releases the lock when the process dies, so a lock left behind by a crashed or killed daemon is
+    stale by definition: the file still exists (with the old PID), but it is not locked and simply taken over.
+    """
+
+    NAME = 'argond.pid'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None  # type: Optional[int]
+
+    def acquire(self):
+        """Take the lock, raises `LockError` if another daemon holds it or it cannot be taken at all.
+
+        Creates the directory if missing, i.e. when started manually instead of by systemd (`RuntimeDirectory`).
+        """
+        import fcntl
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', mode=0o755, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        except OSError as e:
+            raise LockError(f"Unable to lock '{self.path}': {e}") from e
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            pid = os.pread(fd, 32, 0).decode(errors='replace').strip() or 'unknown'
+            os.close(fd)
+            raise LockError(f"Another daemon is already running (pid {pid}, lock '{self.path}')")
+        except OSError as e:
+            os.close(fd)
+            raise LockError(f"Unable to lock '{self.path}': {e}") from e
+        stale = os.pread(fd, 32, 0).decode(errors='replace').strip()
+        if stale:
+            logging.info(f"Taking over stale lock '{self.path}' of pid {stale}.")
+        # Never unlinked: another daemon could lock the unlinked file while a third one creates a new one.
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, f"{os.getpid()}\n".encode(), 0)
+        self._fd = fd
+
+    def release(self):
+        if self._fd is not None:
+            os.ftruncate(self._fd, 0)
+            os.close(self._fd)
+            self._fd = None
+
+
+class Lease:
+    """Lease of the fan register, as a file with the owner's PID and the (`CLOCK_MONOTONIC`) expiry time.
+
+    The daemon creates the file (writable by the group `GROUP`, like the control socket) and checks it with
+    `held` on each tick: a single `stat` as long as the file does not change, its content is only read after that.
+    Commands `take` the lease, if a daemon has created the file; an empty file is no lease.
+    """
+    NAME = 'fan.lease'
+    GROUP = 'i2c'
+    MAX_DURATION = 3600.0
+
+    def __init__(self, path: str, clock=time.monotonic):
+        self.path = path
+        self._clock = clock
+        self._stat = None  # type: Optional[Tuple[int, int, int]]
+        self.owner = None  # type: Optional[int]
+        self.expires = 0.0
+
+    @classmethod
+    def create(cls, path: str) -> 'Lease':
+        """Create (or clear) the lease file, for the daemon."""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o664)
+        try:
+            os.fchmod(fd, 0o664)
+            try:
+                os.fchown(fd, -1, grp.getgrnam(cls.GROUP).gr_gid)
+            except (KeyError, PermissionError):
+                logging.warning(f"Unable to hand fan lease '{path}' over to group '{cls.GROUP}'.")
+        finally:
+            os.close(fd)
+        return cls(path)
+
+    def held(self) -> float:
+        """Seconds left of a lease held by another process, 0 if there is none."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return 0.0
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._stat:
+            self._stat = key
+            self.owner, self.expires = self._read()
+        if self.owner is None or self.owner == os.getpid():
+            return 0.0
+        return max(0.0, self.expires - self._clock())
+
+    def _read(self) -> Tuple[Optional[int], float]:
+        try:
+            with open(self.path, 'rb') as file:
+                # Only the first line counts, a longer previous lease might still follow it while it is being taken:
+                pid, expires = file.readline().split()
+            return int(pid), float(expires)
+        except (OSError, ValueError):
+            return None, 0.0
+
+    def take(self, duration: float) -> bool:
+        """Hold the lease for `duration` seconds (at most `MAX_DURATION`). Returns False if there is no daemon
+        to lease from, i.e. no lease file."""
+        data = f"{os.getpid()} {self._clock() + min(duration, self.MAX_DURATION):.3f}\n".encode()
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CLOEXEC)
+        except FileNotFoundError:
+            return False
+        try:
+            # Write, then cut off the rest of a previous lease, so that readers never see an empty file in between:
+            os.pwrite(fd, data, 0)
+            os.ftruncate(fd, len(data))
+        finally:
+            os.close(fd)
+        return True
+
+    def release(self):
+        try:
+            with open(self.path, 'r+b') as file:
+                pid = file.readline().split()[:1]
+                if pid == [str(os.getpid()).encode()]:
+                    file.truncate(0)
+        except (OSError, ValueError):
+            pass
+
+    @contextlib.contextmanager
+    def hold(self, duration: float):
+        """Hold the lease while in the context (but no longer than `duration` seconds, e.g. if killed)."""
+        try:
+            if not self.take(duration):
+                logging.debug(f"No fan lease '{self.path}', no daemon to keep from writing.")
+        except OSError as e:
+            logging.warning(f"Unable to take the fan lease '{self.path}', a running daemon might interfere: {e}")
+        try:
+            yield self
+        finally:
+            self.release()
@@ -0,0 +1,182 @@
+"""Logging setup of the daemon: rate-limited, and sent to the systemd journal natively where available.
+
+Records of the daemon carry structured fields in upper case (e.g. `TEMP`, `FAN_DUTY`, `PROFILE`, passed via
+`extra`), which the journal stores as fields of their own: `journalctl -u argond FAN_DUTY=100`.
+"""
+import logging
+import os
+import socket
+import struct
+import sys
+import time
+from typing import Dict, Tuple
+
+JOURNAL_SOCKET = '/run/systemd/journal/socket'
+FORMAT = "[%(levelname)s] %(message)s"
+# Attributes of every record, anything else comes from `extra` (or formatting):
+_RECORD_ATTRIBUTES = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most `burst` records with the same message template and level pass per `interval` seconds.
+
+    The number of suppressed records is appended to the first record passing after the interval, so repetitive
+    messages (e.g. each tick's "fan already running at the specified speed") shrink to a summary.
+    Templates are only compared, never formatted, so suppressed records are cheap.
+    Warnings, errors and events (records with one of the `EVENT_FIELDS`, i.e. fan speed and profile changes)
+    always pass.
+    """
+    MAX_KEYS = 256
+    EVENT_FIELDS = ('FAN_DUTY', 'PROFILE')
+
+    def __init__(self, interval: float = 60.0, burst: int = 3, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._clock = clock
+        self._windows = {}  # type: Dict[Tuple[str, int], list]  # key → [window start, passed, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        fields = record.__dict__
+        for field in self.EVENT_FIELDS:
+            if field in fields:
+                return True
+        now = self._clock()
+        msg = record.msg
+        key = (msg if msg.__class__ is str else repr(msg), record.levelno)
+        window = self._windows.get(key)
+        if window is not None and now - window[0] < self.interval:
+            # Within the window, the common case:
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+        suppressed = window[2] if window else 0
+        if window is None and len(self._windows) >= self.MAX_KEYS:
+            # Messages formatted in advance (f-strings) make a new key each, forget the expired ones:
+            self._windows = {k: w for k, w in self._windows.items() if now - w[0] < self.interval}
+        self._windows[key] = [now, 1, 0]
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar message(s) suppressed)"
+        return True
+
+
+class JournalHandler(logging.Handler):
+    """Sends records to journald via its native protocol, i.e. as datagrams of `FIELD=value` lines.
+
+    Besides the message, priority and (for warnings and errors) the code location, all upper case attributes
+    of a record become fields.
+    Messages too large for a datagram are passed in a sealed memfd like `sd_journal_send` does.
+    """
+    PRIORITIES = ((logging.CRITICAL, 2), (logging.ERROR, 3), (logging.WARNING, 4), (logging.INFO, 6))
+    _LENGTH = struct.Struct('<Q')
+
+    def __init__(self, identifier: str = 'argond', path: str = JOURNAL_SOCKET):
+        super().__init__()
+        self.identifier = identifier
+        self.path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+        self._headers = {}  # type: Dict[int, bytes]
+
+    @classmethod
+    def priority(cls, levelno: int) -> int:
+        return next((priority for level, priority in cls.PRIORITIES if levelno >= level), 7)
+
+    def _header(self, levelno: int) -> bytes:
+        """The constant fields of records of a level, built once."""
+        header = self._headers.get(levelno)
+        if header is None:
+            header = self._headers[levelno] = (f"PRIORITY={self.priority(levelno)}\n"
+                                               f"SYSLOG_IDENTIFIER={self.identifier}\n").encode()
+        return header
+
+    def serialize(self, record: logging.LogRecord) -> bytes:
+        # Only a formatter set explicitly, exception or stack info take the (slower) `format`:
+        if self.formatter or record.exc_info or record.exc_text or record.stack_info:
+            message = self.format(record)
+        else:
+            message = record.getMessage()
+        attributes = record.__dict__
+        if record.levelno < logging.WARNING and len(attributes) <= len(_RECORD_ATTRIBUTES) and '\n' not in message:
+            # Most records, e.g. each tick's debug output:
+            return self._header(record.levelno) + f"MESSAGE={message}\n".encode('utf-8', 'replace')
+        fields = [('MESSAGE', message)]
+        if record.levelno >= logging.WARNING:
+            fields += [('CODE_FILE', record.pathname), ('CODE_LINE', record.lineno), ('CODE_FUNC', record.funcName)]
+        fields.extend((key, attributes[key]) for key in attributes.keys() - _RECORD_ATTRIBUTES if key.isupper())
+        data = bytearray(self._header(record.levelno))
+        for key, value in fields:
+            value = str(value)
+            if '\n' in value:
+                value = value.encode('utf-8', 'replace')
+                data += key.encode() + b'\n' + self._LENGTH.pack(len(value)) + value + b'\n'
+            else:
+                data += f"{key}={value}\n".encode('utf-8', 'replace')
+        return bytes(data)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            data = self.serialize(record)
+            try:
+                self._socket.sendto(data, self.path)
+            except OSError as e:
+                if e.errno != getattr(os, 'EMSGSIZE', 90) or not hasattr(os, 'memfd_create'):
+                    raise
+                self._send_memfd(data)
+        except Exception:
+            self.handleError(record)
+
+    def _send_memfd(self, data: bytes):
+        import fcntl
+        fd = os.memfd_create('argond-journal', os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING)
+        try:
+            os.write(fd, data)
+            fcntl.fcntl(fd, fcntl.F_ADD_SEALS,
+                        fcntl.F_SEAL_SHRINK | fcntl.F_SEAL_GROW | fcntl.F_SEAL_WRITE | fcntl.F_SEAL_SEAL)
+            self._socket.sendmsg([], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, struct.pack('i', fd))], 0, self.path)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self._socket.close()
+        super().close()
+
+
+def journal_stream() -> bool:
+    """Whether stderr is connected to the journal, i.e. we have been started by systemd (see systemd.exec(5))."""
+    expected = os.environ.get('JOURNAL_STREAM')
+    if not expected:
+        return False
+    try:
+        stat = os.fstat(sys.stderr.fileno())
+    except (OSError, ValueError):
+        return False
+    return expected == f"{stat.st_dev}:{stat.st_ino}"
+
+
+def lean_records():
+    """Skip looking up thread and process names for each record, about a third of the cost of creating one:
+    neither `FORMAT` nor the journal (which knows the sender's PID anyway) uses them."""
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+
+def setup_daemon(verbose: bool = False, journal: bool = None, interval: float = 60.0, burst: int = 3):
+    """Replace the handlers of the root logger by a rate-limited one writing to the journal (if `journal` or,
+    by default, if stderr is connected to it anyway) or to stderr."""
+    if journal is None:
+        journal = journal_stream() and os.path.exists(JOURNAL_SOCKET)
+    handler = JournalHandler() if journal else logging.StreamHandler()
+    if not journal:
+        handler.setFormatter(logging.Formatter(FORMAT))
+    handler.addFilter(RateLimitFilter(interval, burst))
+    lean_records()
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG if verbose else logging.INFO)
+    return handler
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+
+class Metric:
+    type = 'unknown'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """Yield (suffix, labels, value) tuples."""
+        raise NotImplementedError
+
+
+class Gauge(Metric):
+    """A value that is either set or, if `collect` is given, computed on each scrape (no cost in between)."""
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, collect: Callable[[], float] = None):
+        super().__init__(name, help)
+        self.value = 0.0
+        self._collect = collect
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self):
+        value = self._collect() if self._collect else self.value
+        if value is not None:
+            yield '', '', value
+
+
+class Counter(Metric):
+    """Counts per label value (label name `label`), or a plain count if there is no label."""
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, label: str = None, values: Sequence[str] = (),
+                 collect: Callable[[], Dict[str, float]] = None):
+        super().__init__(name, help)
+        self.label = label
+        self.counts = dict.fromkeys(values or ('',), 0)
+        self._collect = collect
+
+    def inc(self, value: str = '', amount: int = 1):
+        self.counts[value] = self.counts.get(value, 0) + amount
+
+    def samples(self):
+        counts = self._collect() if self._collect else self.counts
+        for value, count in counts.items():
+            yield '_total', f'{self.label}="{value}"' if self.label else '', count
+
+
+class Histogram(Metric):
+    """Fixed buckets backed by a preallocated array, so observing does not allocate."""
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = array('Q', bytes(8 * (len(self.buckets) + 1)))
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield '_bucket', f'le="{bound:g}"', cumulative
+        cumulative += self.counts[-1]
+        yield '_bucket', 'le="+Inf"', cumulative
+        yield '_count', '', cumulative
+        yield '_sum', '', self.sum
+
+
+class Registry:
+    CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+    def __init__(self, metrics: Iterable[Metric] = ()):
+        self.metrics = list(metrics)
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render all metrics in the OpenMetrics text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{{{labels}}} {value}' if labels
+                             else f'{metric.name}{suffix} {value}')
+        lines.append('# EOF\n')
+        return '\n'.join(lines)
+
+
+class MetricsServer:
+    """Minimal HTTP server exposing a `Registry` on `host:port` or `unix:/path/to/socket`."""
+    TIMEOUT = 5.0
+
+    def __init__(self, registry: Registry, address: str):
+        self.registry = registry
+        self.address = address
+        self._server = None
+
+    async def start(self):
+        try:
+            if self.address.startswith('unix:'):
+                path = self.address[len('unix:'):]
+                if os.path.exists(path):
+                    os.unlink(path)
+                self._server = await asyncio.start_unix_server(self._serve, path)
+            else:
+                host, _, port = self.address.rpartition(':')
+                self._server = await asyncio.start_server(self._serve, host or '127.0.0.1', int(port))
+        except (OSError, ValueError):
+            logging.exception(f"Unable to serve metrics on '{self.address}', continuing without them.")
+            return
+        logging.info(f"Serving OpenMetrics on '{self.address}'.")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if self.address.startswith('unix:'):
+                try:
+                    os.unlink(self.address[len('unix:'):])
+                except FileNotFoundError:
+                    pass
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), self.TIMEOUT)
+            while (await asyncio.wait_for(reader.readline(), self.TIMEOUT)).strip():
+                pass
+            method, path, *_ = request.decode('latin-1').split() + ['', '']
+            if method == 'GET' and path.split('?')[0] in ('/', '/metrics'):
+                status, content_type, body = '200 OK', Registry.CONTENT_TYPE, self.registry.render().encode()
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', b'Not found\n'
+            writer.write(f'HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError) as e:
+            logging.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+
+def daemon_registry(daemon, io) -> Registry:
+    """Metrics of a running `argon.daemon.Daemon` using `io`. Values kept anyway are only collected on scrape."""
+    def i2c(key):
+        return lambda: {f'{addr:#04x}': stats[key] for addr, stats in io.i2c_stats().items()}
+
+    return Registry([
+        Gauge('argon_soc_temperature_celsius', "Current SoC temperature", lambda: daemon.temp),
+        Gauge('argon_soc_temperature_max_celsius', "Maximum SoC temperature since start", lambda: daemon.temp_max),
+        Gauge('argon_fan_duty_percent', "Current fan duty", lambda: daemon.fan_speed),
+        Counter('argon_i2c_writes', "Acknowledged i2c writes", 'addr', collect=i2c('writes')),
+        Counter('argon_i2c_suppressed_writes', "Redundant i2c writes that were skipped", 'addr',
+                collect=i2c('suppressed')),
+        Counter('argon_i2c_errors', "i2c write errors (including retried ones)", 'addr', collect=i2c('errors')),
+        Counter('argon_i2c_failures', "i2c writes that failed even after retrying", 'addr', collect=i2c('failures')),
+        Counter('argon_ticks', "Control ticks", collect=lambda: {'': daemon.ticks}),
+        Counter('argon_throttled_seconds', "Time spent in each firmware throttle state", 'state',
+                collect=daemon.accounting.totals),
+        daemon.button_events,
+        daemon.tick_duration,
+        daemon.sensor_duration,
+    ])
@@ -0,0 +1,70 @@
+"""Service notifications to systemd (see sd_notify(3)), natively over the `NOTIFY_SOCKET` datagram socket.
+
+With `Type=notify` and `WatchdogSec=` in the unit, the daemon reports when it is ready, shows its state in
+`systemctl status argond` and pings the watchdog from its control tick, so a stalled loop (e.g. stuck in an i2c call)
+gets restarted instead of leaving the fan at its last speed.
+"""
+import logging
+import os
+import socket
+from typing import MutableMapping, Optional
+
+
+class Notifier:
+    """Sends `KEY=value` assignments to the service manager's socket at `path` (`@` prefix: abstract namespace).
+
+    `watchdog` is the watchdog timeout in seconds, if the service manager expects pings at all.
+    """
+
+    def __init__(self, path: str, watchdog: float = None):
+        self.path = '\0' + path[1:] if path.startswith('@') else path
+        self.watchdog = watchdog
+        self.ready = False
+        self._status = None  # type: Optional[str]
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+
+    @classmethod
+    def from_environment(cls, environ: MutableMapping[str, str] = os.environ) -> Optional['Notifier']:
+        """The notifier systemd asks for via the environment, or None if not started as a notify service.
+
+        The variables are removed, so that child processes (e.g. button actions) do not notify on our behalf.
+        """
+        path = environ.pop('NOTIFY_SOCKET', None)
+        usec = environ.pop('WATCHDOG_USEC', None)
+        pid = environ.pop('WATCHDOG_PID', None)
+        if not path:
+            return None
+        watchdog = None
+        if usec and (not pid or pid == str(os.getpid())):
+            try:
+                watchdog = int(usec) / 1e6 or None
+            except ValueError:
+                logging.warning(f"Ignoring invalid WATCHDOG_USEC={usec!r}")
+        return cls(path, watchdog)
+
+    def send(self, *assignments: str) -> bool:
+        try:
+            self._socket.sendto('\n'.join(assignments).encode(), self.path)
+        except OSError as e:
+            logging.debug("Unable to notify the service manager: %s", e)
+            return False
+        return True
+
+    def alive(self, status: str) -> bool:
+        """Report a healthy tick: ready (the first time), a watchdog ping (if enabled) and `status` (if changed)."""
+        assignments = []
+        if not self.ready:
+            assignments.append('READY=1')
+            self.ready = True
+        if self.watchdog:
+            assignments.append('WATCHDOG=1')
+        if status != self._status:
+            assignments.append(f'STATUS={status}')
+            self._status = status
+        return self.send(*assignments) if assignments else True
+
+    def stopping(self):
+        self.send('STOPPING=1', 'STATUS=Stopping')
+
+    def close(self):
+        self._socket.close()
@@ -0,0 +1,92 @@
+"""Minimal shutdown notification for the very end of a poweroff/halt (see `systemd/argond-poweroff.sh`).
+
+At that point services are gone and filesystems are read-only, so this deliberately imports nothing but the
+standard library modules it needs, and neither reads the config nor touches GPIO: It just writes the two bytes
+of `IO.notify_shutdown` (fan off, then 0xFF) to /dev/i2c-* and reports how long that took from process start.
+
+    argon-poweroff [--device /dev/i2c-1]
+"""
+import fcntl
+import os
+import stat
+import sys
+import time
+
+I2C_SLAVE = 0x0703
+I2C_ADDR = 0x1a  # Same as `IO.I2C_ADDR`, but without importing `argon.ctrl` (and thereby `argon.button` etc.)
+DEVICES = ('/dev/i2c-1', '/dev/i2c-0')
+SHUTDOWN_TARGETS = ('poweroff.target', 'halt.target')
+
+
+def notify(device: str = None, addr: int = I2C_ADDR, retries: int = 3) -> float:
+    """Turn the fan off and tell the case to cut the power once the Pi is down. Returns the seconds spent.
+
+    Each write is an SMBus "write byte data" to register 0, i.e. a plain two byte i2c write. If `device` is
+    a regular file instead of an i2c character device (for testing), the bytes are just written to it.
+    """
+    started = time.perf_counter()
+    if device is None:
+        device = next((d for d in DEVICES if os.path.exists(d)), DEVICES[0])
+    fd = os.open(device, os.O_RDWR | os.O_CLOEXEC)
+    try:
+        if stat.S_ISCHR(os.fstat(fd).st_mode):
+            fcntl.ioctl(fd, I2C_SLAVE, addr)
+        for value in (0, 0xFF):
+            for attempt in range(retries + 1):
+                try:
+                    os.write(fd, bytes((0, value)))
+                    break
+                except OSError:
+                    # The bus may still be busy with other HATs, there is no time for a backoff though:
+                    if attempt == retries:
+                        raise
+    finally:
+        os.close(fd)
+    return time.perf_counter() - started
+
+
+def process_age() -> float:
+    """Seconds since this process has been started (with the kernel's clock tick resolution, usually 10ms)."""
+    with open('/proc/self/stat', 'rb') as f:
+        # The command in field 2 may contain spaces, the start time is field 22:
+        start_ticks = int(f.read().rpartition(b')')[2].split()[19])
+    with open('/proc/uptime', 'rb') as f:
+        uptime = float(f.read().split()[0])
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def powering_off() -> bool:
+    """Whether systemd is about to power off or halt the system (as opposed to e.g. rebooting or just stopping
+    the service), i.e. whether a poweroff/halt target is among its pending jobs."""
+    import subprocess
+    try:
+        jobs = subprocess.run(['systemctl', 'list-jobs', '--no-legend', '--no-pager'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, timeout=1).stdout
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return any(target in line.split()[1:2] for line in jobs.splitlines() for target in SHUTDOWN_TARGETS)
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    device = None
+    if argv[:1] == ['--device'] and len(argv) == 2:
+        device = argv[1]
+    elif argv:
+        sys.stderr.write("Usage: argon-poweroff [--device /dev/i2c-N]\n")
+        return 2
+    try:
+        duration = notify(device)
+    except OSError as e:
+        sys.stderr.write(f"argon-poweroff: Unable to notify the case: {e}\n")
+        return 1
+    try:
+        age = f"{process_age() * 1e3:.0f}ms after start"
+    except (OSError, ValueError, IndexError):
+        age = "unknown time after start"
+    sys.stderr.write(f"argon-poweroff: Told the case to cut the power {age} ({duration * 1e3:.1f}ms for i2c).\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+class FixedInterval:
+    """Samples the temperature every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.wakeups = 0
+        self._started = None
+
+    def next(self, temp: float, now: float) -> float:
+        """Register a wakeup with temperature `temp` at `now` and return the seconds to sleep until the next one."""
+        if self._started is None:
+            self._started = now
+        self.wakeups += 1
+        return self._next(temp, now)
+
+    def _next(self, temp, now):
+        return self.interval
+
+    def rate(self, now: float) -> float:
+        """Effective wakeups per minute since the first wakeup."""
+        if self._started is None or now <= self._started:
+            return 60 / self.interval
+        return self.wakeups * 60 / (now - self._started)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.interval}s)"
+
+
+class AdaptiveInterval(FixedInterval):
+    """Stretches the sampling interval towards `max_interval` while the temperature is flat and far from any
+    threshold of the fan curve, and shrinks it towards `min_interval` when it changes fast or a threshold is near.
+
+    The interval is the minimum of
+        a) half the time the temperature needs to reach the next threshold ahead at its current (smoothed) slope
+        b) `max_interval` scaled down linearly once the nearest threshold is closer than `margin` degrees
+    """
+
+    def __init__(self, curve, min_interval: float = 2.0, max_interval: float = 60.0,
+                 margin: float = 5.0, smoothing: float = 0.5):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Intervals must satisfy 0 < min_interval <= max_interval")
+        super().__init__(max_interval)
+        self.curve = curve
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.margin = margin
+        self.smoothing = smoothing
+        self.slope = 0.0
+        self._last = None
+
+    def _next(self, temp, now):
+        if self._last is not None and now > self._last[1]:
+            slope = (temp - self._last[0]) / (now - self._last[1])
+            self.slope += self.smoothing * (slope - self.slope)
+        self._last = (temp, now)
+
+        distance = self.curve.distance(temp)
+        interval = self.max_interval * min(1.0, distance / self.margin) if self.margin > 0 else self.max_interval
+        if abs(self.slope) > 1e-6:
+            ahead = self.curve.distance(temp, 1 if self.slope > 0 else -1)
+            interval = min(interval, ahead / abs(self.slope) / 2)
+        self.interval = max(self.min_interval, min(self.max_interval, interval))
+        return self.interval
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.min_interval}s - {self.max_interval}s)"
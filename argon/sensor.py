@@ -0,0 +1,323 @@
+import glob
+import logging
+import os
+import threading
+import time
+from typing import Mapping, Optional, Tuple
+
+
+class SensorError(Exception):
+    pass
+
+
+class Sensor:
+    """A temperature source returning degrees Celsius."""
+    name = 'sensor'
+
+    def read(self) -> float:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class SysfsSensor(Sensor):
+    """Reads a sysfs temperature attribute (millidegree Celsius) through a persistently opened fd.
+
+    Re-reading offset 0 of a sysfs attribute makes the kernel regenerate its value,
+    so no open/close (let alone fork/exec) is needed per sample.
+    """
+    THERMAL_ZONES = '/sys/class/thermal/thermal_zone*'
+    HWMON = '/sys/class/hwmon/hwmon*'
+
+    def __init__(self, path: str, scale: int = 1000):
+        self.name = path
+        self._scale = scale
+        try:
+            self._fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError as e:
+            raise SensorError(f"Unable to open '{path}': {e}") from e
+
+    @classmethod
+    def find_zone(cls, types=('cpu', 'soc'), fallback=True) -> Optional[str]:
+        """Return the temp attribute of the SoC's thermal zone (or of the first zone as a fallback)."""
+        zones = sorted(glob.glob(cls.THERMAL_ZONES))
+        for zone in zones:
+            if any(t in cls._attribute(zone, 'type') for t in types):
+                return os.path.join(zone, 'temp')
+        return os.path.join(zones[0], 'temp') if zones and fallback else None
+
+    @classmethod
+    def find_hwmon(cls, name: str, attribute: str = 'temp1_input') -> Optional[str]:
+        """Return the temperature attribute of the first hwmon device called `name`, e.g. `nvme` or `drivetemp`."""
+        for device in sorted(glob.glob(cls.HWMON)):
+            if cls._attribute(device, 'name') == name.lower():
+                return os.path.join(device, attribute)
+        return None
+
+    @staticmethod
+    def _attribute(directory: str, name: str) -> str:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                return f.read().strip().lower()
+        except OSError:
+            return ''
+
+    def read(self) -> float:
+        try:
+            raw = os.pread(self._fd, 32, 0)
+        except OSError as e:
+            raise SensorError(f"Unable to read '{self.name}': {e}") from e
+        try:
+            return int(raw) / self._scale
+        except ValueError:
+            raise SensorError(f"Unexpected value {raw!r} in '{self.name}'")
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class VcgencmdSensor(Sensor):
+    """Legacy fallback: asks the VideoCore firmware via `vcgencmd measure_temp` (one fork/exec per sample).
+
+    With `source` (e.g. `pmic` on a Pi 5), another sensor than the SoC's is measured.
+    """
+    DEFAULT_PATHS = ('/usr/bin/vcgencmd', '/opt/vc/bin/vcgencmd')
+
+    def __init__(self, path: str = None, source: str = None):
+        if not path:
+            import shutil
+            path = shutil.which('vcgencmd') or next((p for p in self.DEFAULT_PATHS if os.path.exists(p)),
+                                                    self.DEFAULT_PATHS[-1])
+        self.name = f'{path} {source}' if source else path
+        self._args = [path, 'measure_temp'] + ([source] if source else [])
+
+    def read(self) -> float:
+        import subprocess
+        try:
+            result = subprocess.run(self._args, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, universal_newlines=True, timeout=5)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise SensorError(f"Unable to run '{self.name}': {e}") from e
+        # Output looks like: temp=48.3'C
+        output = result.stdout.strip()
+        left, right = "temp=", "'C"
+        try:
+            return float(output[output.index(left) + len(left):output.index(right)])
+        except ValueError:
+            raise SensorError(f"Unexpected output {output!r} of '{self.name}'")
+
+
+class CachedSensor(Sensor):
+    """Keeps the last good value of another sensor and serves it for at most `max_age` seconds
+    if the underlying sensor fails, so a single bad sample does not take down the daemon."""
+
+    def __init__(self, sensor: Sensor, max_age: float = 30.0, clock=time.monotonic):
+        self.name = sensor.name
+        self.sensor = sensor
+        self.max_age = max_age
+        self._clock = clock
+        self._value = None
+        self._stamp = float('-inf')
+
+    @property
+    def age(self) -> float:
+        return self._clock() - self._stamp
+
+    def read(self) -> float:
+        try:
+            self._value = self.sensor.read()
+            self._stamp = self._clock()
+        except SensorError:
+            if self._value is None or self.age > self.max_age:
+                raise
+            logging.warning("Sensor '%s' failed, using cached value %.3f°C (%.1fs old)",
+                            self.name, self._value, self.age, exc_info=True)
+        return self._value
+
+    def close(self):
+        self.sensor.close()
+
+
+class PeriodicSensor(Sensor):
+    """Reads a slow sensor (e.g. a drive, which may have to be woken up, or `vcgencmd`) every `interval` seconds
+    in a background thread, so that reading it never blocks the caller. `read` returns the latest value and fails
+    if there is none yet or it is older than `max_age` (default: three intervals)."""
+
+    def __init__(self, sensor: Sensor, interval: float, max_age: float = None, clock=time.monotonic):
+        self.name = sensor.name
+        self.sensor = sensor
+        self.interval = interval
+        self.max_age = 3 * interval if max_age is None else max_age
+        self._clock = clock
+        self._sample = (None, float('-inf'))
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'sensor {self.name}', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                value = self.sensor.read()
+            except SensorError as e:
+                logging.warning(f"Reading slow sensor '{self.name}' failed: {e}")
+            else:
+                # A single attribute assignment is atomic, readers never see a value with the stamp of another one:
+                self._sample = (value, self._clock())
+            self._closed.wait(self.interval)
+
+    def read(self) -> float:
+        value, stamp = self._sample
+        if value is None or self._clock() - stamp > self.max_age:
+            raise SensorError(f"No recent value of '{self.name}'")
+        return value
+
+    def close(self):
+        self._closed.set()
+        self._thread.join(timeout=5)
+        self.sensor.close()
+
+
+class AggregateSensor(Sensor):
+    """Combines named sensors into a single temperature: the maximum or the `weighted` average of all sensors
+    with a positive weight (default: 1). The latest value of each sensor is kept in `values`, e.g. to apply
+    sensor-specific fan curves. Failing sensors are left out as long as at least one sensor delivers a value."""
+    MODES = ('max', 'weighted')
+
+    def __init__(self, sensors: Mapping[str, Sensor], weights: Mapping[str, float] = None, mode: str = 'max'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode '{mode}', must be one of {', '.join(self.MODES)}")
+        self.sensors = dict(sensors)
+        self.weights = {name: (weights or {}).get(name, 1.0) for name in self.sensors}
+        self.mode = mode
+        self.name = f"{mode}({', '.join(self.sensors)})"
+        self.values = dict.fromkeys(self.sensors)
+
+    def read(self) -> float:
+        combined = None
+        weight_sum = 0.0
+        for name, sensor in self.sensors.items():
+            try:
+                value = self.values[name] = sensor.read()
+            except SensorError as e:
+                self.values[name] = None
+                logging.warning(f"Sensor '{name}' failed: {e}")
+                continue
+            weight = self.weights[name]
+            if weight <= 0:
+                continue
+            if self.mode == 'max':
+                combined = value if combined is None else max(combined, value)
+            else:
+                combined = (combined or 0.0) + weight * value
+                weight_sum += weight
+        if combined is None:
+            raise SensorError("None of the sensors delivered a temperature")
+        return combined / weight_sum if weight_sum else combined
+
+    def close(self):
+        for sensor in self.sensors.values():
+            sensor.close()
+
+
+class CpuLoad:
+    """Utilisation of all CPUs (0..1) since the previous `read`, from the aggregate line of `/proc/stat`.
+
+    Like `SysfsSensor`, the file is kept open and re-read at offset 0 (as a file object, so that it is closed along
+    with the fan profile owning it). With `cpufreq`, the utilisation is scaled by the current relative to the maximum
+    clock of CPU 0 (a rough proxy for the power the SoC turns into heat).
+    """
+    STAT = '/proc/stat'
+    CPUFREQ = '/sys/devices/system/cpu/cpu0/cpufreq'
+
+    def __init__(self, path: str = STAT, cpufreq: bool = False, cpufreq_path: str = CPUFREQ):
+        self.name = path
+        self._stat = open(path, 'rb', buffering=0)
+        self._freq = None
+        self._max_freq = None
+        if cpufreq:
+            try:
+                with open(os.path.join(cpufreq_path, 'scaling_max_freq')) as f:
+                    self._max_freq = int(f.read())
+                if self._max_freq <= 0:
+                    raise ValueError(f"maximum frequency {self._max_freq}")
+                self._freq = open(os.path.join(cpufreq_path, 'scaling_cur_freq'), 'rb', buffering=0)
+            except (OSError, ValueError) as e:
+                logging.warning(f"cpufreq unavailable ({e}), using the CPU utilisation only.")
+        self._last = self._times()
+
+    def _times(self) -> Tuple[int, int]:
+        # The first line is "cpu  user nice system idle iowait irq softirq steal guest guest_nice" (in ticks):
+        fields = os.pread(self._stat.fileno(), 256, 0).split(b'\n', 1)[0].split()[1:9]
+        times = [int(f) for f in fields]
+        return sum(times), times[3] + times[4]
+
+    def read(self) -> float:
+        total, idle = self._times()
+        last_total, last_idle = self._last
+        self._last = total, idle
+        if total <= last_total:
+            return 0.0
+        load = 1.0 - (idle - last_idle) / (total - last_total)
+        if self._freq:
+            try:
+                load *= min(1.0, int(os.pread(self._freq.fileno(), 32, 0)) / self._max_freq)
+            except (OSError, ValueError):
+                # Unscaled for once, e.g. while the CPU is being hot-unplugged:
+                pass
+        return max(0.0, load)
+
+    def close(self):
+        self._stat.close()
+        if self._freq:
+            self._freq.close()
+
+
+SPECS = ('auto', 'sysfs', 'thermal', 'hwmon', 'vcgencmd', 'pmic')
+
+
+def open_sensor(spec: str = 'auto', max_age: float = 30.0) -> Sensor:
+    """Create a (cached) sensor from a spec like `auto`, `sysfs[:path]`, `thermal:type`, `hwmon:name`,
+    `vcgencmd[:path]` or `pmic[:path to vcgencmd]`.
+
+    `auto` prefers the SoC's thermal zone and only falls back to `vcgencmd` if there is none.
+    """
+    kind, _, path = (spec or 'auto').partition(':')
+    if kind == 'auto':
+        path = SysfsSensor.find_zone()
+        if path:
+            try:
+                sensor = SysfsSensor(path)
+            except SensorError:
+                logging.warning("Unable to use thermal zone '%s', falling back to vcgencmd", path, exc_info=True)
+                sensor = VcgencmdSensor()
+        else:
+            sensor = VcgencmdSensor()
+    elif kind == 'sysfs':
+        path = path or SysfsSensor.find_zone()
+        if not path:
+            raise SensorError("No thermal zone found")
+        sensor = SysfsSensor(path)
+    elif kind == 'thermal':
+        zone = SysfsSensor.find_zone((path.lower(),), fallback=False)
+        if not zone:
+            raise SensorError(f"No thermal zone of type '{path}' found")
+        sensor = SysfsSensor(zone)
+    elif kind == 'hwmon':
+        attribute = SysfsSensor.find_hwmon(path)
+        if not attribute:
+            raise SensorError(f"No hwmon device '{path}' found")
+        sensor = SysfsSensor(attribute)
+    elif kind == 'vcgencmd':
+        sensor = VcgencmdSensor(path or None)
+    elif kind == 'pmic':
+        sensor = VcgencmdSensor(path or None, 'pmic')
+    else:
+        raise SensorError(f"Unknown sensor type '{kind}'")
+    logging.debug("Using temperature sensor %r", sensor)
+    return CachedSensor(sensor, max_age) if max_age > 0 else sensor
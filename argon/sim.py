@@ -0,0 +1,301 @@
+"""Simulated hardware backend to run the daemon without a Raspberry Pi.
+
+It consists of a fake SMBus recording the register writes, a fake RPi.GPIO to inject button edges,
+a first-order thermal model of the SoC driven by a CPU load trace and the current fan duty,
+and a virtual clock with an event loop that skips idle time, so that hours of daemon behaviour run in seconds.
+"""
+import asyncio
+import bisect
+import errno
+import math
+import selectors
+import threading
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from argon.ctrl import IO
+from argon.sensor import Sensor, SensorError
+
+
+class VirtualClock:
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        if seconds > 0:
+            self.now += seconds
+
+
+class _VirtualSelector:
+    """Polls the real selector without blocking and advances the virtual clock instead of waiting."""
+
+    def __init__(self, clock: VirtualClock):
+        self._clock = clock
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if not events:
+            if timeout is None:
+                # Nothing scheduled at all, only another thread can wake us up:
+                return self._selector.select(None)
+            self._clock.advance(timeout)
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Event loop whose time is a `VirtualClock`, jumping straight to the next timer whenever it is idle."""
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        super().__init__(selector=_VirtualSelector(clock))
+
+    def time(self) -> float:
+        return self.clock.now
+
+
+class ThermalModel:
+    """First-order thermal model of the SoC inside the case:
+
+        capacity * dT/dt = idle_power + load_power * load - (k_case + k_fan * duty) * (T - ambient)
+
+    `load` (0..1) comes from `load_trace(t)`, `duty` (0..1) is the last fan speed written to the case.
+    The defaults roughly resemble a Pi 4: ~45°C idle without fan, ~95°C (i.e. throttling) under full load
+    without fan and ~55°C with the fan at full speed.
+    """
+
+    def __init__(self, load_trace: Callable[[float], float] = lambda t: 0.0, clock: Callable[[], float] = None,
+                 ambient=25.0, idle_power=2.0, load_power=5.0, k_case=0.1, k_fan=0.1333, capacity=20.0,
+                 step=1.0, start_temp: float = None):
+        self.load_trace = load_trace
+        self.clock = clock
+        self.ambient = ambient
+        self.idle_power = idle_power
+        self.load_power = load_power
+        self.k_case = k_case
+        self.k_fan = k_fan
+        self.capacity = capacity
+        self.step = step
+        self.temp = ambient + idle_power / k_case if start_temp is None else start_temp
+        self.duty = 0.0
+        self.time = clock() if clock else 0.0
+
+    def equilibrium(self, load: float, duty: float) -> float:
+        return self.ambient + (self.idle_power + self.load_power * load) / (self.k_case + self.k_fan * duty)
+
+    def advance(self, until: float) -> float:
+        """Integrate up to `until` (exact solution per step, load sampled at the beginning of each step)."""
+        while self.time < until:
+            dt = min(self.step, until - self.time)
+            k = self.k_case + self.k_fan * self.duty
+            target = self.equilibrium(self.load_trace(self.time), self.duty)
+            self.temp = target + (self.temp - target) * math.exp(-k * dt / self.capacity)
+            self.time += dt
+        return self.temp
+
+    def read(self, now: float = None) -> float:
+        return self.advance(self.clock() if now is None else now)
+
+    def set_duty(self, duty: float, now: float = None):
+        self.advance(self.clock() if now is None else now)
+        self.duty = duty
+
+
+def step_trace(steps: Sequence[Tuple[float, float]]) -> Callable[[float], float]:
+    """Piecewise constant load trace from (start time, load) pairs."""
+    times = [t for t, _ in steps]
+    loads = [load for _, load in steps]
+
+    def trace(t):
+        i = bisect.bisect_right(times, t)
+        return loads[i - 1] if i else 0.0
+    return trace
+
+
+class FakeSMBus:
+    """Records all writes as (time, addr, reg, value) and forwards fan speeds to a thermal model.
+
+    Errno codes in `failures` are raised by the next writes, e.g. to simulate a busy bus.
+    """
+
+    def __init__(self, clock: Callable[[], float], model: ThermalModel = None, addr: int = IO.I2C_ADDR):
+        self._clock = clock
+        self.model = model
+        self.addr = addr
+        self.writes = []  # type: List[Tuple[float, int, int, int]]
+        self.failures = []  # type: List[int]
+
+    def write_byte_data(self, addr: int, reg: int, value: int):
+        if self.failures:
+            raise OSError(self.failures.pop(0), "Simulated i2c error")
+        if addr != self.addr:
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+        self.writes.append((self._clock(), addr, reg, value))
+        if self.model and reg == 0 and value <= 100:
+            self.model.set_duty(value / 100, self._clock())
+
+    def read_byte(self, addr: int) -> int:
+        if addr != self.addr:
+            raise OSError(errno.EREMOTEIO, "Remote I/O error")
+        return 0
+
+    def fan_writes(self) -> List[Tuple[float, int]]:
+        return [(t, value) for t, _, reg, value in self.writes if reg == 0 and value <= 100]
+
+
+class FakeGPIO:
+    """Stands in for the `RPi.GPIO` module. Button edges are injected via `edge` or `schedule`."""
+    BCM = 11
+    IN = 1
+    PUD_DOWN = 21
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    RPI_REVISION = 3
+
+    # Edge traces of the case's signal for each interaction, see `argon.button.ButtonClassifier`:
+    PUSHES = {
+        'long': [(0.0, 1), (0.035, 0)],
+        'double': [(0.0, 1), (0.015, 0), (0.2, 1), (0.215, 0)],
+        'many': [(t + d, level) for t in (0.0, 0.3, 0.6, 0.9) for d, level in ((0.0, 1), (0.015, 0))],
+    }
+
+    def __init__(self):
+        self.levels = {}
+        self.callbacks = {}
+        self._edge = threading.Condition()
+        self._last_edge = {}
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None):
+        self.levels[pin] = 0
+
+    def input(self, pin) -> int:
+        return self.levels.get(pin, 0)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.callbacks[pin] = (edge, callback)
+
+    def wait_for_edge(self, pin, edge, bouncetime=None, timeout=-1):
+        """Block until `edge` injects a matching edge (from another thread), returns None on timeout (ms)."""
+        with self._edge:
+            # Like the real thing, only edges from now on count:
+            self._last_edge.pop(pin, None)
+            if self._edge.wait_for(lambda: self._edge_pending(pin, edge), None if timeout < 0 else timeout / 1000):
+                return pin
+            return None
+
+    def _edge_pending(self, pin, edge) -> bool:
+        pending = self._last_edge.pop(pin, None)
+        return pending is not None and edge in (self.BOTH, self.RISING if pending else self.FALLING)
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self, pin=None):
+        self.callbacks.clear()
+
+    def edge(self, pin: int, level: int):
+        """Set the pin's level and notify the registered callback (if the edge matches)."""
+        self.levels[pin] = level
+        with self._edge:
+            self._last_edge[pin] = level
+            self._edge.notify_all()
+        edge, callback = self.callbacks.get(pin, (None, None))
+        if callback and edge in (self.BOTH, self.RISING if level else self.FALLING):
+            callback(pin)
+
+    def schedule(self, loop: asyncio.AbstractEventLoop, at: float, trace, pin: int = IO.BUTTON_PIN):
+        """Inject an edge trace ((offset, level) pairs or the name of a push in `PUSHES`) at loop time `at`."""
+        if isinstance(trace, str):
+            trace = self.PUSHES[trace]
+        for offset, level in trace:
+            loop.call_at(at + offset, self.edge, pin, level)
+
+
+class SimSensor(Sensor):
+    name = 'simulated'
+
+    def __init__(self, model: ThermalModel, noise: Callable[[], float] = None):
+        self.model = model
+        self.noise = noise
+        self.failures = 0
+
+    def read(self) -> float:
+        if self.failures:
+            self.failures -= 1
+            raise SensorError("Simulated sensor failure")
+        temp = self.model.read()
+        return temp + self.noise() if self.noise else temp
+
+
+class SimThrottled:
+    """Throttle flags (see `argon.throttle`) like the firmware would set them at the model's temperature."""
+    name = 'simulated'
+    SOFT_LIMIT = 80.0
+    THROTTLE = 85.0
+
+    def __init__(self, model: ThermalModel):
+        self.model = model
+        self.under_voltage = False
+
+    def read(self) -> int:
+        from argon.throttle import FREQ_CAPPED, SOFT_TEMP_LIMIT, THROTTLED, UNDER_VOLTAGE
+        temp = self.model.read()
+        flags = UNDER_VOLTAGE if self.under_voltage else 0
+        if temp >= self.SOFT_LIMIT:
+            flags |= SOFT_TEMP_LIMIT | FREQ_CAPPED
+        if temp >= self.THROTTLE:
+            flags |= THROTTLED
+        return flags
+
+    def close(self):
+        pass
+
+
+class Simulation:
+    """Bundles a simulated board. With `virtual_time`, the clock only advances when the loop is idle.
+
+    In real time, there is no `loop` of its own, `run` uses a new one (like `Daemon.run` does anyway).
+    """
+
+    def __init__(self, load_trace: Callable[[float], float] = lambda t: 0.0, virtual_time=True, **model_args):
+        if virtual_time:
+            self.clock = VirtualClock()
+            self.loop = VirtualTimeLoop(self.clock)  # type: Optional[asyncio.AbstractEventLoop]
+        else:
+            self.loop = None
+            self.clock = time.monotonic
+        self.model = ThermalModel(load_trace, self.clock, **model_args)
+        self.bus = FakeSMBus(self.clock, self.model)
+        self.gpio = FakeGPIO()
+        self.io = IO(self.bus, self.gpio, self.clock)
+        self.sensor = SimSensor(self.model)
+        self.throttle = SimThrottled(self.model)
+
+    def cpu_load(self) -> float:
+        """The simulated CPU load, e.g. for `argon.fan.FeedForward`."""
+        return self.model.load_trace(self.clock())
+
+    def run(self, daemon, duration: float = None):
+        """Run `daemon` (until `duration` seconds have passed if given)."""
+        loop = self.loop or asyncio.new_event_loop()
+        try:
+            if duration is not None:
+                loop.call_at(loop.time() + duration, daemon.stop)
+            daemon.run(loop)
+        finally:
+            if loop is not self.loop:
+                loop.close()
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.close()
@@ -0,0 +1,156 @@
+"""Throttling and under-voltage state of the Pi, as reported by its firmware, and how long each profile spent in it.
+
+The firmware's `get_throttled` bits (the lower ones are the current state, the upper ones "has occurred"):
+    0x1: under-voltage, 0x2: ARM frequency capped, 0x4: throttled, 0x8: soft temperature limit active
+"""
+import logging
+import os
+from typing import Dict, Optional
+
+from argon.sensor import SensorError
+
+UNDER_VOLTAGE = 0x1
+FREQ_CAPPED = 0x2
+THROTTLED = 0x4
+SOFT_TEMP_LIMIT = 0x8
+STATES = {
+    SOFT_TEMP_LIMIT: 'soft_temp_limit',
+    FREQ_CAPPED: 'freq_capped',
+    THROTTLED: 'throttled',
+    UNDER_VOLTAGE: 'under_voltage',
+}
+CURRENT = UNDER_VOLTAGE | FREQ_CAPPED | THROTTLED | SOFT_TEMP_LIMIT
+
+
+class SysfsThrottled:
+    """Reads the flags from the firmware driver's sysfs attribute (recent kernels), cheap enough for every tick."""
+    PATH = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+    interval = 0.0
+
+    def __init__(self, path: str = PATH):
+        self.name = path
+        try:
+            self._fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError as e:
+            raise SensorError(f"Unable to open '{path}': {e}") from e
+
+    def read(self) -> int:
+        try:
+            return int(os.pread(self._fd, 32, 0), 16) & CURRENT
+        except (OSError, ValueError) as e:
+            raise SensorError(f"Unable to read '{self.name}': {e}") from e
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class VcgencmdThrottled:
+    """Asks the firmware via `vcgencmd get_throttled` (one fork/exec per sample, so only every `interval` seconds)."""
+    interval = 60.0
+
+    def __init__(self, path: str = None):
+        if not path:
+            from argon.sensor import VcgencmdSensor
+            path = VcgencmdSensor().name
+        self.name = f'{path} get_throttled'
+        self._args = [path, 'get_throttled']
+
+    def read(self) -> int:
+        import subprocess
+        try:
+            output = subprocess.run(self._args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                    universal_newlines=True, timeout=5).stdout.strip()
+        except (OSError, subprocess.SubprocessError) as e:
+            raise SensorError(f"Unable to run '{self.name}': {e}") from e
+        # Output looks like: throttled=0x50000
+        try:
+            return int(output.partition('=')[2], 16) & CURRENT
+        except ValueError:
+            raise SensorError(f"Unexpected output {output!r} of '{self.name}'")
+
+    def close(self):
+        pass
+
+
+def open_source():
+    """The sysfs attribute if available, otherwise `vcgencmd` in the background (see `PeriodicSensor`),
+    or None if neither works (e.g. not on a Pi)."""
+    if os.path.exists(SysfsThrottled.PATH):
+        try:
+            return SysfsThrottled()
+        except SensorError:
+            logging.warning("Unable to open the throttle state in sysfs, trying vcgencmd", exc_info=True)
+    source = VcgencmdThrottled()
+    try:
+        source.read()
+    except SensorError as e:
+        logging.info(f"Throttle state unavailable: {e}")
+        return None
+    from argon.sensor import PeriodicSensor
+    return PeriodicSensor(source, source.interval)
+
+
+def format_states(flags: int) -> str:
+    return ', '.join(name for flag, name in STATES.items() if flags & flag) or 'none'
+
+
+class ProfileStats:
+    """Time, time per throttle state, maximum temperature and fan duty integral while a fan profile was active."""
+    __slots__ = ('seconds', 'states', 'temp_max', 'duty_seconds')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.states = dict.fromkeys(STATES.values(), 0.0)
+        self.temp_max = None  # type: Optional[float]
+        self.duty_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(self.states, seconds=self.seconds, temp_max=self.temp_max,
+                    duty_avg=self.duty_seconds / self.seconds if self.seconds else None)
+
+
+class ThrottleAccounting:
+    """Accumulates `ProfileStats` per fan profile from the samples of the daemon's ticks.
+
+    The state of a sample (profile, fan duty and throttle flags) counts until the next sample.
+    """
+
+    def __init__(self):
+        self.profiles = {}  # type: Dict[str, ProfileStats]
+        self.flags = 0
+        self._last = None
+
+    def update(self, now: float, profile: str, temp: Optional[float], duty: Optional[int], flags: int):
+        if self._last is not None:
+            last_now, last_profile, last_duty, last_flags = self._last
+            dt = now - last_now
+            stats = self.profiles[last_profile]
+            stats.seconds += dt
+            stats.duty_seconds += (last_duty or 0) * dt
+            if last_flags:
+                for flag, name in STATES.items():
+                    if last_flags & flag:
+                        stats.states[name] += dt
+        stats = self.profiles.get(profile)
+        if stats is None:
+            stats = self.profiles[profile] = ProfileStats()
+        if temp is not None and (stats.temp_max is None or temp > stats.temp_max):
+            stats.temp_max = temp
+        if flags != self.flags:
+            log = logging.warning if flags & ~self.flags else logging.info
+            log("Throttle state changed to: %s", format_states(flags))
+        self.flags = flags
+        self._last = (now, profile, duty, flags)
+
+    def report(self) -> dict:
+        return {profile: stats.as_dict() for profile, stats in self.profiles.items()}
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per state over all profiles."""
+        totals = dict.fromkeys(STATES.values(), 0.0)
+        for stats in self.profiles.values():
+            for name, seconds in stats.states.items():
+                totals[name] += seconds
+        return totals
@@ -0,0 +1,300 @@
+"""Offline tuning of `Fan:*` threshold tables (`argon tune`) by replaying recorded traces. Needs NumPy.
+
+The heat input of the SoC is recovered from a recorded (temperature, fan duty) trace by inverting the thermal model
+of `argon.sim.ThermalModel` (or taken from a `load` column if the trace has one). Thousands of candidate tables are
+then simulated on that heat input at once: all candidates are advanced tick by tick as arrays, with the same
+decisions as `FanCurve.update` (hysteresis and dwell time included) and the model's exact per-sample solution
+folded into one multiply-add per tick. Among the candidates that keep the temperature at or below `max_temp`, the
+one with the lowest cost wins:
+
+    cost = average duty + noise_weight * average loudness + switch_weight * switches per hour
+
+Loudness is estimated as duty^1.5 (sound power ~ rpm^5, perceived loudness doubles every 10 dB), in % of full speed.
+"""
+import csv
+import itertools
+import math
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from argon.fan import FanCurve
+
+GAP = 300.0  # Seconds without samples after which a trace is split (e.g. the daemon was not running)
+NOISE_EXPONENT = 1.5
+NOISE_WEIGHT = 0.5
+SWITCH_WEIGHT = 1.0
+TEMPS = tuple(np.arange(45.0, 75.1, 2.5))
+SPEEDS = tuple(range(10, 100, 10))
+RESOLUTION = 0.01  # °C, to which thresholds are resolved in the simulation
+
+
+class TuneError(Exception):
+    pass
+
+
+class Model(NamedTuple):
+    """Parameters of the first-order thermal model (see `argon.sim.ThermalModel`)."""
+    ambient: float = 25.0
+    idle_power: float = 2.0
+    load_power: float = 5.0
+    k_case: float = 0.1
+    k_fan: float = 0.1333
+    capacity: float = 20.0
+
+    def decay(self, duty: np.ndarray, dt: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Conductance and decay factor over `dt` seconds at `duty` (0..100)."""
+        k = self.k_case + self.k_fan * np.asarray(duty, dtype=float) / 100
+        return k, np.exp(-k * dt / self.capacity)
+
+
+class Trace(NamedTuple):
+    """A recording: times (s), temperatures (°C, NaN if unknown), duties (%, NaN if unknown) and optionally loads."""
+    times: np.ndarray
+    temps: np.ndarray
+    duties: np.ndarray
+    loads: Optional[np.ndarray] = None
+
+
+class Stats(NamedTuple):
+    """Simulation results per candidate (arrays) or of a single one."""
+    duty_avg: np.ndarray
+    noise: np.ndarray
+    switches_per_hour: np.ndarray
+    temp_max: np.ndarray
+
+
+class Result(NamedTuple):
+    points: Dict[float, int]
+    stats: Stats
+    cost: float
+    candidates: int
+    feasible: int
+    hours: float
+    references: Dict[str, Tuple[Stats, float]]
+
+
+def read_csv(lines: Iterable[str]) -> Trace:
+    """Read a trace as printed by `argon history --csv` (`timestamp,temp,fan_speed,flags`); an additional `load`
+    column (0..1) is used as the heat input instead of inverting the model."""
+    rows = list(csv.DictReader(lines))
+    if not rows or not {'timestamp', 'temp'} <= set(rows[0]):
+        raise TuneError("Expected a CSV trace with at least the columns 'timestamp' and 'temp'")
+
+    def column(name):
+        return np.array([float(row[name]) if row.get(name) not in (None, '') else np.nan for row in rows])
+    try:
+        return Trace(column('timestamp'), column('temp'), column('fan_speed'),
+                     column('load') if 'load' in rows[0] else None)
+    except ValueError as e:
+        raise TuneError(f"Invalid trace: {e}") from e
+
+
+def from_samples(samples: Iterable[Tuple[float, float, Optional[int], int]]) -> Trace:
+    """Trace of `History.samples`."""
+    times, temps, duties = [], [], []
+    for stamp, temp, duty, _ in samples:
+        times.append(stamp)
+        temps.append(temp)
+        duties.append(np.nan if duty is None else duty)
+    return Trace(np.array(times), np.array(temps), np.array(duties))
+
+
+def heat_input(trace: Trace, model: Model = Model(), step: float = 1.0) -> List[Tuple[float, np.ndarray]]:
+    """Resample `trace` to `step` seconds and return the heat input (W) per step, as (start temperature, power)
+    per contiguous segment of the trace."""
+    known = ~np.isnan(trace.temps)
+    times, temps = trace.times[known], trace.temps[known]
+    duties = _fill(trace.duties[known])
+    loads = trace.loads[known] if trace.loads is not None else None
+    order = np.argsort(times, kind='stable')
+    times, temps, duties = times[order], temps[order], duties[order]
+    if loads is not None:
+        loads = _fill(loads[order])
+    segments = []
+    bounds = np.flatnonzero(np.diff(times) > GAP) + 1
+    for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(times)]):
+        if times[stop - 1] - times[start] < 2 * step:
+            continue
+        grid = np.arange(times[start], times[stop - 1] + step / 2, step)
+        held = np.searchsorted(times[start:stop], grid, side='right') - 1 + start
+        if loads is not None:
+            power = model.idle_power + model.load_power * loads[held][:-1]
+        else:
+            temp = np.interp(grid, times[start:stop], temps[start:stop])
+            k, a = model.decay(duties[held], step)
+            # T1 = Teq + (T0 - Teq) * a  =>  Teq = (T1 - a * T0) / (1 - a), P = k * (Teq - ambient):
+            power = k[:-1] * ((temp[1:] - a[:-1] * temp[:-1]) / (1 - a[:-1]) - model.ambient)
+        segments.append((float(temps[start]), power))
+    if not segments:
+        raise TuneError("The trace is too short (or has no temperatures)")
+    return segments
+
+
+def _fill(values: np.ndarray) -> np.ndarray:
+    """Carry the last known value forward (0 before the first one)."""
+    known = ~np.isnan(values)
+    index = np.where(known, np.arange(len(values)), 0)
+    np.maximum.accumulate(index, out=index)
+    return np.where(known[index], values[index], 0.0)
+
+
+def candidates(temps: Sequence[float] = TEMPS, speeds: Sequence[int] = SPEEDS) -> np.ndarray:
+    """All tables with two or three points, increasing speeds and 100% at the highest threshold,
+    as an array of shape (n, 3, 2) of (threshold, speed); tables with two points repeat the last one."""
+    tables = []
+    for t1, t2, t3 in itertools.combinations(temps, 3):
+        for s1, s2 in itertools.combinations(speeds, 2):
+            tables.append(((t1, s1), (t2, s2), (t3, 100)))
+    for t1, t2 in itertools.combinations(temps, 2):
+        for s1 in speeds:
+            tables.append(((t1, s1), (t2, 100), (t2, 100)))
+    return np.array(tables, dtype=float)
+
+
+def as_table(points: Mapping[float, int], size: int = 3) -> np.ndarray:
+    """A fan profile's points in the shape of `candidates` (padded by repeating the highest point)."""
+    ordered = sorted(points.items())
+    if len(ordered) > size:
+        raise TuneError(f"Only tables with up to {size} points can be compared")
+    ordered += ordered[-1:] * (size - len(ordered))
+    return np.array(ordered, dtype=float)
+
+
+def simulate(segments: List[Tuple[float, np.ndarray]], tables: np.ndarray, model: Model = Model(),
+             interval: float = 10.0, step: float = 1.0, hysteresis_up: float = FanCurve.HYSTERESIS_UP,
+             hysteresis_down: float = FanCurve.HYSTERESIS_DOWN, min_dwell: float = FanCurve.MIN_DWELL) -> Stats:
+    """Simulate all `tables` (see `candidates`) on the heat input `segments`, checking the temperature every
+    `interval` seconds like the daemon does. The maximum temperature is the one seen at these checks."""
+    n, size, _ = tables.shape
+    per_tick = max(1, int(round(interval / step)))
+    levels, index = np.unique(np.concatenate([[0.0], tables[:, :, 1].ravel()]), return_inverse=True)
+    # `FanCurve.lookup` of all candidates as a table: the speed level per candidate and temperature bin, where the
+    # bins are delimited by all thresholds. The bin of a temperature comes from another table in steps of
+    # `RESOLUTION`, so a lookup is two gathers instead of a binary search per candidate:
+    by_count = np.empty((n, size + 1), dtype=np.intp)
+    by_count[:, 0] = index[0]
+    by_count[:, 1:] = index[1:].reshape(n, size)
+    edges = np.unique(tables[:, :, 0])
+    exceeded = np.zeros((n, len(edges) + 1), dtype=np.intp)
+    exceeded[:, 1:] = (tables[:, None, :, 0] <= edges[None, :, None]).sum(axis=2)
+    lookup = np.take_along_axis(by_count, exceeded, axis=1).ravel()
+    offsets = np.arange(n) * (len(edges) + 1)
+    lowest = edges[0] - RESOLUTION
+    steps = np.arange(int(round((edges[-1] - lowest) / RESOLUTION)) + 2)
+    bins = np.searchsorted(edges, lowest + (steps + 0.5) * RESOLUTION, side='right')
+    # Over a tick at a constant duty, the exact solution is x' = A * x + sum(B_j * P_j) with x = T - ambient:
+    k, a = model.decay(levels, step)
+    powers = a[None, :] ** np.arange(per_tick - 1, -1, -1)[:, None]  # (per_tick, levels)
+    decay_tick = a ** per_tick
+    gain = (1 - a) / k
+
+    duty_sum = np.zeros(n)
+    noise_sum = np.zeros(n)
+    switches = np.zeros(n)
+    temp_max = np.full(n, -np.inf)
+    loudness = (levels / 100) ** NOISE_EXPONENT * 100
+    ticks = 0
+
+    def level_at(position, shift: float = 0.0):
+        """Levels at the temperatures at `position` (in `RESOLUTION` steps above `lowest`) plus `shift` degrees."""
+        step_index = (position + shift / RESOLUTION).astype(np.intp) if shift else position.astype(np.intp)
+        return lookup[offsets + bins[np.clip(step_index, 0, len(bins) - 1, out=step_index)]]
+
+    for start_temp, power in segments:
+        count = len(power) // per_tick
+        if not count:
+            continue
+        inputs = (power[:count * per_tick].reshape(count, per_tick) @ powers) * gain  # (ticks, levels)
+        x = np.full(n, start_temp - model.ambient)
+        level = level_at((x + model.ambient - lowest) / RESOLUTION)
+        slow_down_at = np.full(n, min_dwell)
+        for i in range(count):
+            now = i * interval
+            np.maximum(temp_max, x, out=temp_max)
+            if i:
+                position = (x + (model.ambient - lowest)) * (1 / RESOLUTION)
+                up = level_at(position, -hysteresis_up)
+                down = level_at(position, hysteresis_down)
+                new = np.where(up > level, up, np.where((down < level) & (slow_down_at <= now), down, level))
+                changed = new != level
+                switches += changed
+                slow_down_at[changed] = now + min_dwell
+                level = new
+            duty_sum += levels[level]
+            noise_sum += loudness[level]
+            x = decay_tick[level] * x + inputs[i, level]
+        ticks += count
+    if not ticks:
+        raise TuneError(f"The trace is shorter than a check interval ({interval:g}s)")
+    hours = ticks * interval / 3600
+    return Stats(duty_sum / ticks, noise_sum / ticks, switches / hours, temp_max + model.ambient)
+
+
+def costs(stats: Stats, noise_weight: float = NOISE_WEIGHT, switch_weight: float = SWITCH_WEIGHT) -> np.ndarray:
+    return stats.duty_avg + noise_weight * stats.noise + switch_weight * stats.switches_per_hour
+
+
+def tune(traces: Iterable[Trace], max_temp: float = 75.0, model: Model = Model(), interval: float = 10.0,
+         references: Mapping[str, Mapping[float, int]] = None, noise_weight: float = NOISE_WEIGHT,
+         switch_weight: float = SWITCH_WEIGHT, tables: np.ndarray = None) -> Result:
+    """Find the table with the lowest cost that keeps the temperature at or below `max_temp` on all `traces`.
+
+    The `references` (e.g. the configured profiles) are simulated along with the candidates for comparison.
+    """
+    segments = [segment for trace in traces for segment in heat_input(trace, model)]
+    tables = candidates() if tables is None else tables
+    references = dict(references or {})
+    reference_tables = [as_table(points, tables.shape[1]) for points in references.values()]
+    stats = simulate(segments, np.concatenate([tables] + [t[None] for t in reference_tables]), model, interval)
+    cost = costs(stats, noise_weight, switch_weight)
+    n = len(tables)
+    feasible = stats.temp_max[:n] <= max_temp
+    if not feasible.any():
+        coolest = float(stats.temp_max[:n].min())
+        raise TuneError(f"No candidate keeps the temperature at or below {max_temp:g}°C on this trace "
+                        f"(at best {coolest:.1f}°C)")
+    best = int(np.argmin(np.where(feasible, cost[:n], np.inf)))
+    points = {}
+    for temp, speed in tables[best]:
+        points.setdefault(float(temp), int(speed))
+    hours = sum(len(power) for _, power in segments) / 3600
+    return Result(points, Stats(*(float(s[best]) for s in stats)), float(cost[best]), n, int(feasible.sum()), hours,
+                  {name: (Stats(*(float(s[n + i]) for s in stats)), float(cost[n + i]))
+                   for i, name in enumerate(references)})
+
+
+def format_stats(stats: Stats, cost: float) -> str:
+    return (f"avg duty {stats.duty_avg:5.1f}%, loudness {stats.noise:5.1f}%, "
+            f"{stats.switches_per_hour:5.1f} switches/h, max {stats.temp_max:.1f}°C, cost {cost:.1f}")
+
+
+def format_section(name: str, result: Result) -> str:
+    """The winner as a `Fan:*` INI section, with the comparison as comments."""
+    lines = [f"# Tuned on {result.hours:.1f}h of samples, best of {result.feasible} feasible tables "
+             f"({result.candidates} candidates):",
+             f"#   {name:<14} {format_stats(result.stats, result.cost)}"]
+    lines += [f"#   {ref:<14} {format_stats(stats, cost)}" for ref, (stats, cost) in result.references.items()]
+    lines.append(f"[{name}]")
+    lines += [f"{temp:g} = {speed}" for temp, speed in sorted(result.points.items())]
+    return '\n'.join(lines)
+
+
+def replay(segments: List[Tuple[float, np.ndarray]], profile: FanCurve, model: Model = Model(),
+           interval: float = 10.0, step: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Scalar reference of `simulate`: temperatures and duties per step with a real `FanCurve`."""
+    temps, duties = [], []
+    per_tick = max(1, int(round(interval / step)))
+    for start_temp, power in segments:
+        temp = start_temp
+        profile.speed = None
+        for j, p in enumerate(power[:len(power) // per_tick * per_tick]):
+            if j % per_tick == 0:
+                profile.update(temp, j * step)
+            duty = profile.speed or 0
+            k = model.k_case + model.k_fan * duty / 100
+            target = model.ambient + p / k
+            temp = target + (temp - target) * math.exp(-k * step / model.capacity)
+            temps.append(temp)
+            duties.append(duty)
+    return np.array(temps), np.array(duties)
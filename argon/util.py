@@ -1,6 +1,7 @@
-import os
 import click
 
+from argon.sensor import open_sensor
+
 
 def info(message):
     click.echo(click.style(f"🛈  {message}", fg='blue'))
@@ -18,11 +19,16 @@ def success(message):
     click.echo(click.style(f"✓  {message}", fg='green'))
 
 
-def get_temp(vcgencmd_path: str = "/opt/vc/bin/vcgencmd", as_str=False):
-    result = os.popen(f"{vcgencmd_path} measure_temp").readline().strip()
-    left = "temp="
-    right = "'C"
-    temp = round(float(result[result.find(left) + len(left):result.find(right)]))
+_sensors = {}
+
+
+def get_temp(sensor_spec: str = 'auto', as_str=False):
+    """Read the temperature (rounded) from the sensor of `sensor_spec`, i.e. the `temp_sensor` setting the daemon uses
+    (see `open_sensor`)."""
+    sensor = _sensors.get(sensor_spec)
+    if sensor is None:
+        sensor = _sensors[sensor_spec] = open_sensor(sensor_spec)
+    temp = round(sensor.read())
     if as_str:
         return f"{temp}°C"
     else:
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Cost and latency of classifying recorded button edge traces, compared to the former polling debouncer."""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from argon.button import ButtonClassifier  # noqa: E402
+from argon.sim import FakeGPIO  # noqa: E402
+
+# The same traces the simulated case sends:
+TRACES = FakeGPIO.PUSHES
+# The former debouncer polled the pin every 10 ms until 1 s had passed since the last high sample:
+LEGACY_POLL_INTERVAL = 0.01
+LEGACY_SETTLE = 1.0
+
+
+def classify(trace):
+    classifier = ButtonClassifier()
+    for stamp, level in trace:
+        classifier.edge(stamp, level)
+    return classifier.expire(classifier.deadline)
+
+
+def main(number=10_000):
+    for name, trace in TRACES.items():
+        assert classify(trace) == name
+        seconds = min(timeit.repeat(lambda: classify(trace), number=number, repeat=3)) / number
+        first, last = trace[0][0], trace[-1][0]
+        latency = ButtonClassifier().settle
+        legacy_wakeups = round((last - first + LEGACY_SETTLE) / LEGACY_POLL_INTERVAL)
+        print(f"{name:>8}: {seconds * 1e6:6.1f} µs CPU/classification, "
+              f"{latency * 1e3:.0f} ms latency after last edge, "
+              f"{len(trace)} edge wakeups + 1 timer wakeup (legacy polling: ~{legacy_wakeups} wakeups)")
+
+
+if __name__ == '__main__':
+    main()
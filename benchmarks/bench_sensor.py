@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Per-sample cost of reading the SoC temperature: legacy `os.popen(vcgencmd)` vs. the sysfs backend.
+
+Runs on any Linux box: without a Pi, a stand-in `vcgencmd` script and a fake thermal zone file are used.
+"""
+import os
+import stat
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from argon.sensor import SysfsSensor, VcgencmdSensor  # noqa: E402
+
+
+def legacy_get_temp(vcgencmd_path):
+    # Verbatim copy of the former `argon.util.get_temp`:
+    result = os.popen(f"{vcgencmd_path} measure_temp").readline().strip()
+    left = "temp="
+    right = "'C"
+    return round(float(result[result.find(left) + len(left):result.find(right)]))
+
+
+def measure(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def main(samples=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        vcgencmd = VcgencmdSensor().name
+        if not os.path.exists(vcgencmd):
+            vcgencmd = os.path.join(tmp, 'vcgencmd')
+            Path(vcgencmd).write_text("#!/bin/sh\necho \"temp=48.3'C\"\n")
+            os.chmod(vcgencmd, stat.S_IRWXU)
+        zone = SysfsSensor.find_zone()
+        if not zone:
+            zone = os.path.join(tmp, 'temp')
+            Path(zone).write_text('48312\n')
+
+        sysfs = SysfsSensor(zone)
+        results = {
+            'legacy popen(vcgencmd)': measure(lambda: legacy_get_temp(vcgencmd), samples),
+            'VcgencmdSensor': measure(VcgencmdSensor(vcgencmd).read, samples),
+            'SysfsSensor': measure(sysfs.read, samples * 100),
+        }
+        sysfs.close()
+
+    print(f"vcgencmd: {vcgencmd}\nthermal zone: {zone}")
+    for name, seconds in results.items():
+        print(f"{name:>24}: {seconds * 1e6:10.1f} µs/sample")
+    return results
+
+
+if __name__ == '__main__':
+    main()
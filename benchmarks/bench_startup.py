@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Startup cost of `argon` subcommands, based on `python -X importtime`.
+
+Reports the total import time and wall-clock time per subcommand and fails (exit code 1) if a subcommand
+exceeds its import time budget or imports a module that simple commands must not need (see startup_budget.json).
+The budgets are meant for x86 CI machines; a Pi Zero/3 is roughly an order of magnitude slower.
+"""
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+BUDGET = Path(__file__).parent / 'startup_budget.json'
+COMMANDS = {
+    '--help': ['--help'],
+    'version': ['version'],
+    'temp': ['temp'],
+    'status': ['status'],
+    'fan': ['fan', '--help'],
+}
+
+
+def importtime(args, config, repeat=3):
+    """Run `argon` with `args` and return (total import seconds, imported modules, wall-clock seconds).
+
+    The fastest of `repeat` runs counts.
+    """
+    return min((_importtime(args, config) for _ in range(repeat)), key=lambda r: r[0])
+
+
+def _importtime(args, config):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'argon.cli', '--config', config] + args,
+                            cwd=str(ROOT), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    wall = time.perf_counter() - started
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        entries.append((len(name) - len(name.lstrip()), int(cumulative), name.strip()))
+    top = min(level for level, _, _ in entries)
+    total = sum(cumulative for level, cumulative, _ in entries if level == top) / 1e6
+    return total, {name.split('.')[0] for _, _, name in entries}, wall
+
+
+def main(budget_file=BUDGET):
+    budget = json.loads(Path(budget_file).read_text())
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        config = str(Path(tmp) / 'config.ini')
+        for name, args in COMMANDS.items():
+            total, modules, wall = importtime(args, config)
+            limit = budget['import_ms'].get(name)
+            forbidden = sorted(modules.intersection(budget['forbidden_modules']))
+            status = 'OK'
+            if limit is not None and total * 1e3 > limit:
+                status = f'OVER BUDGET ({limit} ms)'
+            if forbidden:
+                status = f"IMPORTS {', '.join(forbidden)}"
+            if status != 'OK':
+                failures.append(name)
+            print(f"argon {name:<8} imports: {total * 1e3:6.1f} ms, wall: {wall * 1e3:6.1f} ms  {status}")
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main(*sys.argv[1:]) else 0)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the daemon's hot paths, runnable on any Linux box (hardware is simulated/stubbed).
+
+Reports per-operation latency percentiles, CPU time per simulated hour of daemon operation, wakeups per minute
+and peak RSS as JSON, and compares them against a stored baseline:
+
+    benchmarks/run.py                     # compare against benchmarks/baseline.json, exit code 1 on regressions
+    benchmarks/run.py --update-baseline   # store the current results as the new baseline
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from argon.argon import Argon  # noqa: E402
+from argon.button import ButtonClassifier  # noqa: E402
+from argon.daemon import Daemon  # noqa: E402
+from argon.fan import FanCurve, compile_profile  # noqa: E402
+from argon.logs import FORMAT, JournalHandler, RateLimitFilter, lean_records  # noqa: E402
+from argon.schedule import FixedInterval  # noqa: E402
+from argon.sensor import CachedSensor, SysfsSensor  # noqa: E402
+from argon.sim import Simulation, step_trace  # noqa: E402
+from bench_button import TRACES  # noqa: E402
+from bench_startup import importtime  # noqa: E402
+
+ROOT = Path(__file__).parent.parent
+BASELINE = Path(__file__).parent / 'baseline.json'
+VENDOR = {'55': '10', '60': '55', '65': '100'}
+HOUR = 3600
+
+
+def percentiles(func, number: int) -> dict:
+    """Call `func` `number` times and return latency percentiles in microseconds."""
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(number):
+        started = clock()
+        func()
+        samples.append(clock() - started)
+    samples.sort()
+    return {f'p{p}_us': samples[min(len(samples) - 1, len(samples) * p // 100)] / 1e3 for p in (50, 90, 99)}
+
+
+def bench_sensor(tmp: Path) -> dict:
+    zone = tmp / 'temp'
+    zone.write_text('48312\n')
+    sensor = CachedSensor(SysfsSensor(str(zone)))
+    try:
+        return percentiles(sensor.read, 20_000)
+    finally:
+        sensor.close()
+
+
+def bench_curve() -> dict:
+    curve = FanCurve.from_section(VENDOR)
+    temps = [40 + (i % 300) / 10 for i in range(1000)]
+    state = {'i': 0}
+
+    def update():
+        i = state['i'] = state['i'] + 1
+        curve.update(temps[i % 1000], i)
+    return percentiles(update, 20_000)
+
+
+def bench_button() -> dict:
+    trace = TRACES['double']
+
+    def classify():
+        classifier = ButtonClassifier()
+        for stamp, level in trace:
+            classifier.edge(stamp, level)
+        classifier.expire(classifier.deadline)
+    return percentiles(classify, 20_000)
+
+
+def bench_button_action(tmp: Path) -> dict:
+    """Latency from the button interaction until its action has exited (and has been reaped)."""
+    argon = Argon(tmp / 'config.ini')
+    argon._cfg['Button:Bench'] = {'double': 'true'}
+    result = percentiles(lambda: argon.handle_button('Button:Bench', 'double').result(), 50)
+    argon._executor.close(wait=True)
+    return result
+
+
+def bench_cli_startup() -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        config = str(Path(tmp) / 'config.ini')
+        return {name: round(importtime(args, config)[2] * 1e3, 1) for name, args in
+                (('version_ms', ['version']), ('help_ms', ['--help']))}
+
+
+def bench_poweroff(tmp: Path) -> dict:
+    """Wall-clock time from invoking the shutdown notification until it has exited (i.e. written 0xFF), for the
+    minimal `argon-poweroff` and the former `argon _notify-shutdown` (with the simulated backend)."""
+    device = tmp / 'i2c-1'
+    device.touch()
+    commands = {
+        'argon_poweroff_ms': ['-m', 'argon.poweroff', '--device', str(device)],
+        'notify_shutdown_ms': ['-m', 'argon.cli', '--config', str(tmp / 'config.ini'), '_notify-shutdown'],
+    }
+    env = dict(os.environ, ARGON_BACKEND='sim')
+    results = {}
+    for name, args in commands.items():
+        walls = []
+        for _ in range(5):
+            started = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=str(ROOT), env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            walls.append(time.perf_counter() - started)
+        results[name] = round(min(walls) * 1e3, 1)
+    return results
+
+
+def bench_daemon_hour() -> dict:
+    """One simulated hour of daemon operation with a load burst and a few button pushes."""
+    sim = Simulation(step_trace([(0, 0.1), (HOUR / 4, 1.0), (HOUR / 2, 0.1)]))
+    daemon = Daemon(sim.io, sim.sensor, 'Fan:Vendor', lambda p: (FanCurve.from_section(VENDOR), FixedInterval(10)),
+                    'Button:Bench', button_handler=lambda p, i: None)
+    pushes = range(600, HOUR, 600)
+    for at in pushes:
+        sim.gpio.schedule(sim.loop, at, 'double')
+    started = time.process_time()
+    sim.run(daemon, HOUR)
+    cpu = time.process_time() - started
+    sim.close()
+    return {
+        'cpu_ms_per_hour': round(cpu * 1e3, 2),
+        # Control ticks plus one button deadline timer per push:
+        'wakeups_per_minute': round((daemon.ticks + len(pushes)) / 60, 2),
+        'i2c_writes_per_hour': len(sim.bus.writes),
+    }
+
+
+def bench_feed_forward() -> dict:
+    """Seconds at or above 80°C (soft throttling) in one simulated hour of load bursts in a hot case, with a quiet
+    profile alone and with CPU-load feed-forward, plus the resulting average fan duty."""
+    quiet = {'65': '30', '75': '100'}
+    results = {}
+    for name, section in (('quiet', quiet), ('feed_forward', dict(quiet, load_speed='100'))):
+        sim = Simulation(step_trace([(at + offset, load) for at in range(0, HOUR, 900)
+                                     for offset, load in ((0, 0.05), (300, 1.0), (720, 0.05))]), load_power=11)
+        daemon = Daemon(sim.io, sim.sensor, 'Fan:Quiet',
+                        lambda p: (compile_profile(section, sim.cpu_load), FixedInterval(10)))
+        throttled = [0]
+
+        def sample():
+            throttled[0] += sim.model.read() >= 80
+            sim.loop.call_later(1, sample)
+
+        sim.loop.call_soon(sample)
+        sim.run(daemon, HOUR)
+        duty, last = 0.0, (0.0, 0)
+        for at, speed in sim.bus.fan_writes() + [(HOUR, 0)]:
+            duty += (at - last[0]) * last[1]
+            last = (at, speed)
+        sim.close()
+        results[f'{name}_seconds_at_throttle'] = throttled[0]
+        results[f'{name}_duty_percent'] = round(duty / HOUR, 1)
+    return results
+
+
+def bench_tune() -> dict:
+    """`argon tune` on a day of 1 Hz samples (the simulated SoC with hourly load bursts under `Fan:Vendor`): wall-clock
+    time of all candidates, and per candidate versus replaying a single one with `FanCurve` in plain Python.
+
+    Runs in a forked child, so that the tuner's arrays do not count towards the daemon's `peak_rss_kb`."""
+    import multiprocessing
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        return pool.apply(_bench_tune)
+
+
+def _bench_tune() -> dict:
+    try:
+        import numpy as np
+        from argon import tune
+    except ImportError:
+        return {}
+    sim = Simulation(step_trace([(h * HOUR + offset, load) for h in range(24)
+                                 for offset, load in ((0, 0.1), (1200, 1.0), (2400, 0.3))]))
+    curve = FanCurve.from_section(VENDOR)
+    temps, duties = np.empty(24 * HOUR), np.empty(24 * HOUR)
+    for t in range(24 * HOUR):
+        if t % 10 == 0 and curve.update(sim.model.read(t), t) is not None:
+            sim.model.set_duty(curve.speed / 100, t)
+        temps[t], duties[t] = sim.model.read(t), curve.speed
+    sim.close()
+    trace = tune.Trace(np.arange(24 * HOUR, dtype=float), temps, duties)
+    started = time.perf_counter()
+    result = tune.tune([trace])
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    tune.replay(tune.heat_input(trace), FanCurve.from_section(VENDOR))
+    replayed = time.perf_counter() - started
+    return {
+        'day_seconds': round(elapsed, 2),
+        'candidates': result.candidates,
+        'per_candidate_us': round(elapsed / result.candidates * 1e6, 1),
+        'replay_per_candidate_us': round(replayed * 1e6, 1),
+    }
+
+
+class _Counter:
+    """Stands in for the journal socket and the stderr stream, counting records and bytes."""
+
+    def __init__(self):
+        self.records = self.bytes = 0
+
+    def sendto(self, data, address):
+        self.records += 1
+        self.bytes += len(data)
+
+    def write(self, text):
+        self.records += text.endswith('\n')
+        self.bytes += len(text.encode())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def bench_daemon_logging() -> dict:
+    """One simulated hour with debug logging, to stderr as before (`basicConfig` defaults) and as `setup_daemon`
+    does it: to the journal with rate-limiting and lean records.
+
+    Besides the CPU time of the whole hour, the time spent logging (creating, filtering, formatting and writing
+    records) is measured on its own, as it is small compared to the ticks and lost in their noise.
+    """
+    results = {}
+    defaults = logging.logThreads, logging.logProcesses, logging.logMultiprocessing
+    for name in ('stderr', 'journal'):
+        sim = Simulation(step_trace([(0, 0.1), (HOUR / 4, 1.0), (HOUR / 2, 0.1)]))
+        counter = _Counter()
+        if name == 'journal':
+            handler = JournalHandler()
+            handler._socket.close()
+            handler._socket = counter
+            handler.addFilter(RateLimitFilter(clock=sim.clock))
+            lean_records()
+        else:
+            handler = logging.StreamHandler(counter)
+            handler.setFormatter(logging.Formatter(FORMAT))
+        root = logging.getLogger()
+        # Only ours, the module-level logging functions may have installed a default handler before:
+        saved, root.handlers = root.handlers, [handler]
+        root.setLevel(logging.DEBUG)
+        logged = [0.0]
+
+        def timed(method):
+            def call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    logged[0] += time.perf_counter() - started
+            return call
+
+        root.makeRecord, root.handle = timed(root.makeRecord), timed(root.handle)
+        daemon = Daemon(sim.io, sim.sensor, 'Fan:Vendor',
+                        lambda p: (FanCurve.from_section(VENDOR), FixedInterval(10)))
+        started = time.process_time()
+        sim.run(daemon, HOUR)
+        cpu = time.process_time() - started
+        del root.makeRecord, root.handle
+        root.handlers = saved
+        root.setLevel(logging.WARNING)
+        logging.logThreads, logging.logProcesses, logging.logMultiprocessing = defaults
+        sim.close()
+        results[f'{name}_cpu_ms_per_hour'] = round(cpu * 1e3, 2)
+        results[f'{name}_logging_ms_per_hour'] = round(logged[0] * 1e3, 2)
+        results[f'{name}_records_per_hour'] = counter.records
+        results[f'{name}_kb_per_hour'] = round(counter.bytes / 1024, 1)
+    return results
+
+
+def run() -> dict:
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        results = {
+            'sensor_read': bench_sensor(tmp),
+            'curve_update': bench_curve(),
+            'button_classify': bench_button(),
+            'button_action': bench_button_action(tmp),
+            'cli_startup': bench_cli_startup(),
+            'poweroff': bench_poweroff(tmp),
+            'daemon_hour': bench_daemon_hour(),
+            'feed_forward': bench_feed_forward(),
+            'tune': bench_tune(),
+        }
+    logging.disable(logging.NOTSET)
+    results['daemon_logging'] = bench_daemon_logging()
+    results['peak_rss_kb'] = {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """Return (metric, value, limit) for every metric exceeding its baseline times the tolerance."""
+    tolerance = baseline.get('tolerance', {})
+    regressions = []
+    for group, metrics in baseline['results'].items():
+        for name, reference in metrics.items():
+            value = results.get(group, {}).get(name)
+            if value is None:
+                continue
+            limit = reference * tolerance.get(group, tolerance.get('default', 1.5))
+            if value > limit:
+                regressions.append((f'{group}.{name}', value, limit))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=str(BASELINE))
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = run()
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+    baseline_file = Path(args.baseline)
+    if args.update_baseline:
+        baseline = json.loads(baseline_file.read_text()) if baseline_file.exists() else {}
+        baseline['results'] = results
+        baseline_file.write_text(json.dumps(baseline, indent=2) + '\n')
+        print(f"Updated baseline '{baseline_file}'.", file=sys.stderr)
+        return 0
+    regressions = compare(results, json.loads(baseline_file.read_text()))
+    for metric, value, limit in regressions:
+        print(f"REGRESSION {metric}: {value} > {limit:.2f}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
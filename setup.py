@@ -48,9 +48,10 @@ setup(
     ],
     extras_require={
         'test': ["pytest>=5.0.0,<6.0.0"],
+        'tune': ["numpy"],
     },
     entry_points={
-        'console_scripts': ['argon=argon.cli:cli'],
+        'console_scripts': ['argon=argon.cli:cli', 'argon-poweroff=argon.poweroff:main'],
     },
     # zip_safe=False,
     python_requires=">=3.6",
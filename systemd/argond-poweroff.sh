@@ -1,7 +1,11 @@
 #!/usr/bin/env bash
 
 # Documentation of this mechanism: https://www.freedesktop.org/software/systemd/man/systemd-halt.service.html
+# A running daemon has usually told the case already when it was stopped, repeating it is harmless.
 if [[ "$1" == "halt" || "$1" == "poweroff" ]]; then
-  #sudo systemctl -s SIGUSR1 argond
-  /home/pi/.local/bin/argon _notify-shutdown
+  if [[ -x /home/pi/.local/bin/argon-poweroff ]]; then
+    /home/pi/.local/bin/argon-poweroff
+  else
+    /home/pi/.local/bin/argon _notify-shutdown
+  fi
 fi
@@ -0,0 +1,72 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from argon.action import ActionExecutor, parse
+
+
+class ActionExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.executor = ActionExecutor(workers=2, max_pending=2, timeout=2, is_root=True)
+
+    def tearDown(self):
+        self.executor.close(wait=True)
+        self._tmp.cleanup()
+
+    def test_parse(self):
+        self.assertEqual(('sudo', 'shutdown', '-h', 'now'), parse('sudo shutdown -h now'))
+        self.assertEqual(('echo', 'a b', '$HOME'), parse("echo 'a b' '$HOME'"))
+        self.assertEqual((), parse(''))
+
+    def test_no_shell_and_exit_status(self):
+        marker = self.tmp / 'marker'
+        self.assertEqual(0, self.executor.submit(parse(f'touch {marker}')).result(timeout=2))
+        self.assertTrue(marker.exists())
+        # Shell syntax is passed on literally:
+        self.assertEqual(0, self.executor.submit(('test', '$HOME', '=', '$HOME')).result(timeout=2))
+        self.assertEqual(1, self.executor.submit(('false',)).result(timeout=2))
+        self.assertIsNone(self.executor.submit((str(self.tmp / 'missing'),)).result(timeout=2))
+
+    def test_duplicates_and_bound(self):
+        sleep = ('sleep', '0.3')
+        first = self.executor.submit(sleep)
+        self.assertIsNone(self.executor.submit(sleep))
+        self.assertIsNotNone(self.executor.submit(('sleep', '0.2')))
+        self.assertIsNone(self.executor.submit(('true',)))
+        self.assertEqual(0, first.result(timeout=2))
+        # Done, so it can run again:
+        self.assertEqual(0, self.executor.submit(sleep).result(timeout=2))
+
+    def test_timeout(self):
+        self.executor.timeout = 0.1
+        started = time.monotonic()
+        self.assertIsNone(self.executor.submit(('sleep', '5')).result(timeout=2))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_terminal_fast_path(self):
+        commands = []
+        self.executor._run = lambda argv, command: commands.append(command) or 0
+        self.assertTrue(self.executor.is_terminal(('sudo', 'shutdown', '-h', 'now')))
+        self.assertFalse(self.executor.is_terminal(('sudo', '-u', 'pi', 'echo')))
+        self.assertEqual(0, self.executor.submit(('sudo', 'shutdown', '-h', 'now')).result(timeout=2))
+        self.assertEqual([('shutdown', '-h', 'now')], commands)
+        # The system is going down, nothing else is started:
+        self.assertIsNone(self.executor.submit(('sudo', 'reboot')))
+        self.assertIsNone(self.executor.submit(('true',)))
+
+    def test_terminal_keeps_sudo_if_not_root(self):
+        executor = ActionExecutor(is_root=False)
+        commands = []
+        executor._run = lambda argv, command: commands.append(command) or 1
+        executor.submit(('sudo', 'reboot')).result(timeout=2)
+        self.assertEqual([('sudo', 'reboot')], commands)
+        # It failed, so the system is not going down:
+        self.assertFalse(executor.terminating)
+        executor.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from argon.button import ButtonClassifier
+
+
+def replay(trace, classifier=None):
+    """Replay a recorded trace of (timestamp, level) edges and return the interactions in order."""
+    classifier = classifier or ButtonClassifier()
+    interactions = []
+    for stamp, level in trace:
+        if classifier.deadline is not None and stamp >= classifier.deadline:
+            interactions.append(classifier.expire(classifier.deadline))
+        classifier.edge(stamp, level)
+    if classifier.deadline is not None:
+        interactions.append(classifier.expire(classifier.deadline))
+    return interactions
+
+
+class ButtonClassifierTest(unittest.TestCase):
+    def test_long(self):
+        self.assertEqual(['long'], replay([(0.0, 1), (0.035, 0)]))
+
+    def test_double_narrow_pulse(self):
+        self.assertEqual(['double'], replay([(0.0, 1), (0.02, 0)]))
+
+    def test_double_two_pulses(self):
+        self.assertEqual(['double'], replay([(0.0, 1), (0.015, 0), (0.2, 1), (0.215, 0)]))
+
+    def test_many(self):
+        trace = [(t + d, level) for t in (0.0, 0.3, 0.6, 0.9) for d, level in ((0.0, 1), (0.015, 0))]
+        self.assertEqual(['many'], replay(trace))
+
+    def test_glitch_ignored(self):
+        self.assertEqual([None], replay([(0.0, 1), (0.001, 0)]))
+
+    def test_bounce_and_still_high(self):
+        # Duplicate rising edge (bounce) and a pulse still high when the deadline passes:
+        self.assertEqual(['long'], replay([(0.0, 1), (0.002, 1)]))
+
+    def test_separate_sequences(self):
+        trace = [(0.0, 1), (0.035, 0), (5.0, 1), (5.015, 0), (5.2, 1), (5.215, 0)]
+        self.assertEqual(['long', 'double'], replay(trace))
+
+    def test_not_expired_before_deadline(self):
+        classifier = ButtonClassifier(settle=1.0)
+        deadline = classifier.edge(10.0, 1)
+        self.assertEqual(11.0, deadline)
+        self.assertIsNone(classifier.expire(10.5))
+        self.assertEqual('long', classifier.expire(11.0))
+        self.assertIsNone(classifier.deadline)
+
+    def test_ring_buffer_wraps(self):
+        classifier = ButtonClassifier(capacity=4)
+        for i in range(10):
+            classifier.edge(i * 0.1, i % 2 == 0)
+        self.assertEqual(4, len(list(classifier.edges())))
+        self.assertEqual('double', classifier.expire(10.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import argon.config as config
+from argon.argon import Argon
+from argon.config import ConfigError, ConfigWatcher
+from argon.schedule import AdaptiveInterval
+
+CONFIG = """
+[Settings]
+fan_profile = Fan:Vendor
+button_profile = Button:Vendor
+temp_check_mode = adaptive
+power_mode_always_on = yes
+
+[Fan:Vendor]
+55 = 10
+60 = 55
+65 = 100
+
+[Fan:Silent]
+60 = 80
+hysteresis_down = 5
+
+[Button:Vendor]
+long = sudo shutdown -h now
+double = sudo reboot
+"""
+
+
+class FakeDaemon:
+    def __init__(self, fan_profile):
+        self.fan_profile = fan_profile
+        self.button_profile = 'Button:Vendor'
+
+    def switch_profile(self, fan_profile):
+        self.fan_profile = fan_profile
+
+
+class FakeIO:
+    def __init__(self):
+        self.power_modes = []
+
+    def set_power_mode(self, always_on):
+        self.power_modes.append(always_on)
+
+
+class ConfigTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / 'config.ini'
+        self.path.write_text(CONFIG)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_load(self):
+        cfg = config.load(self.path)
+        self.assertTrue(cfg.settings.power_mode_always_on)
+        self.assertEqual(10.0, cfg.settings.temp_check_interval)
+        self.assertEqual(['Fan:Vendor', 'Fan:Silent'], list(cfg.fan_profiles))
+        self.assertEqual(5.0, cfg.curve('Fan:Silent').hysteresis_down)
+        self.assertIsInstance(cfg.scheduler(cfg.curve('Fan:Vendor')), AdaptiveInterval)
+        self.assertEqual(('sudo', 'reboot'), cfg.action('Button:Vendor', 'double'))
+        self.assertEqual((), cfg.action('Button:Vendor', 'many'))
+        self.assertEqual(cfg, config.load(self.path))
+        with self.assertRaises(TypeError):
+            cfg.fan_profiles['Fan:Vendor']['55'] = '0'
+        with self.assertRaises(ConfigError):
+            cfg.curve('Fan:Missing')
+
+    def test_sensors(self):
+        self.path.write_text(CONFIG + "\n[Sensor:nvme]\nsource = hwmon:nvme\ninterval = 30\nweight = 0\n"
+                                      "fan_profile = Fan:Silent\n")
+        cfg = config.load(self.path)
+        self.assertEqual('max', cfg.settings.temp_combine)
+        self.assertEqual(config.SensorSpec('hwmon:nvme', 30.0, 0.0, 'Fan:Silent'), cfg.sensors['nvme'])
+        for section in ("[Sensor:nvme]\nsource = usb:nvme", "[Sensor:nvme]\ninterval = 30",
+                        "[Sensor:nvme]\nsource = hwmon:nvme\nfan_profile = Fan:Missing",
+                        "[Sensor:nvme]\nsource = hwmon:nvme\nweight = -1", "[Sensor:soc]\nsource = auto"):
+            with self.subTest(section):
+                self.path.write_text(CONFIG + '\n' + section + '\n')
+                with self.assertRaises(ConfigError):
+                    config.load(self.path)
+
+    def test_invalid(self):
+        for old, new in (('55 = 10', '55 = 110'),
+                         ('temp_check_mode = adaptive', 'temp_check_mode = sometimes'),
+                         ('power_mode_always_on = yes', 'power_mode_always_on = maybe'),
+                         ('fan_profile = Fan:Vendor', 'fan_profile = Fan:Missing'),
+                         ('double = sudo reboot', 'triple = sudo reboot'),
+                         ('double = sudo reboot', 'double = echo "unbalanced'),
+                         ('[Settings]', '[Settings]\ntemp_check_interval = -1'),
+                         ('[Settings]', 'garbage')):
+            with self.subTest(new):
+                self.path.write_text(CONFIG.replace(old, new))
+                with self.assertRaises(ConfigError):
+                    config.load(self.path)
+
+    def test_reload(self):
+        argon = Argon(self.path)
+        argon._lazy_io = io = FakeIO()
+        daemon = FakeDaemon('Fan:Silent')
+        old = argon.config
+
+        self.path.write_text(CONFIG.replace('55 = 10', '55 = 110'))
+        argon._reload_config(daemon)
+        self.assertIs(old, argon.config)
+
+        self.path.write_text(CONFIG.replace('60 = 80', '60 = 90'))
+        argon._reload_config(daemon)
+        self.assertEqual('90', argon.config.fan_profiles['Fan:Silent']['60'])
+        self.assertEqual('Fan:Silent', daemon.fan_profile)
+        self.assertEqual([], io.power_modes)
+
+        self.path.write_text(CONFIG.replace('fan_profile = Fan:Vendor', 'fan_profile = Fan:Silent')
+                             .replace('power_mode_always_on = yes', 'power_mode_always_on = no')
+                             .replace('[Fan:Vendor]', '[Fan:Other]'))
+        daemon.fan_profile = 'Fan:Vendor'
+        argon._reload_config(daemon)
+        self.assertEqual('Fan:Silent', daemon.fan_profile)
+        self.assertEqual([False], io.power_modes)
+
+
+class ConfigWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / 'config.ini'
+        self.path.write_text(CONFIG)
+        self.loop = asyncio.new_event_loop()
+        self.changes = 0
+
+    def tearDown(self):
+        self.loop.close()
+        self._tmp.cleanup()
+
+    def changed(self):
+        self.changes += 1
+
+    def watch(self, watcher):
+        watcher.start(self.loop)
+        # An editor writing a temporary file and renaming it, plus an unrelated file:
+        tmp = self.path.with_name('.config.ini.tmp')
+        self.loop.call_later(0.05, tmp.write_text, CONFIG + '\n')
+        self.loop.call_later(0.06, os.replace, tmp, self.path)
+        self.loop.call_later(0.07, self.path.with_name('other').write_text, '')
+        self.loop.call_later(0.5, self.loop.stop)
+        self.loop.run_forever()
+        watcher.close()
+
+    def test_inotify(self):
+        watcher = ConfigWatcher(self.path, self.changed, delay=0.1)
+        self.watch(watcher)
+        self.assertEqual(1, self.changes)
+
+    def test_polling(self):
+        watcher = ConfigWatcher(self.path, self.changed, poll_interval=0.2)
+
+        def unavailable(directory):
+            raise OSError("unavailable")
+        watcher._inotify = unavailable
+        self.watch(watcher)
+        self.assertEqual(1, self.changes)
+
+
+if __name__ == '__main__':
+    unittest.main()
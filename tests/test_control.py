@@ -0,0 +1,102 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from argon.control import ControlClient, ControlError, DaemonUnavailable
+from argon.daemon import Daemon
+from argon.fan import FanCurve
+from argon.schedule import FixedInterval
+from tests.test_daemon import FakeIO, FakeSensor, VENDOR
+
+PROFILES = {'Fan:Vendor': VENDOR, 'Fan:On': {'0': '100'}}
+
+
+def load_profile(profile):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown fan profile '{profile}'")
+    return FanCurve.from_section(PROFILES[profile]), FixedInterval(3600)
+
+
+class ControlTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self._tmp.name) / 'control.sock')
+        self.io = FakeIO()
+        self.daemon = Daemon(self.io, FakeSensor(50.0), 'Fan:Vendor', load_profile, control_socket=self.path)
+        self.client = ControlClient(self.path)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self._tmp.cleanup()
+
+    def with_daemon(self, func):
+        """Run `func` in a separate thread while the daemon is running."""
+        result = {}
+
+        def run():
+            try:
+                result['value'] = func()
+            except Exception as e:
+                result['error'] = e
+            finally:
+                self.loop.call_soon_threadsafe(self.daemon.stop)
+
+        self.loop.call_later(0.05, threading.Thread(target=run).start)
+        self.loop.call_later(5, self.loop.stop)
+        self.daemon.run(self.loop)
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
+    def test_status(self):
+        status = self.with_daemon(lambda: self.client.request('status'))
+        self.assertEqual(50.0, status['temp'])
+        self.assertEqual(0, status['fan_speed'])
+        self.assertEqual('Fan:Vendor', status['fan_profile'])
+        self.assertEqual(1, status['ticks'])
+        self.assertFalse(Path(self.path).exists())
+
+    def test_override_and_clear(self):
+        def override():
+            self.client.request('fan', speed=80, duration=60)
+            status = self.client.request('status')
+            self.client.request('fan', speed=None)
+            return status
+
+        status = self.with_daemon(override)
+        self.assertEqual(80, status['override']['speed'])
+        self.assertEqual([0, 80, 0], self.io.writes)
+
+    def test_switch_profile(self):
+        self.assertEqual('Fan:On', self.with_daemon(lambda: (self.client.request('profile', fan='Fan:On'),
+                                                             self.client.request('status'))[1]['fan_profile']))
+        self.assertEqual([0, 100], self.io.writes)
+
+    def test_report(self):
+        report = self.with_daemon(lambda: self.client.request('report'))
+        self.assertIsNone(report['throttle_source'])
+        self.assertEqual(['Fan:Vendor'], list(report['profiles']))
+        self.assertEqual(50.0, report['profiles']['Fan:Vendor']['temp_max'])
+
+    def test_errors(self):
+        with self.assertRaisesRegex(ControlError, 'Unknown fan profile'):
+            self.with_daemon(lambda: self.client.request('profile', fan='Fan:Nope'))
+        with self.assertRaisesRegex(ControlError, 'range'):
+            self.with_daemon(lambda: self.client.request('fan', speed=101))
+        for duration in (float('nan'), float('inf'), -1):
+            with self.subTest(duration=duration), self.assertRaisesRegex(ControlError, 'finite'):
+                self.with_daemon(lambda: self.client.request('fan', speed=50, duration=duration))
+        self.assertIsNone(self.daemon.override)
+        with self.assertRaisesRegex(ControlError, 'Invalid request'):
+            self.with_daemon(lambda: self.client.request('nope'))
+
+    def test_daemon_unavailable(self):
+        with self.assertRaises(DaemonUnavailable):
+            self.client.request('status')
+
+
+if __name__ == '__main__':
+    unittest.main()
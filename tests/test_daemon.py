@@ -0,0 +1,144 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+import unittest
+
+from argon.daemon import Daemon
+from argon.fan import FanCurve
+from argon.schedule import FixedInterval
+from argon.sensor import AggregateSensor, Sensor
+
+VENDOR = {'55': '10', '60': '55', '65': '100'}
+
+
+class FakeIO:
+    def __init__(self):
+        self.writes = []
+        self.edge_callback = None
+
+    def set_fan_speed(self, speed):
+        self.writes.append(speed)
+        return True
+
+    def notify_shutdown(self):
+        self.writes.append(0xFF)
+
+    def invalidate(self):
+        self.writes.append(None)
+
+    def register_edge_callback(self, callback):
+        self.edge_callback = callback
+
+    def i2c_stats(self):
+        return {0x1a: {'writes': len(self.writes), 'suppressed': 0, 'errors': 0, 'failures': 0}}
+
+
+class FakeSensor(Sensor):
+    def __init__(self, temp):
+        self.temp = temp
+
+    def read(self):
+        return self.temp
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.io = FakeIO()
+        self.sensor = FakeSensor(62.0)
+        self.interactions = []
+        self.profiles = {'Fan:Vendor': VENDOR}
+        self.daemon = Daemon(self.io, self.sensor, 'Fan:Vendor', self.load_profile, 'Button:Vendor',
+                             button_handler=lambda profile, interaction: self.interactions.append(interaction),
+                             button_settle_time=0.05)
+        self.loop = asyncio.new_event_loop()
+
+    def load_profile(self, profile):
+        # A long interval, so any test relying on it to exit would time out:
+        return FanCurve.from_section(self.profiles[profile]), FixedInterval(3600)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_daemon(self, *actions):
+        """Run the daemon, performing (delay, action) pairs; returns seconds from the last action until exit."""
+        acted = []
+        for delay, action in actions:
+            self.loop.call_later(delay, lambda a=action: (acted.append(time.monotonic()), a()))
+        self.loop.call_later(5, self.loop.stop)
+        self.daemon.run(self.loop)
+        return time.monotonic() - acted[-1]
+
+    def test_signal_to_exit_latency(self):
+        for signum in (signal.SIGTERM, signal.SIGUSR2):
+            with self.subTest(signal=signum.name):
+                latency = self.run_daemon((0.05, lambda: os.kill(os.getpid(), signum)))
+                self.assertLess(latency, 0.1)
+        self.assertEqual([55, 0xFF], self.io.writes)
+
+    def test_sigterm_while_powering_off(self):
+        self.daemon = Daemon(self.io, self.sensor, 'Fan:Vendor', self.load_profile, powering_off=lambda: True)
+        self.run_daemon((0.05, lambda: os.kill(os.getpid(), signal.SIGTERM)))
+        self.assertEqual([55, 0xFF], self.io.writes)
+
+    def test_exit_despite_failing_bus(self):
+        def notify_shutdown():
+            raise OSError(121, 'Remote I/O error')
+
+        self.io.notify_shutdown = notify_shutdown
+        for signum in (signal.SIGTERM, signal.SIGUSR2):
+            with self.subTest(signal=signum.name):
+                self.daemon = Daemon(self.io, self.sensor, 'Fan:Vendor', self.load_profile, powering_off=lambda: True)
+                with self.assertLogs(level='ERROR') as logs:
+                    latency = self.run_daemon((0.05, lambda: os.kill(os.getpid(), signum)))
+                self.assertLess(latency, 0.1)
+                self.assertIn("Unable to tell the case to cut the power", logs.output[0])
+
+    def test_keeps_ticking_after_unexpected_error(self):
+        class BrokenSensor(FakeSensor):
+            def read(self):
+                if not reads:
+                    reads.append(1)
+                    raise ZeroDivisionError('float division by zero')
+                return super().read()
+
+        reads = []
+        self.daemon = Daemon(self.io, BrokenSensor(62.0), 'Fan:Vendor',
+                             lambda profile: (FanCurve.from_section(VENDOR), FixedInterval(0.05)))
+        with self.assertLogs(level='ERROR') as logs:
+            self.run_daemon((0.2, self.daemon.stop))
+        self.assertIn("ZeroDivisionError", logs.output[0])
+        self.assertEqual([55], self.io.writes)
+        self.assertGreater(self.daemon.ticks, 2)
+
+    def test_reload_applies_immediately(self):
+        self.profiles['Fan:Vendor'] = {'0': '100'}
+        self.run_daemon((0.05, lambda: os.kill(os.getpid(), signal.SIGHUP)), (0.1, self.daemon.stop))
+        self.assertEqual([55, 100], self.io.writes)
+        self.assertEqual(2, self.daemon.ticks)
+
+    def test_button_edges_from_other_thread(self):
+        def push():
+            now = time.monotonic()
+            self.io.edge_callback(1, now)
+            self.io.edge_callback(0, now + 0.04)
+
+        self.run_daemon((0.01, lambda: threading.Thread(target=push).start()), (0.2, self.daemon.stop))
+        self.assertEqual(['long'], self.interactions)
+
+    def test_sensor_profiles(self):
+        self.profiles['Fan:NVMe'] = {'50': '30', '70': '100'}
+        nvme = FakeSensor(72.0)
+        sensor = AggregateSensor({'soc': self.sensor, 'nvme': nvme}, {'nvme': 0})
+        self.daemon = Daemon(self.io, sensor, 'Fan:Vendor', self.load_profile, sensor_profiles={'nvme': 'Fan:NVMe'})
+        # The hot drive wins, and its temperature does not count for the SoC's profile (weight 0):
+        self.run_daemon((0.05, self.daemon.reload), (0.1, lambda: setattr(nvme, 'temp', 55.0)),
+                        (0.15, self.daemon.wakeup), (0.2, self.daemon.stop))
+        self.assertEqual(62.0, self.daemon.temp)
+        self.assertEqual([100, 55], self.io.writes)
+        self.assertEqual({'soc': 62.0, 'nvme': 55.0}, self.daemon.status()['sensors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
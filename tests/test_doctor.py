@@ -0,0 +1,97 @@
+import contextlib
+import json
+import threading
+import time
+import unittest
+
+from argon import doctor
+from argon.doctor import Check, CheckSkipped
+from argon.sim import Simulation
+
+
+def skipped():
+    raise CheckSkipped("not now")
+
+
+class DoctorTest(unittest.TestCase):
+    def test_concurrent_with_timeouts(self):
+        checks = [
+            Check('slow', lambda: time.sleep(0.2) or "done", 1),
+            Check('hanging', lambda: time.sleep(10), 0.1),
+            Check('failing', doctor.failing(OSError("no bus")), 1),
+            Check('skipped', skipped, 1),
+        ]
+        started = time.monotonic()
+        results = doctor.run(checks)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual([('slow', 'ok', 'done'), ('hanging', 'timeout', 'No result after 0.1s'),
+                          ('failing', 'fail', 'no bus'), ('skipped', 'skipped', 'not now')],
+                         [result[:3] for result in results])
+        output, ok = doctor.report(results)
+        self.assertFalse(ok)
+        self.assertEqual(['slow', 'hanging', 'failing', 'skipped'],
+                         [check['name'] for check in json.loads(output)['checks']])
+        self.assertTrue(doctor.report(results[:1] + results[3:])[1])
+
+    def test_group_runs_sequentially(self):
+        spans = []
+
+        def bus_check():
+            started = time.monotonic()
+            time.sleep(0.1)
+            spans.append((started, time.monotonic()))
+            return "done"
+
+        checks = [Check('i2c', bus_check, 1, group='bus'), Check('fan', bus_check, 0.05, group='bus'),
+                  Check('other', lambda: time.sleep(0.1) or "done", 1)]
+        started = time.monotonic()
+        results = doctor.run(checks)
+        self.assertLess(time.monotonic() - started, 0.5)
+        # The second check's timeout adds up with the first one's:
+        self.assertEqual(['ok', 'ok', 'ok'], [result.status for result in results])
+        self.assertLessEqual(spans[0][1], spans[1][0])
+
+    def test_hardware_checks(self):
+        sim = Simulation(virtual_time=False)
+        self.assertEqual("Device 0x1a acknowledged", doctor.check_i2c(sim.io))
+        doctor.check_fan(sim.io, lambda: False, step_time=0)
+        self.assertEqual([50, 100, 0], [speed for _, speed in sim.bus.fan_writes()])
+        leases = []
+
+        class FakeLease:
+            @contextlib.contextmanager
+            def hold(self, duration):
+                leases.append(duration)
+                yield self
+
+        with self.assertRaises(CheckSkipped):
+            doctor.check_fan(sim.io, lambda: True, lease=FakeLease())
+        # No lease keeps a running daemon from the fan for nothing:
+        self.assertEqual([], leases)
+        doctor.check_fan(sim.io, lambda: False, step_time=0, lease=FakeLease())
+        self.assertEqual([5], leases)
+        sim.bus.addr = 0x1b
+        with self.assertRaises(OSError):
+            doctor.check_i2c(sim.io)
+        sim.close()
+
+    def test_button_capture(self):
+        sim = Simulation(virtual_time=False)
+
+        def push():
+            time.sleep(0.05)
+            for level in (1, 0, 1, 0):
+                sim.gpio.edge(sim.io.BUTTON_PIN, level)
+                time.sleep(0.01)
+
+        threading.Thread(target=push).start()
+        started = time.monotonic()
+        self.assertIn("Button signal with", doctor.check_button(sim.io, 5, settle=0.1))
+        self.assertLess(time.monotonic() - started, 1)
+        with self.assertRaises(RuntimeError):
+            doctor.check_button(sim.io, 0.05)
+        sim.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import math
+import unittest
+
+from argon.fan import FanCurve, FeedForward, PIDController, compile_profile, replay
+
+VENDOR = {'55': '10', '60': '55', '65': '100'}
+
+
+class FanCurveTest(unittest.TestCase):
+    def test_lookup_steps(self):
+        curve = FanCurve.from_section(VENDOR)
+        self.assertEqual([0, 10, 10, 55, 100, 100],
+                         [curve.lookup(t) for t in (54.9, 55, 59.9, 60, 65, 90)])
+
+    def test_lookup_interpolated(self):
+        curve = FanCurve.from_section(dict(VENDOR, interpolate='yes'))
+        self.assertEqual([0, 10, 19, 55, 100], [curve.lookup(t) for t in (50, 55, 56, 60, 70)])
+
+    def test_single_point(self):
+        self.assertEqual(100, FanCurve.from_section({'0': '100'}).lookup(20))
+        self.assertEqual(0, FanCurve.from_section({'0': '0'}).lookup(20))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            FanCurve.from_section({'55': '110'})
+        with self.assertRaises(ValueError):
+            FanCurve.from_section({'hot': '100'})
+        with self.assertRaises(ValueError):
+            FanCurve.from_section({})
+
+    def test_no_flapping_around_threshold(self):
+        curve = FanCurve.from_section(dict(VENDOR, min_dwell='0'))
+        writes = [s for i, t in enumerate([54, 55, 54.5, 55.2, 54.8, 55.1, 54.2]) for s in [curve.update(t, i)]
+                  if s is not None]
+        self.assertEqual([0, 10], writes)
+        self.assertEqual(None, curve.update(52.1, 10))
+        self.assertEqual(0, curve.update(51.9, 11))
+
+    def test_speeds_up_immediately(self):
+        curve = FanCurve.from_section(VENDOR)
+        self.assertEqual(0, curve.update(40, 0))
+        self.assertEqual(100, curve.update(70, 1))
+
+    def test_hysteresis_up(self):
+        curve = FanCurve.from_section(dict(VENDOR, hysteresis_up='1'))
+        curve.update(50, 0)
+        self.assertIsNone(curve.update(55.5, 1))
+        self.assertEqual(10, curve.update(56, 2))
+
+    def test_min_dwell(self):
+        curve = FanCurve.from_section(dict(VENDOR, min_dwell='30'))
+        self.assertEqual(100, curve.update(70, 0))
+        self.assertIsNone(curve.update(40, 10))
+        self.assertEqual(0, curve.update(40, 30))
+
+
+class PIDControllerTest(unittest.TestCase):
+    def test_from_section(self):
+        pid = compile_profile({'target': '60', 'kp': '5', 'min_speed': '20'})
+        self.assertIsInstance(pid, PIDController)
+        self.assertEqual((60.0, 5.0, 20, 75.0), (pid.target, pid.kp, pid.min_speed, pid.max_temp))
+        self.assertIsInstance(compile_profile(VENDOR), FanCurve)
+        for section in ({'target': '60', '55': '10'}, {'target': '60', 'max_speed': '120'},
+                        {'target': '60', 'kp': '-1'}, {'target': '60', 'max_temp': '50'}):
+            with self.subTest(section):
+                with self.assertRaises(ValueError):
+                    compile_profile(section)
+
+    def test_bounds_and_max_temp(self):
+        pid = PIDController(60, max_speed=80, max_temp=90)
+        self.assertEqual(0, pid.update(50, 0))
+        self.assertEqual(80, pid.update(75, 10))
+        self.assertEqual(80, pid.max_speed)
+        pid = PIDController(60, kp=1, ki=0, kd=0, max_temp=70)
+        self.assertEqual(5, pid.update(65, 0))
+        self.assertEqual(100, pid.update(70, 10))
+
+    def test_min_speed(self):
+        pid = PIDController(60, kp=4, ki=0, kd=0, min_speed=30, deadband=0)
+        # Too slow to start the fan, then it starts at once and keeps running down to half the minimum speed:
+        self.assertEqual([0, None, 40, 30, None, 0],
+                         [pid.update(t, i * 10) for i, t in enumerate((55, 66, 70, 66, 64, 63))])
+
+    def test_anti_windup(self):
+        pid = PIDController(60, kp=2, ki=0.1, kd=0)
+        # Saturated at full speed for an hour, the integral does not keep growing...
+        for i in range(360):
+            pid.update(80, i * 10)
+        self.assertEqual(100, pid.speed)
+        self.assertLess(pid.integral, 100 / pid.ki + 20 * 10)
+        # ...so the fan slows down as soon as the temperature dropped below the target (instead of hours later):
+        speeds = [pid.update(58, 3600 + i * 10) for i in range(1, 100)]
+        self.assertLess(speeds[0], 100)
+        self.assertIn(0, speeds)
+
+    def test_derivative_filter(self):
+        noisy = [(i * 5, 60 + (0.5 if i % 2 else -0.5)) for i in range(40)]
+        filtered = replay(PIDController(55, kp=0, ki=0, kd=60, derivative_filter=60, deadband=0), noisy)
+        unfiltered = replay(PIDController(55, kp=0, ki=0, kd=60, derivative_filter=0, deadband=0), noisy)
+        self.assertLess(max(s for _, _, s in filtered[10:]), 10)
+        self.assertGreater(max(s for _, _, s in unfiltered[10:]), 10)
+
+    def test_replay_is_deterministic(self):
+        trace = [(i * 10.0, 50 + 20 * math.sin(i / 20)) for i in range(500)]
+        first = replay(PIDController(60), trace)
+        self.assertEqual(first, replay(PIDController(60), trace))
+        self.assertEqual(500, len(first))
+        self.assertTrue(all(0 <= s <= 100 for _, _, s in first))
+
+
+class FeedForwardTest(unittest.TestCase):
+    def test_from_section(self):
+        loads = []
+        profile = compile_profile(dict(VENDOR, load_speed='60', load_threshold='0.4'), lambda: loads.pop(0))
+        self.assertIsInstance(profile, FeedForward)
+        self.assertIsInstance(profile.profile, FanCurve)
+        self.assertEqual((60, 0.4, 10.0), (profile.load_speed, profile.load_threshold, profile.load_window))
+        self.assertIsInstance(compile_profile({'target': '60', 'load_speed': '50'}).profile, PIDController)
+        self.assertIsInstance(compile_profile(dict(VENDOR, load_speed='0')), FanCurve)
+        for section in ({'load_speed': '120', **VENDOR}, {'load_speed': '50', 'load_threshold': '1', **VENDOR},
+                        {'load_speed': '50', 'load_interval': '5', **VENDOR}):
+            with self.subTest(section):
+                with self.assertRaises(ValueError):
+                    compile_profile(section)
+
+    def test_sustained_load_raises_speed_first(self):
+        loads = iter([0.1, 1.0, 1.0, 1.0, 1.0, 1.0, 0.1, 0.1])
+        profile = FeedForward(FanCurve.from_section(VENDOR), load_speed=100, load_window=10, load=lambda: next(loads))
+        # Still cool, but the load keeps up, until it is gone:
+        speeds = [profile.update(45, i * 10) for i in range(7)]
+        self.assertEqual([0, 10, 55, 75, 85, 90, 5], speeds)
+        # The curve wins if it asks for more:
+        self.assertEqual(100, profile.update(70, 70))
+        profile.speed = None
+        self.assertIsNone(profile.profile.speed)
+        self.assertIn('FeedForward', repr(profile))
+
+
+if __name__ == '__main__':
+    unittest.main()
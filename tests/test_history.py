@@ -0,0 +1,88 @@
+import math
+import tempfile
+import unittest
+from pathlib import Path
+
+from argon.daemon import Daemon
+from argon.history import FLAG_BUTTON, FLAG_SENSOR_ERROR, FLAG_STARTED, History, HistoryError, format_flags
+from argon.fan import FanCurve
+from argon.schedule import FixedInterval
+from argon.sim import Simulation
+from tests.test_daemon import VENDOR
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self._tmp.name) / 'history')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_ring_buffer(self):
+        history = History.open(self.path, capacity=4)
+        self.assertEqual(History.file_size(4), Path(self.path).stat().st_size)
+        for i in range(6):
+            history.append(40.0 + i, 10 * i, FLAG_BUTTON if i == 5 else 0, timestamp=float(i))
+        self.assertEqual(4, len(history))
+        self.assertEqual([(2, 4), (0, 2)], list(history.ranges()))
+        self.assertEqual([(2.0, 42.0, 20, 0), (3.0, 43.0, 30, 0), (4.0, 44.0, 40, 0), (5.0, 45.0, 50, FLAG_BUTTON)],
+                         list(history.samples()))
+        self.assertEqual([4.0, 5.0], [stamp for stamp, *_ in history.samples(since=4.0)])
+        history.close()
+        self.assertEqual(History.file_size(4), Path(self.path).stat().st_size)
+
+    def test_persistence(self):
+        history = History.open(self.path, capacity=8)
+        history.append(50.0, 10, FLAG_STARTED, timestamp=1.0)
+        history.append(None, None, FLAG_SENSOR_ERROR, timestamp=2.0)
+        history.close()
+
+        history = History.open(self.path, capacity=8)
+        history.append(51.5, 55, timestamp=3.0)
+        history.close()
+
+        history = History.open_readonly(self.path)
+        (_, temp, duty, flags), = [s for s in history.samples() if s[0] == 2.0]
+        self.assertTrue(math.isnan(temp))
+        self.assertIsNone(duty)
+        self.assertEqual('sensor_error', format_flags(flags))
+        summary = history.summary()
+        self.assertEqual(3, summary['samples'])
+        self.assertEqual((50.0, 51.5, 3.0), (summary['temp_min'], summary['temp_max'], summary['temp_max_at']))
+        self.assertEqual(32.5, summary['duty_avg'])
+        self.assertEqual(1, summary['events']['started'])
+        history.close()
+
+    def test_capacity_change(self):
+        History.open(self.path, capacity=8).close()
+        history = History.open(self.path, capacity=16)
+        self.assertEqual(0, len(history))
+        self.assertEqual(16, history.capacity)
+        history.close()
+
+    def test_invalid_file(self):
+        Path(self.path).write_bytes(b'not a history')
+        with self.assertRaises(HistoryError):
+            History.open_readonly(self.path)
+        with self.assertRaises(HistoryError):
+            History.open_readonly(self.path + '.missing')
+
+    def test_daemon(self):
+        sim = Simulation()
+        history = History.open(self.path, capacity=64, clock=sim.clock)
+        daemon = Daemon(sim.io, sim.sensor, 'Fan:Vendor', lambda p: (FanCurve.from_section(VENDOR), FixedInterval(10)),
+                        history=history)
+        sim.sensor.failures = 1
+        sim.run(daemon, 100)
+        sim.close()
+        samples = list(history.samples())
+        self.assertEqual(daemon.ticks, len(samples))
+        self.assertEqual((0.0, FLAG_STARTED | FLAG_SENSOR_ERROR), (samples[0][0], samples[0][3]))
+        self.assertEqual((10.0, round(sim.model.read(10.0), 2)), (samples[1][0], round(samples[1][1], 2)))
+        self.assertEqual(daemon.fan_speed, samples[-1][2])
+        history.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
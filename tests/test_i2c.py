@@ -0,0 +1,62 @@
+import errno
+import unittest
+
+from argon.i2c import Register
+
+
+class FlakyBus:
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.writes = []
+
+    def write_byte_data(self, addr, reg, value):
+        if self.failures:
+            raise OSError(self.failures.pop(0), "flaky")
+        self.writes.append((addr, reg, value))
+
+
+class RegisterTest(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+
+    def register(self, bus):
+        return Register(bus, 0x1a, retries=3, backoff=0.005, max_backoff=0.015, sleep=self.sleeps.append)
+
+    def test_suppresses_redundant_writes(self):
+        bus = FlakyBus()
+        register = self.register(bus)
+        self.assertTrue(register.write(10))
+        self.assertFalse(register.write(10))
+        self.assertTrue(register.write(10, force=True))
+        self.assertTrue(register.write(55))
+        self.assertEqual([10, 10, 55], [value for _, _, value in bus.writes])
+        self.assertEqual(3, register.stats['writes'])
+        self.assertEqual(1, register.stats['suppressed'])
+
+    def test_retries_transient_errors_with_backoff(self):
+        bus = FlakyBus([errno.EREMOTEIO, errno.EREMOTEIO, errno.EIO])
+        register = self.register(bus)
+        self.assertTrue(register.write(100))
+        self.assertEqual([(0x1a, 0, 100)], bus.writes)
+        self.assertEqual([0.005, 0.01, 0.015], self.sleeps)
+        self.assertEqual(3, register.stats['errors'])
+        self.assertEqual(0, register.stats['failures'])
+
+    def test_gives_up(self):
+        register = self.register(FlakyBus([errno.EREMOTEIO] * 4))
+        register.value = 10
+        with self.assertRaises(OSError):
+            register.write(100)
+        self.assertIsNone(register.value)
+        self.assertEqual(1, register.stats['failures'])
+        self.assertEqual(3, len(self.sleeps))
+
+    def test_no_retry_for_permanent_errors(self):
+        register = self.register(FlakyBus([errno.ENODEV]))
+        with self.assertRaises(OSError):
+            register.write(100)
+        self.assertEqual([], self.sleeps)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import time
+import unittest
+
+from argon.daemon import Daemon
+from argon.fan import compile_profile
+from argon.schedule import FixedInterval
+from argon.sim import Simulation, ThermalModel, step_trace
+
+PROFILES = {
+    'Fan:Vendor': {'55': '10', '60': '55', '65': '100'},
+    'Fan:Off': {'0': '0'},
+    'Fan:PID': {'target': '65'},
+}
+HOUR = 3600
+
+
+def load_profile(profile):
+    return compile_profile(PROFILES[profile]), FixedInterval(10)
+
+
+class SimulationTest(unittest.TestCase):
+    def simulate(self, profile='Fan:Vendor', hours=6, pushes=()):
+        # Idle, a 2 hour burst of full load, idle again:
+        sim = Simulation(step_trace([(0, 0.0), (1 * HOUR, 1.0), (3 * HOUR, 0.0)]))
+        self.addCleanup(sim.close)
+        interactions = []
+        daemon = Daemon(sim.io, sim.sensor, profile, load_profile, 'Button:Vendor',
+                        button_handler=lambda p, i: interactions.append((sim.clock(), i)))
+        for at, push in pushes:
+            sim.gpio.schedule(sim.loop, at, push)
+        temps = []
+        sim.loop.call_soon(self._sample, sim, temps)
+        started = time.perf_counter()
+        sim.run(daemon, hours * HOUR)
+        return sim, daemon, temps, interactions, time.perf_counter() - started
+
+    def _sample(self, sim, temps, interval=60):
+        temps.append(sim.model.read())
+        sim.loop.call_later(interval, self._sample, sim, temps, interval)
+
+    def test_hours_run_in_seconds(self):
+        sim, daemon, temps, _, elapsed = self.simulate()
+        self.assertLess(elapsed, 10)
+        self.assertAlmostEqual(6 * HOUR, sim.clock(), delta=10)
+        self.assertAlmostEqual(6 * HOUR / 10, daemon.ticks, delta=2)
+
+    def test_real_time(self):
+        sim = Simulation(virtual_time=False)
+        self.assertIsNone(sim.loop)
+        daemon = Daemon(sim.io, sim.sensor, 'Fan:Vendor', load_profile)
+        sim.run(daemon, 0.05)
+        sim.close()
+        self.assertEqual(1, daemon.ticks)
+        self.assertEqual(1, len(sim.bus.fan_writes()))
+
+    def test_fan_keeps_soc_below_throttling(self):
+        sim, _, temps, _, _ = self.simulate()
+        self.assertLess(max(temps), 80)
+        speeds = [speed for _, speed in sim.bus.fan_writes()]
+        self.assertIn(100, speeds)
+        self.assertEqual(0, speeds[-1])
+        # Hysteresis and dwell time keep the fan from flapping (one write per tick would be 2160 writes):
+        self.assertLess(len(speeds), 60)
+
+    def test_pid_holds_target_with_less_duty(self):
+        sim, _, temps, _, _ = self.simulate()
+        vendor_duty = sum(speed for _, speed in self._duties(sim)) / len(temps)
+        sim, _, temps, _, _ = self.simulate('Fan:PID')
+        self.assertLess(max(temps), 72)
+        # Under full load, the temperature settles at the target:
+        self.assertAlmostEqual(65, temps[int(2.5 * HOUR / 60)], delta=0.5)
+        self.assertLess(sum(speed for _, speed in self._duties(sim)) / len(temps), vendor_duty)
+        self.assertLess(len(sim.bus.fan_writes()), 60)
+
+    def test_feed_forward_reduces_time_at_throttle(self):
+        def seconds_at_throttle(section):
+            # A quiet profile in a hot case (the fan cannot hold the SoC below 80°C under full load for long),
+            # with bursts of load of 7 minutes every 15 minutes:
+            sim = Simulation(step_trace([(at + offset, load) for at in range(0, HOUR, 900)
+                                         for offset, load in ((0, 0.05), (300, 1.0), (720, 0.05))]), load_power=11)
+            self.addCleanup(sim.close)
+            daemon = Daemon(sim.io, sim.sensor, 'Fan:Quiet',
+                            lambda p: (compile_profile(section, sim.cpu_load), FixedInterval(10)))
+            temps = []
+            sim.loop.call_soon(self._sample, sim, temps, 1)
+            sim.run(daemon, HOUR)
+            return sum(temp >= 80 for temp in temps)
+
+        quiet = {'65': '30', '75': '100'}
+        without = seconds_at_throttle(quiet)
+        with_feed_forward = seconds_at_throttle(dict(quiet, load_speed='100'))
+        self.assertGreater(without, 600)
+        self.assertLess(with_feed_forward, without * 0.7)
+
+    def _duties(self, sim):
+        """Fan speed at each minute."""
+        writes = sim.bus.fan_writes()
+        speed = 0
+        for minute in range(int(sim.clock() // 60)):
+            while writes and writes[0][0] <= minute * 60:
+                speed = writes.pop(0)[1]
+            yield minute, speed
+
+    def test_without_fan_soc_throttles(self):
+        _, _, temps, _, _ = self.simulate('Fan:Off')
+        self.assertGreater(max(temps), 80)
+
+    def test_throttle_accounting_per_profile(self):
+        sim = Simulation(step_trace([(0, 0.0), (HOUR, 1.0)]))
+        self.addCleanup(sim.close)
+        daemon = Daemon(sim.io, sim.sensor, 'Fan:Off', load_profile, throttle=sim.throttle)
+        sim.loop.call_at(2 * HOUR, daemon.switch_profile, 'Fan:Vendor')
+        sim.run(daemon, 4 * HOUR)
+        report = daemon.report()['profiles']
+        off, vendor = report['Fan:Off'], report['Fan:Vendor']
+        self.assertAlmostEqual(2 * HOUR, off['seconds'], delta=10)
+        self.assertGreater(off['soft_temp_limit'], 0.2 * HOUR)
+        self.assertGreater(off['temp_max'], 80)
+        self.assertEqual(0, off['duty_avg'])
+        # The fan brings the SoC back below the soft limit within minutes:
+        self.assertLess(vendor['soft_temp_limit'], 300)
+        self.assertGreater(vendor['duty_avg'], 50)
+        self.assertEqual(0, vendor['under_voltage'])
+
+    def test_button_pushes(self):
+        _, _, _, interactions, _ = self.simulate(hours=1, pushes=[(100, 'long'), (1000, 'double'), (2000, 'many')])
+        self.assertEqual(['long', 'double', 'many'], [i for _, i in interactions])
+        # Recognized after the settle time:
+        self.assertAlmostEqual(101.035, interactions[0][0], places=3)
+
+    def test_recovers_from_bus_and_sensor_errors(self):
+        sim = Simulation(start_temp=70)
+        self.addCleanup(sim.close)
+        sim.bus.failures = [121] * 4
+        sim.sensor.failures = 1
+        daemon = Daemon(sim.io, sim.sensor, 'Fan:Vendor', load_profile)
+        sim.run(daemon, 60)
+        self.assertEqual(100, sim.bus.fan_writes()[0][1])
+        self.assertEqual(1, sim.io.i2c_stats()[0x1a]['failures'])
+
+
+class ThermalModelTest(unittest.TestCase):
+    def test_equilibrium(self):
+        model = ThermalModel(lambda t: 1.0, start_temp=25)
+        self.assertAlmostEqual(model.equilibrium(1.0, 0), model.advance(10 * HOUR), places=3)
+        model.set_duty(1.0, 10 * HOUR)
+        self.assertAlmostEqual(55, model.advance(20 * HOUR), delta=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
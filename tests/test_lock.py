@@ -0,0 +1,165 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from argon.argon import Argon
+from argon.daemon import Daemon
+from argon.fan import FanCurve
+from argon.lock import DaemonLock, Lease, LockError
+from argon.schedule import FixedInterval
+from tests.test_daemon import VENDOR, FakeIO, FakeSensor
+
+
+def lease_of_other_process(path, duration):
+    # PID 1 is never us:
+    Path(path).write_text(f"1 {time.monotonic() + duration:.3f}\n")
+
+
+class DaemonLockTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = str(Path(self._tmp.name) / DaemonLock.NAME)
+
+    def test_single_daemon(self):
+        lock = DaemonLock(self.path)
+        lock.acquire()
+        self.assertEqual(f"{os.getpid()}\n", Path(self.path).read_text())
+        with self.assertRaisesRegex(LockError, f"already running \\(pid {os.getpid()}"):
+            DaemonLock(self.path).acquire()
+        lock.release()
+        second = DaemonLock(self.path)
+        second.acquire()
+        second.release()
+
+    def test_creates_directory(self):
+        # Started manually, without the runtime directory systemd creates:
+        lock = DaemonLock(str(Path(self._tmp.name) / 'argond' / DaemonLock.NAME))
+        lock.acquire()
+        with self.assertRaises(LockError):
+            DaemonLock(lock.path).acquire()
+        lock.release()
+
+    def test_unable_to_lock(self):
+        Path(self.path).write_text('')
+        with self.assertRaisesRegex(LockError, "Unable to lock"):
+            DaemonLock(str(Path(self.path) / DaemonLock.NAME)).acquire()
+
+    def test_stale_lock(self):
+        # Left behind by a killed daemon, i.e. not locked anymore:
+        Path(self.path).write_text("99999\n")
+        lock = DaemonLock(self.path)
+        with self.assertLogs(level='INFO') as logs:
+            lock.acquire()
+        self.assertIn("stale lock", logs.output[0])
+        self.assertEqual(f"{os.getpid()}\n", Path(self.path).read_text())
+        lock.release()
+
+
+class LeaseTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = str(Path(self._tmp.name) / Lease.NAME)
+
+    def test_no_daemon(self):
+        self.assertFalse(Lease(self.path).take(60))
+        self.assertFalse(Path(self.path).exists())
+        self.assertEqual(0, Lease(self.path).held())
+
+    def test_held_by_other_process(self):
+        lease = Lease.create(self.path)
+        self.assertEqual(0, lease.held())
+        lease_of_other_process(self.path, 60)
+        self.assertAlmostEqual(60, lease.held(), delta=1)
+        self.assertEqual(1, lease.owner)
+        lease_of_other_process(self.path, -1)
+        self.assertEqual(0, lease.held())
+
+    def test_uncontended_check_only_stats(self):
+        lease = Lease.create(self.path)
+        reads = []
+        read = lease._read
+        lease._read = lambda: reads.append(1) or read()
+        for _ in range(100):
+            lease.held()
+        self.assertEqual(1, len(reads))
+
+    def test_take_and_release(self):
+        Lease.create(self.path)
+        lease = Lease(self.path)
+        with lease.hold(30):
+            pid, expires = Path(self.path).read_text().split()
+            self.assertEqual(str(os.getpid()), pid)
+            self.assertAlmostEqual(time.monotonic() + 30, float(expires), delta=1)
+            # Our own lease does not keep us from writing:
+            self.assertEqual(0, Lease(self.path).held())
+        self.assertEqual('', Path(self.path).read_text())
+        # Another process' lease is not released:
+        lease_of_other_process(self.path, 60)
+        lease.release()
+        self.assertNotEqual('', Path(self.path).read_text())
+
+
+class ArgonLockTest(unittest.TestCase):
+    def test_user_runtime_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = Path(tmp) / 'config.ini'
+            config.write_text("[Settings]\ncontrol_socket = /run/argond/control.sock\n")
+            makedirs = os.makedirs
+
+            def not_root(path, *args, **kwargs):
+                if path.startswith('/run/argond'):
+                    raise PermissionError(13, 'Permission denied', path)
+                return makedirs(path, *args, **kwargs)
+
+            with mock.patch('os.makedirs', not_root), mock.patch.dict(os.environ, XDG_RUNTIME_DIR=tmp):
+                with self.assertLogs(level='WARNING') as logs:
+                    lock = Argon(config)._lock()
+                self.assertEqual(str(Path(tmp) / 'argond' / DaemonLock.NAME), lock.path)
+                self.assertIn("only guards against daemons of the same user", logs.output[0])
+                lock.release()
+                with mock.patch.dict(os.environ, clear=True):
+                    with self.assertRaisesRegex(LockError, "control_socket"):
+                        Argon(config)._lock()
+
+
+class SetFanTest(unittest.TestCase):
+    def test_invalid_speed_takes_no_lease(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = Path(tmp) / 'config.ini'
+            config.write_text(f"[Settings]\ncontrol_socket = {tmp}/control.sock\n")
+            path = Path(tmp) / Lease.NAME
+            Lease.create(str(path))
+            with self.assertRaises(ValueError):
+                Argon(config).set_fan(150)
+            self.assertEqual('', path.read_text())
+
+
+class DaemonLeaseTest(unittest.TestCase):
+    def test_daemon_yields_while_leased(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = str(Path(tmp) / Lease.NAME)
+            lease = Lease.create(path)
+            io = FakeIO()
+            daemon = Daemon(io, FakeSensor(62.0), 'Fan:Vendor',
+                            lambda profile: (FanCurve.from_section(VENDOR), FixedInterval(3600)), lease=lease)
+            loop = asyncio.new_event_loop()
+            self.addCleanup(loop.close)
+            lease_of_other_process(path, 0.2)
+            status = []
+            loop.call_later(0.1, lambda: status.append(daemon.status()))
+            loop.call_later(0.4, daemon.stop)
+            daemon.run(loop)
+        self.assertEqual(1, status[0]['lease']['pid'])
+        self.assertIsNone(status[0]['fan_speed'])
+        # Woken up when the lease expired, the register is rewritten:
+        self.assertEqual([None, 55], io.writes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import logging
+import socket
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from argon.logs import JournalHandler, RateLimitFilter
+
+
+def record(msg, *args, level=logging.INFO, **extra):
+    result = logging.LogRecord('argon', level, __file__, 1, msg, args, None, 'tick')
+    result.__dict__.update(extra)
+    return result
+
+
+def parse(data: bytes) -> dict:
+    fields = {}
+    while data:
+        line, _, rest = data.partition(b'\n')
+        if b'=' in line:
+            key, _, value = line.partition(b'=')
+            data = rest
+        else:
+            key = line
+            length, = struct.unpack_from('<Q', rest)
+            value, data = rest[8:8 + length], rest[8 + length + 1:]
+        fields[key.decode()] = value.decode()
+    return fields
+
+
+class RateLimitFilterTest(unittest.TestCase):
+    def test_suppresses_and_summarizes(self):
+        now = [0.0]
+        limit = RateLimitFilter(interval=60, burst=2, clock=lambda: now[0])
+        passed = [limit.filter(record("Fan already running at %s%%", speed)) for speed in range(5)]
+        self.assertEqual([True, True, False, False, False], passed)
+        # Other templates and levels are independent:
+        self.assertTrue(limit.filter(record("Fan already running at %s%%", 0, level=logging.DEBUG)))
+        now[0] = 60
+        summary = record("Fan already running at %s%%", 5)
+        self.assertTrue(limit.filter(summary))
+        self.assertEqual("Fan already running at 5% (3 similar message(s) suppressed)", summary.getMessage())
+
+    def test_events_and_warnings_pass(self):
+        limit = RateLimitFilter(interval=60, burst=1, clock=lambda: 0.0)
+        for speed in range(10):
+            self.assertTrue(limit.filter(record("Set fan speed to %d%%.", speed, TEMP=60.0, FAN_DUTY=speed,
+                                                PROFILE='Fan:Vendor')))
+            self.assertTrue(limit.filter(record("Sensor failed: %s", speed, level=logging.WARNING)))
+            self.assertTrue(limit.filter(record("Sensor failed: %s", speed, level=logging.ERROR)))
+        # Unlike the repetitive ones:
+        self.assertEqual(1, sum(limit.filter(record("Next check in %ds", i)) for i in range(10)))
+
+    def test_forgets_expired_keys(self):
+        now = [0.0]
+        limit = RateLimitFilter(interval=1, clock=lambda: now[0])
+        for i in range(limit.MAX_KEYS * 2):
+            now[0] = i
+            limit.filter(record(f"Message {i}"))
+        self.assertLessEqual(len(limit._windows), limit.MAX_KEYS)
+
+
+class JournalHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / 'socket')
+        self.journal = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.journal.bind(self.path)
+        self.handler = JournalHandler(path=self.path)
+
+    def tearDown(self):
+        self.handler.close()
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def test_structured_fields(self):
+        self.handler.handle(record("Set fan speed to %d%%.", 55, TEMP=61.5, FAN_DUTY=55, PROFILE='Fan:Vendor'))
+        fields = parse(self.journal.recv(65536))
+        self.assertEqual("Set fan speed to 55%.", fields['MESSAGE'])
+        self.assertEqual('6', fields['PRIORITY'])
+        self.assertEqual('argond', fields['SYSLOG_IDENTIFIER'])
+        self.assertNotIn('CODE_FUNC', fields)
+        self.assertEqual(('61.5', '55', 'Fan:Vendor'), (fields['TEMP'], fields['FAN_DUTY'], fields['PROFILE']))
+
+    def test_plain_record(self):
+        self.handler.handle(record("Temperature %s°C", 55.0, level=logging.DEBUG))
+        self.assertEqual("PRIORITY=7\nSYSLOG_IDENTIFIER=argond\nMESSAGE=Temperature 55.0°C\n".encode(),
+                         self.journal.recv(65536))
+
+    def test_multiline_message(self):
+        self.handler.handle(record("Traceback\n  line 1", level=logging.ERROR))
+        fields = parse(self.journal.recv(65536))
+        self.assertEqual("Traceback\n  line 1", fields['MESSAGE'])
+        self.assertEqual('3', fields['PRIORITY'])
+        self.assertEqual('tick', fields['CODE_FUNC'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import socket
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from argon.daemon import Daemon
+from argon.metrics import Counter, Gauge, Histogram, Registry
+from tests.test_control import load_profile
+from tests.test_daemon import FakeIO, FakeSensor
+
+
+class RegistryTest(unittest.TestCase):
+    def test_histogram(self):
+        histogram = Histogram('argon_test_seconds', "Test", (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual([
+            ('_bucket', 'le="0.1"', 2),
+            ('_bucket', 'le="1"', 3),
+            ('_bucket', 'le="+Inf"', 4),
+            ('_count', '', 4),
+            ('_sum', '', 2.65),
+        ], list(histogram.samples()))
+
+    def test_render(self):
+        events = Counter('argon_button_events', "Button interactions", 'type', ('long', 'double'))
+        events.inc('double')
+        text = Registry([Gauge('argon_temp_celsius', "Temperature", lambda: 47.5),
+                         Gauge('argon_unknown', "Not yet known", lambda: None),
+                         events]).render()
+        self.assertEqual('\n'.join([
+            '# TYPE argon_temp_celsius gauge',
+            '# HELP argon_temp_celsius Temperature',
+            'argon_temp_celsius 47.5',
+            '# TYPE argon_unknown gauge',
+            '# HELP argon_unknown Not yet known',
+            '# TYPE argon_button_events counter',
+            '# HELP argon_button_events Button interactions',
+            'argon_button_events_total{type="long"} 0',
+            'argon_button_events_total{type="double"} 1',
+            '# EOF',
+            '',
+        ]), text)
+
+
+class MetricsServerTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self._tmp.name) / 'metrics.sock')
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self._tmp.cleanup()
+
+    def get(self, path: str) -> bytes:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(2)
+            sock.connect(self.path)
+            sock.sendall(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+            return sock.makefile('rb').read()
+
+    def scrape(self, daemon: Daemon, path='/metrics') -> bytes:
+        result = {}
+
+        def run():
+            try:
+                result['value'] = self.get(path)
+            finally:
+                self.loop.call_soon_threadsafe(daemon.stop)
+
+        self.loop.call_later(0.05, threading.Thread(target=run).start)
+        self.loop.call_later(5, self.loop.stop)
+        daemon.run(self.loop)
+        return result['value']
+
+    def test_daemon_metrics(self):
+        daemon = Daemon(FakeIO(), FakeSensor(57.0), 'Fan:Vendor', load_profile, metrics=f'unix:{self.path}')
+        response = self.scrape(daemon)
+        head, body = response.split(b'\r\n\r\n', 1)
+        self.assertTrue(head.startswith(b'HTTP/1.0 200 OK'))
+        self.assertIn(b'Content-Type: application/openmetrics-text', head)
+        lines = body.decode().splitlines()
+        self.assertIn('argon_soc_temperature_celsius 57.0', lines)
+        self.assertIn('argon_soc_temperature_max_celsius 57.0', lines)
+        self.assertIn('argon_fan_duty_percent 10', lines)
+        self.assertIn('argon_i2c_writes_total{addr="0x1a"} 1', lines)
+        self.assertIn('argon_button_events_total{type="many"} 0', lines)
+        self.assertIn('argon_tick_duration_seconds_count 1', lines)
+        self.assertIn('argon_sensor_read_duration_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertEqual('# EOF', lines[-1])
+
+    def test_not_found(self):
+        daemon = Daemon(FakeIO(), FakeSensor(57.0), 'Fan:Vendor', load_profile, metrics=f'unix:{self.path}')
+        self.assertTrue(self.scrape(daemon, '/other').startswith(b'HTTP/1.0 404'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from argon.daemon import Daemon
+from argon.fan import FanCurve
+from argon.notify import Notifier
+from argon.schedule import FixedInterval
+from tests.test_daemon import VENDOR, FakeIO, FakeSensor
+
+
+class FakeNotifySocket:
+    """Stands in for systemd's notification socket."""
+
+    def __init__(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self._tmp.name) / 'notify')
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._socket.setblocking(False)
+
+    def messages(self) -> list:
+        result = []
+        while True:
+            try:
+                data = self._socket.recv(4096)
+            except BlockingIOError:
+                return result
+            result.append(dict(line.split('=', 1) for line in data.decode().split('\n')))
+
+    def close(self):
+        self._socket.close()
+        self._tmp.cleanup()
+
+
+class NotifierTest(unittest.TestCase):
+    def setUp(self):
+        self.systemd = FakeNotifySocket()
+        self.addCleanup(self.systemd.close)
+
+    def test_from_environment(self):
+        environ = {'NOTIFY_SOCKET': self.systemd.path, 'WATCHDOG_USEC': '30000000', 'WATCHDOG_PID': str(os.getpid())}
+        notifier = Notifier.from_environment(environ)
+        self.addCleanup(notifier.close)
+        self.assertEqual(30.0, notifier.watchdog)
+        # Not inherited by child processes:
+        self.assertEqual({}, environ)
+        other_pid = Notifier.from_environment({'NOTIFY_SOCKET': '@argond', 'WATCHDOG_USEC': '30000000',
+                                               'WATCHDOG_PID': '1'})
+        self.addCleanup(other_pid.close)
+        self.assertEqual(('\0argond', None), (other_pid.path, other_pid.watchdog))
+        self.assertIsNone(Notifier.from_environment({}))
+
+    def test_alive(self):
+        notifier = Notifier(self.systemd.path, watchdog=30)
+        self.addCleanup(notifier.close)
+        notifier.alive("Temperature 50.0°C")
+        notifier.alive("Temperature 50.0°C")
+        notifier.alive("Temperature 51.0°C")
+        self.assertEqual([{'READY': '1', 'WATCHDOG': '1', 'STATUS': "Temperature 50.0°C"},
+                          {'WATCHDOG': '1'},
+                          {'WATCHDOG': '1', 'STATUS': "Temperature 51.0°C"}], self.systemd.messages())
+
+    def test_unreachable(self):
+        notifier = Notifier(self.systemd.path + '.missing')
+        self.addCleanup(notifier.close)
+        self.assertFalse(notifier.alive("Temperature 50.0°C"))
+
+
+class DaemonNotifyTest(unittest.TestCase):
+    def test_ready_status_and_watchdog(self):
+        systemd = FakeNotifySocket()
+        self.addCleanup(systemd.close)
+        notifier = Notifier(systemd.path, watchdog=0.2)
+        self.addCleanup(notifier.close)
+        # The check interval is far longer than the watchdog timeout:
+        daemon = Daemon(FakeIO(), FakeSensor(62.0), 'Fan:Vendor',
+                        lambda profile: (FanCurve.from_section(VENDOR), FixedInterval(3600)), notifier=notifier)
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.call_later(0.45, daemon.stop)
+        daemon.run(loop)
+        messages = systemd.messages()
+        self.assertEqual({'READY': '1', 'WATCHDOG': '1', 'STATUS': "Temperature 62.0°C, fan speed 55% (Fan:Vendor)"},
+                         messages[0])
+        self.assertGreaterEqual(sum('WATCHDOG' in message for message in messages), 4)
+        self.assertEqual({'STOPPING': '1', 'STATUS': 'Stopping'}, messages[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import argon.poweroff as poweroff
+
+ROOT = Path(__file__).parent.parent
+
+
+class PoweroffTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.device = Path(self.tmp.name) / 'i2c-1'
+        self.device.touch()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writes_fan_off_then_shutdown(self):
+        self.assertGreaterEqual(poweroff.notify(str(self.device)), 0)
+        # Register 0, value 0 (fan off), then register 0, value 0xFF:
+        self.assertEqual(b'\x00\x00\x00\xff', self.device.read_bytes())
+
+    def test_missing_device(self):
+        self.assertEqual(1, poweroff.main(['--device', str(self.device) + '-missing']))
+
+    def test_process_age(self):
+        self.assertLess(0, poweroff.process_age())
+
+    def test_entry_point_imports_nothing_else(self):
+        env = dict(os.environ, PYTHONPATH=str(ROOT))
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'argon.poweroff', '--device',
+                                 str(self.device)], env=env, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertIn('Told the case to cut the power', result.stderr)
+        modules = {line.rpartition('|')[2].strip() for line in result.stderr.splitlines()
+                   if line.startswith('import time:')}
+        self.assertFalse({m for m in modules if m.startswith('argon.') and m != 'argon.poweroff'})
+        self.assertFalse(modules & {'click', 'configparser', 'logging', 'smbus', 'RPi', 'subprocess', 'asyncio'})
+
+
+if __name__ == '__main__':
+    unittest.main()
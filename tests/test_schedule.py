@@ -0,0 +1,47 @@
+import unittest
+
+from argon.fan import FanCurve
+from argon.schedule import AdaptiveInterval, FixedInterval
+
+VENDOR = {'55': '10', '60': '55', '65': '100'}
+
+
+def run(scheduler, temp_at, duration):
+    now = 0.0
+    while now < duration:
+        now += scheduler.next(temp_at(now), now)
+    return scheduler.rate(now)
+
+
+class ScheduleTest(unittest.TestCase):
+    def test_fixed(self):
+        self.assertAlmostEqual(6.0, run(FixedInterval(10), lambda t: 40, 3600), places=1)
+
+    def test_idle_stretches_to_max(self):
+        scheduler = AdaptiveInterval(FanCurve.from_section(VENDOR), min_interval=2, max_interval=60)
+        rate = run(scheduler, lambda t: 40, 3600)
+        self.assertEqual(60, scheduler.interval)
+        self.assertLess(rate, 1.1)
+
+    def test_near_threshold_shrinks(self):
+        scheduler = AdaptiveInterval(FanCurve.from_section(VENDOR), min_interval=2, max_interval=60)
+        self.assertEqual(2, scheduler.next(55.0, 0))
+        self.assertEqual(2, scheduler.next(52.0, 1))
+        # Falling away from all thresholds, only the distance counts:
+        self.assertAlmostEqual(36, scheduler.next(49, 2))
+
+    def test_steep_slope_shrinks(self):
+        scheduler = AdaptiveInterval(FanCurve.from_section(VENDOR), min_interval=2, max_interval=60, smoothing=1)
+        scheduler.next(30, 0)
+        # 1°C/s towards 52°C (the threshold at 55°C minus the down hysteresis), 12 degrees away:
+        self.assertAlmostEqual(6, scheduler.next(40, 10))
+        # Cooling down, away from all thresholds:
+        self.assertEqual(60, scheduler.next(30, 20))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            AdaptiveInterval(FanCurve.from_section(VENDOR), min_interval=10, max_interval=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import stat
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from argon.sensor import (AggregateSensor, CachedSensor, CpuLoad, PeriodicSensor, Sensor, SensorError, SysfsSensor,
+                          VcgencmdSensor, open_sensor)
+from argon.util import get_temp
+
+
+class FlakySensor(Sensor):
+    def __init__(self, values):
+        self._values = iter(values)
+
+    def read(self):
+        value = next(self._values)
+        if value is None:
+            raise SensorError("flaky")
+        return value
+
+
+class SensorTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_sysfs_millidegree_and_reread(self):
+        zone = self.tmp / 'temp'
+        zone.write_text('48312\n')
+        sensor = SysfsSensor(str(zone))
+        self.assertEqual(48.312, sensor.read())
+        # Same fd, value regenerated on each read:
+        zone.write_text('51000\n')
+        self.assertEqual(51.0, sensor.read())
+        sensor.close()
+
+    def test_cli_reads_configured_sensor(self):
+        zone = self.tmp / 'temp'
+        zone.write_text('48312\n')
+        self.assertEqual("48°C", get_temp(f'sysfs:{zone}', as_str=True))
+
+    def test_sysfs_garbage(self):
+        zone = self.tmp / 'temp'
+        zone.write_text('nope\n')
+        with self.assertRaises(SensorError):
+            SysfsSensor(str(zone)).read()
+        with self.assertRaises(SensorError):
+            SysfsSensor(str(self.tmp / 'missing'))
+
+    def test_vcgencmd(self):
+        script = self.tmp / 'vcgencmd'
+        script.write_text("#!/bin/sh\necho \"temp=48.3'C\"\n")
+        os.chmod(str(script), stat.S_IRWXU)
+        self.assertEqual(48.3, VcgencmdSensor(str(script)).read())
+        self.assertIsInstance(open_sensor(f'vcgencmd:{script}', max_age=0), VcgencmdSensor)
+        with self.assertRaises(SensorError):
+            VcgencmdSensor(str(self.tmp / 'missing')).read()
+
+    def test_cached_staleness_bound(self):
+        now = [0.0]
+        sensor = CachedSensor(FlakySensor([40.0, None, None]), max_age=10, clock=lambda: now[0])
+        self.assertEqual(40.0, sensor.read())
+        now[0] = 5.0
+        self.assertEqual(40.0, sensor.read())
+        now[0] = 11.0
+        with self.assertRaises(SensorError):
+            sensor.read()
+
+    def test_cached_without_value(self):
+        with self.assertRaises(SensorError):
+            CachedSensor(FlakySensor([None])).read()
+
+    def test_hwmon(self):
+        for i, (name, value) in enumerate((('cpu_thermal', '45000'), ('nvme', '38850'), ('drivetemp', '31000'))):
+            device = self.tmp / f'hwmon{i}'
+            device.mkdir()
+            (device / 'name').write_text(name + '\n')
+            (device / 'temp1_input').write_text(value + '\n')
+        original = SysfsSensor.HWMON
+        SysfsSensor.HWMON = str(self.tmp / 'hwmon*')
+        try:
+            self.assertEqual(38.85, open_sensor('hwmon:nvme').read())
+            self.assertEqual(31.0, open_sensor('hwmon:drivetemp').read())
+            with self.assertRaises(SensorError):
+                open_sensor('hwmon:missing')
+        finally:
+            SysfsSensor.HWMON = original
+
+    def test_aggregate(self):
+        soc, nvme, pmic = FlakySensor([50.0, 50.0, None]), FlakySensor([60.0, 60.0, 60.0]), FlakySensor([40.0] * 3)
+        sensor = AggregateSensor({'soc': soc, 'nvme': nvme, 'pmic': pmic}, {'nvme': 3, 'pmic': 0}, 'weighted')
+        self.assertEqual(57.5, sensor.read())
+        self.assertEqual({'soc': 50.0, 'nvme': 60.0, 'pmic': 40.0}, sensor.values)
+        sensor.mode = 'max'
+        self.assertEqual(60.0, sensor.read())
+        # A failing sensor is left out:
+        self.assertEqual(60.0, sensor.read())
+        self.assertIsNone(sensor.values['soc'])
+        with self.assertRaises(SensorError):
+            AggregateSensor({'pmic': FlakySensor([40.0])}, {'pmic': 0}).read()
+
+    def test_periodic_never_blocks(self):
+        class SlowSensor(Sensor):
+            def read(self):
+                time.sleep(0.1)
+                return 42.0
+
+        sensor = PeriodicSensor(SlowSensor(), interval=0.05)
+        started = time.monotonic()
+        with self.assertRaises(SensorError):
+            sensor.read()
+        time.sleep(0.15)
+        self.assertEqual(42.0, sensor.read())
+        self.assertLess(time.monotonic() - started - 0.15, 0.05)
+        sensor.close()
+
+    def test_cpu_load(self):
+        stat = self.tmp / 'stat'
+        cpufreq = self.tmp / 'cpufreq'
+        cpufreq.mkdir()
+        (cpufreq / 'scaling_max_freq').write_text('1500000\n')
+        (cpufreq / 'scaling_cur_freq').write_text('1500000\n')
+        stat.write_text('cpu  100 0 100 800 0 0 0 0 0 0\ncpu0 100 0 100 800 0 0 0 0 0 0\nintr 1 2 3\n')
+        load = CpuLoad(str(stat), cpufreq=True, cpufreq_path=str(cpufreq))
+        # 300 of 400 ticks busy since opening, then at half the clock:
+        stat.write_text('cpu  300 0 200 900 0 0 0 0 0 0\n')
+        self.assertAlmostEqual(0.75, load.read())
+        (cpufreq / 'scaling_cur_freq').write_text('750000\n')
+        stat.write_text('cpu  400 0 200 1000 0 0 0 0 0 0\n')
+        self.assertAlmostEqual(0.25, load.read())
+        self.assertEqual(0.0, load.read())
+        # Unscaled while the current clock is unreadable:
+        (cpufreq / 'scaling_cur_freq').write_text('\n')
+        stat.write_text('cpu  500 0 200 1100 0 0 0 0 0 0\n')
+        self.assertAlmostEqual(0.5, load.read())
+        load.close()
+
+    def test_cpu_load_without_max_freq(self):
+        stat = self.tmp / 'stat'
+        cpufreq = self.tmp / 'cpufreq'
+        cpufreq.mkdir()
+        (cpufreq / 'scaling_max_freq').write_text('0\n')
+        (cpufreq / 'scaling_cur_freq').write_text('750000\n')
+        stat.write_text('cpu  100 0 100 800 0 0 0 0 0 0\n')
+        with self.assertLogs(level='WARNING'):
+            load = CpuLoad(str(stat), cpufreq=True, cpufreq_path=str(cpufreq))
+        stat.write_text('cpu  300 0 200 900 0 0 0 0 0 0\n')
+        self.assertAlmostEqual(0.75, load.read())
+        load.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from argon.sensor import SensorError
+from argon.throttle import (FREQ_CAPPED, SOFT_TEMP_LIMIT, UNDER_VOLTAGE, SysfsThrottled, ThrottleAccounting,
+                            format_states)
+
+
+class ThrottleAccountingTest(unittest.TestCase):
+    def test_attributes_intervals_to_previous_sample(self):
+        accounting = ThrottleAccounting()
+        accounting.update(0, 'Fan:Silent', 60.0, 0, 0)
+        accounting.update(10, 'Fan:Silent', 81.0, 30, SOFT_TEMP_LIMIT | FREQ_CAPPED)
+        accounting.update(40, 'Fan:Default', 75.0, 100, UNDER_VOLTAGE)
+        accounting.update(50, 'Fan:Default', 70.0, 100, 0)
+        report = accounting.report()
+        silent, default = report['Fan:Silent'], report['Fan:Default']
+        self.assertEqual((40, 30, 30, 0), (silent['seconds'], silent['soft_temp_limit'], silent['freq_capped'],
+                                           silent['throttled']))
+        self.assertEqual(81.0, silent['temp_max'])
+        self.assertAlmostEqual((0 * 10 + 30 * 30) / 40, silent['duty_avg'])
+        self.assertEqual((10, 10, 0), (default['seconds'], default['under_voltage'], default['soft_temp_limit']))
+        self.assertEqual(75.0, default['temp_max'])
+        self.assertEqual(30, accounting.totals()['freq_capped'])
+
+    def test_format_states(self):
+        self.assertEqual('none', format_states(0))
+        self.assertEqual('freq_capped, under_voltage', format_states(FREQ_CAPPED | UNDER_VOLTAGE))
+
+
+class SysfsThrottledTest(unittest.TestCase):
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'get_throttled'
+            # Only the current state counts, not the "has occurred" bits:
+            path.write_text('50005\n')
+            source = SysfsThrottled(str(path))
+            try:
+                self.assertEqual(UNDER_VOLTAGE | 0x4, source.read())
+                path.write_text('0\n')
+                self.assertEqual(0, source.read())
+            finally:
+                source.close()
+            with self.assertRaises(SensorError):
+                SysfsThrottled(str(Path(tmp) / 'missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import configparser
+import io
+import unittest
+
+from argon.fan import FanCurve, compile_profile
+from argon.sim import ThermalModel, step_trace
+
+try:
+    import numpy as np
+    from argon import tune
+except ImportError:
+    np = None
+
+HOUR = 3600
+VENDOR = {55: 10, 60: 55, 65: 100}
+
+
+def record(points, hours=6, interval=10):
+    """A 1 Hz trace of the simulated SoC with bursts of full load, the fan controlled by `points`."""
+    model = ThermalModel(step_trace([(h * HOUR + offset, load) for h in range(hours)
+                                     for offset, load in ((0, 0.1), (1200, 1.0), (2400, 0.3))]))
+    curve = FanCurve(points)
+    times, temps, duties = [], [], []
+    for t in range(hours * HOUR):
+        if t % interval == 0 and curve.update(model.read(t), t) is not None:
+            model.set_duty(curve.speed / 100, t)
+        times.append(t)
+        temps.append(model.read(t))
+        duties.append(curve.speed)
+    return tune.Trace(np.array(times, dtype=float), np.array(temps), np.array(duties, dtype=float))
+
+
+@unittest.skipIf(np is None, "NumPy not installed")
+class TuneTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.trace = record(VENDOR)
+
+    def test_model_matches_simulation(self):
+        model = ThermalModel()
+        self.assertEqual(tune.Model(), tune.Model(*(getattr(model, field) for field in tune.Model._fields)))
+
+    def test_heat_input_inverts_model(self):
+        (start_temp, power), = tune.heat_input(self.trace)
+        self.assertAlmostEqual(self.trace.temps[0], start_temp)
+        self.assertEqual(6 * HOUR - 1, len(power))
+        # idle_power + load_power * load:
+        np.testing.assert_allclose([2.5, 7.0, 3.5], power[[600, 1800, 3000]], atol=1e-6)
+
+    def test_vectorized_matches_fan_curve(self):
+        segments = tune.heat_input(self.trace)
+        tables = [VENDOR, {60: 80, 65: 100}, {50: 20, 57.5: 60, 70: 100}]
+        stats = tune.simulate(segments, np.array([tune.as_table(points) for points in tables]))
+        for i, points in enumerate(tables):
+            with self.subTest(points=points):
+                temps, duties = tune.replay(segments, FanCurve(points))
+                self.assertAlmostEqual(duties.mean(), stats.duty_avg[i])
+                switches = np.count_nonzero(np.diff(duties)) / (len(duties) / HOUR)
+                self.assertAlmostEqual(switches, stats.switches_per_hour[i])
+        # Replaying the recorded profile reproduces the recording:
+        self.assertAlmostEqual(self.trace.temps.max(), stats.temp_max[0], places=6)
+
+    def test_tune(self):
+        csv = io.StringIO("timestamp,temp,fan_speed,flags\n" + ''.join(
+            f"{t:.3f},{temp:.2f},{'' if duty != duty else int(duty)},\n"
+            for t, temp, duty in zip(self.trace.times[::10], self.trace.temps[::10], self.trace.duties[::10])))
+        result = tune.tune([tune.read_csv(csv)], max_temp=70, references={'Fan:Vendor': VENDOR})
+        self.assertLessEqual(result.stats.temp_max, 70)
+        vendor, vendor_cost = result.references['Fan:Vendor']
+        self.assertLess(result.cost, vendor_cost)
+        self.assertLess(result.stats.duty_avg, vendor.duty_avg)
+        cfg = configparser.ConfigParser()
+        cfg.read_string(tune.format_section('Fan:Tuned', result))
+        curve = compile_profile(cfg['Fan:Tuned'])
+        self.assertEqual(result.points, dict(zip(curve.temps, curve.speeds)))
+        with self.assertRaisesRegex(tune.TuneError, 'No candidate'):
+            tune.tune([self.trace], max_temp=40)
+
+
+if __name__ == '__main__':
+    unittest.main()